@@ -8,15 +8,55 @@ const API_CONFIG = {
   PRODUCT_API: 'http://10.237.239.166:5000/api/products',
   MACHINE_API: 'http://10.237.239.166:5000/api/machines',
   PAYMENT_API: 'http://10.237.239.166:5000/api/payments',
-  SLOT_API: 'http://10.237.239.166:5000/api/slots'
+  SLOT_API: 'http://10.237.239.166:5000/api/slots',
+  EVENTS_API: 'http://10.237.239.166:5000/api/events'
 };
 
+/**
+ * Trạng thái đồng bộ danh sách sản phẩm: server trả 304 khi ETag chưa đổi,
+ * và chỉ trả các sản phẩm thay đổi khi gọi ?since=<version>
+ */
+const productSync = {
+  etag: null,
+  version: null,
+  products: []
+};
+
+/**
+ * Chuyển đổi dữ liệu sản phẩm từ API sang format cho UI
+ */
+function toUiProduct(product) {
+  return {
+    id: product.id,
+    name: product.name,
+    price: product.price,
+    image_url: product.image || product.image_url || '/images/default-product.png',
+    is_available: product.active !== false && product.is_available !== false,
+    stock: product.stock ?? 10, // Giá trị mặc định nếu không có
+    description: product.description || '',
+    category: product.category || 'Sản phẩm'
+  };
+}
+
 /**
  * Lấy danh sách tất cả sản phẩm
  */
 export async function getProducts() {
   try {
-    const response = await fetch(API_CONFIG.PRODUCT_API);
+    const url = productSync.version !== null
+      ? `${API_CONFIG.PRODUCT_API}?since=${productSync.version}`
+      : API_CONFIG.PRODUCT_API;
+    const headers = productSync.etag ? { 'If-None-Match': productSync.etag } : {};
+    const response = await fetch(url, { headers });
+
+    // Catalog chưa đổi - dùng lại danh sách đang có
+    if (response.status === 304) {
+      return {
+        success: true,
+        products: productSync.products,
+        message: 'Danh sách sản phẩm không đổi'
+      };
+    }
 
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -24,18 +64,22 @@ export async function getProducts() {
 
     const data = await response.json();
 
-    // Chuyển đổi dữ liệu từ API sang format cho UI
     if (data.success && data.data) {
-      const products = data.data.map(product => ({
-        id: product.id,
-        name: product.name,
-        price: product.price,
-        image_url: product.image || '/images/default-product.png',
-        is_available: product.active !== false,
-        stock: product.stock || 10, // Giá trị mặc định nếu không có
-        description: product.description || '',
-        category: product.category || 'Sản phẩm'
-      }));
+      let products = data.data.map(toUiProduct);
+
+      // Delta sync: gộp phần thay đổi vào danh sách đang có
+      if (Array.isArray(data.removed) && productSync.version !== null) {
+        const byId = new Map(productSync.products.map(p => [p.id, p]));
+        data.removed.forEach(id => byId.delete(id));
+        products.forEach(p => byId.set(p.id, p));
+        products = Array.from(byId.values());
+      }
+
+      if (data.version !== undefined && data.version !== null) {
+        productSync.version = data.version;
+        productSync.etag = response.headers.get('ETag');
+        productSync.products = products;
+      }
 
       return {
         success: true,
@@ -44,20 +88,9 @@ export async function getProducts() {
       };
     } else if (Array.isArray(data)) {
       // Trường hợp API trả về mảng trực tiếp
-      const products = data.map(product => ({
-        id: product.id,
-        name: product.name,
-        price: product.price,
-        image_url: product.image || '/images/default-product.png',
-        is_available: product.active !== false,
-        stock: product.stock || 10,
-        description: product.description || '',
-        category: product.category || 'Sản phẩm'
-      }));
-
       return {
         success: true,
-        products: products,
+        products: data.map(toUiProduct),
         message: 'Lấy danh sách sản phẩm thành công'
       };
     } else {
@@ -246,39 +279,33 @@ export async function getSlotById(slotId) {
 }
 
 /**
- * Lấy sản phẩm theo slot và máy
+ * Lấy sản phẩm theo slot và máy - một request, server ghép sẵn slot + sản phẩm
  */
 export async function getProductsByMachine(machineId) {
   try {
-    // Lấy danh sách slots của máy
-    const slotsResult = await getSlots(machineId);
+    const response = await fetch(`${API_CONFIG.MACHINE_API}/${machineId}/products`);
 
-    if (!slotsResult.success) {
-      throw new Error(slotsResult.error);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
     }
 
-    // Lấy thông tin sản phẩm cho từng slot
-    const productsWithSlots = [];
-
-    for (const slot of slotsResult.slots) {
-      if (slot.product_id && slot.quantity > 0) {
-        const productResult = await getProductById(slot.product_id);
-
-        if (productResult.success && productResult.product) {
-          productsWithSlots.push({
-            ...productResult.product,
-            slot_no: slot.slot_no,
-            slot_id: slot.id,
-            stock: slot.quantity
-          });
-        }
-      }
+    const data = await response.json();
+
+    if (!data.success || !Array.isArray(data.data)) {
+      throw new Error('Invalid API response format');
     }
 
+    const productsWithSlots = data.data.map(item => ({
+      ...toUiProduct(item),
+      slot_no: item.slot_no,
+      slot_id: item.slot_id,
+      stock: item.stock
+    }));
+
     return {
       success: true,
       products: productsWithSlots,
-      message: 'Lấy sản phẩm theo máy thành công'
+      message: data.message || 'Lấy sản phẩm theo máy thành công'
     };
   } catch (error) {
     console.error('Error fetching products by machine:', error);
@@ -291,23 +318,46 @@ export async function getProductsByMachine(machineId) {
 }
 
 /**
- * Tạo thanh toán cho sản phẩm
+ * Sinh idempotency key cho một lần mua - gửi lại cùng key khi thử lại để
+ * server trả về đúng đơn cũ thay vì tạo đơn / link PayOS mới
+ */
+export function newPaymentKey(machineId) {
+  const random = globalThis.crypto?.randomUUID
+    ? globalThis.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+  return `${machineId}:${random}`;
+}
+
+/**
+ * Tạo thanh toán cho sản phẩm (thử lại tối đa `attempts` lần khi lỗi mạng, cùng idempotency key)
  */
-export async function createPayment(machineId, productId, amount, slotNo = null) {
+export async function createPayment(machineId, productId, amount, slotNo = null,
+                                    idempotencyKey = null, attempts = 3) {
   try {
-    const response = await fetch(`${API_CONFIG.PAYMENT_API}/create`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        machine_id: machineId,
-        product_id: productId,
-        amount: amount,
-        slot_no: slotNo,
-        payment_method: 'qr_code'
-      })
-    });
+    const key = idempotencyKey || newPaymentKey(machineId);
+    let response;
+    for (let attempt = 1; ; attempt++) {
+      try {
+        response = await fetch(`${API_CONFIG.PAYMENT_API}/create`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': key
+          },
+          body: JSON.stringify({
+            machine_id: machineId,
+            product_id: productId,
+            amount: amount,
+            slot_no: slotNo,
+            payment_method: 'qr_code'
+          })
+        });
+        break;
+      } catch (networkError) {
+        if (attempt >= attempts) throw networkError;
+        await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+      }
+    }
 
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -318,6 +368,7 @@ export async function createPayment(machineId, productId, amount, slotNo = null)
       success: true,
       orderCode: data.order_code,
       checkoutUrl: data.checkout_url,
+      qrCode: data.qr_code,
       qrUrl: data.qr_url || data.qr_code_url,
       orderId: data.order_id
     };
@@ -357,6 +408,35 @@ export async function getOrderStatus(orderCode) {
   }
 }
 
+/**
+ * Theo dõi trạng thái đơn hàng qua Server-Sent Events (server đẩy ngay khi đổi trạng thái)
+ * Trả về hàm để đóng kết nối
+ */
+export function subscribeOrderStatus(orderCode, onStatus, onError) {
+  const source = new EventSource(`${API_CONFIG.EVENTS_API}/orders/${orderCode}`);
+
+  source.addEventListener('status', (event) => {
+    const data = JSON.parse(event.data);
+    onStatus({
+      status: data.status,
+      orderCode: data.order_code,
+      final: data.final
+    });
+    if (data.final) {
+      source.close();
+    }
+  });
+
+  source.onerror = (error) => {
+    source.close();
+    if (onError) {
+      onError(error);
+    }
+  };
+
+  return () => source.close();
+}
+
 /**
  * Hủy đơn hàng
  */
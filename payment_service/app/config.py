@@ -1,10 +1,13 @@
 """
 Cấu hình ứng dụng - đọc biến môi trường từ file .env
 """
+import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from app.services.log import setup_logging
+
 # Tìm file .env - thử nhiều vị trí
 possible_paths = [
     Path(__file__).parent.parent.parent / ".env",  # vending-machine-project/.env
@@ -15,25 +18,155 @@ possible_paths = [
 
 for env_path in possible_paths:
     if env_path.exists():
-        print(f"✅ Đã tìm thấy .env tại: {env_path}")
         load_dotenv(dotenv_path=env_path)
         break
 else:
-    print("⚠️ Không tìm thấy file .env, sử dụng biến môi trường hệ thống")
+    env_path = None
     load_dotenv()
 
+# Logging - ghi qua bộ đệm + thread nền ra stderr (LOG_FORMAT=json cho hệ thống gom log)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", 10000))       # Quá số log đang chờ ghi thì bỏ log mới
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 0.1))  # Chu kỳ ghi log ra stderr (giây)
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", 10))        # Số cảnh báo cùng nội dung tối đa mỗi cửa sổ (0: không giới hạn)
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 10))    # Độ dài cửa sổ giới hạn cảnh báo (giây)
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_BUFFER_SIZE, LOG_FLUSH_INTERVAL, LOG_RATE_BURST, LOG_RATE_WINDOW)
+logger = logging.getLogger(__name__)
+
+if env_path is not None:
+    logger.info("Đã tìm thấy .env tại: %s", env_path)
+else:
+    logger.warning("Không tìm thấy file .env, sử dụng biến môi trường hệ thống")
+
 # PayOS Credentials
 PAYOS_CLIENT_ID = os.getenv("PAYOS_CLIENT_ID")
 PAYOS_API_KEY = os.getenv("PAYOS_API_KEY")
 PAYOS_CHECKSUM_KEY = os.getenv("PAYOS_CHECKSUM_KEY")
 
+# PayOS giả lập (fake_payos.py) cho benchmark / CI: PAYOS_FAKE=1 thì gọi fake thay vì PayOS thật,
+# thiếu credentials thì dùng key thử (fake ký / xác thực bằng cùng PAYOS_CHECKSUM_KEY)
+PAYOS_FAKE = os.getenv("PAYOS_FAKE", "0") == "1"
+PAYOS_FAKE_PORT = int(os.getenv("PAYOS_FAKE_PORT", 8900))
+if PAYOS_FAKE:
+    PAYOS_CLIENT_ID = PAYOS_CLIENT_ID or "fake-client-id"
+    PAYOS_API_KEY = PAYOS_API_KEY or "fake-api-key"
+    PAYOS_CHECKSUM_KEY = PAYOS_CHECKSUM_KEY or "fake-checksum-key"
+PAYOS_BASE_URL = os.getenv("PAYOS_BASE_URL") or (
+    f"http://127.0.0.1:{PAYOS_FAKE_PORT}" if PAYOS_FAKE else "https://api-merchant.payos.vn"
+)
+
 # Kiểm tra credentials
 if not all([PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY]):
-    print("❌ CẢNH BÁO: Thiếu PayOS credentials trong .env!")
-    print(f"   CLIENT_ID: {'có' if PAYOS_CLIENT_ID else 'thiếu'}")
-    print(f"   API_KEY: {'có' if PAYOS_API_KEY else 'thiếu'}")
-    print(f"   CHECKSUM_KEY: {'có' if PAYOS_CHECKSUM_KEY else 'thiếu'}")
+    logger.error(
+        "Thiếu PayOS credentials trong .env! CLIENT_ID: %s, API_KEY: %s, CHECKSUM_KEY: %s",
+        *("có" if value else "thiếu" for value in (PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY)),
+    )
 
 # Server Configuration
 PORT = int(os.getenv("PORT", 3000))
 DOMAIN = os.getenv("DOMAIN", f"http://localhost:{PORT}")
+
+# PayOS HTTP client - connection pool keep-alive dùng chung cho mọi request
+PAYOS_TIMEOUT = float(os.getenv("PAYOS_TIMEOUT", 10))                  # Timeout tổng (giây)
+PAYOS_CONNECT_TIMEOUT = float(os.getenv("PAYOS_CONNECT_TIMEOUT", 3))   # Timeout kết nối (giây)
+PAYOS_MAX_CONNECTIONS = int(os.getenv("PAYOS_MAX_CONNECTIONS", 20))    # Số kết nối tối đa trong pool
+PAYOS_MAX_KEEPALIVE = int(os.getenv("PAYOS_MAX_KEEPALIVE", 10))        # Số kết nối keep-alive giữ lại
+PAYOS_KEEPALIVE_EXPIRY = float(os.getenv("PAYOS_KEEPALIVE_EXPIRY", 30))
+PAYOS_MAX_CONCURRENCY = int(os.getenv("PAYOS_MAX_CONCURRENCY", 50))    # Số lời gọi PayOS đồng thời tối đa
+
+# Chống chịu lỗi PayOS - thử lại lỗi tạm thời (timeout, mất kết nối, 429, 5xx) trong tổng PAYOS_DEADLINE giây
+PAYOS_RETRIES = int(os.getenv("PAYOS_RETRIES", 2))
+PAYOS_DEADLINE = float(os.getenv("PAYOS_DEADLINE", PAYOS_TIMEOUT))
+PAYOS_BACKOFF_BASE = float(os.getenv("PAYOS_BACKOFF_BASE", 0.2))      # Backoff mũ có jitter (giây)
+PAYOS_BACKOFF_CAP = float(os.getenv("PAYOS_BACKOFF_CAP", 2))
+# Hedging: lời gọi chậm hơn p95 gần đây thì gửi thêm một lời gọi song song (tốn thêm request tới PayOS)
+PAYOS_HEDGE = os.getenv("PAYOS_HEDGE", "0") == "1"
+PAYOS_HEDGE_MIN_DELAY = float(os.getenv("PAYOS_HEDGE_MIN_DELAY", 0.05))
+# Circuit breaker: trong PAYOS_BREAKER_WINDOW lời gọi gần nhất, tỉ lệ lỗi hoặc tỉ lệ lời gọi chậm hơn
+# PAYOS_SLOW_CALL giây vượt ngưỡng thì từ chối ngay mọi lời gọi trong PAYOS_BREAKER_OPEN giây
+PAYOS_SLOW_CALL = float(os.getenv("PAYOS_SLOW_CALL", 3))
+PAYOS_BREAKER_WINDOW = int(os.getenv("PAYOS_BREAKER_WINDOW", 50))
+PAYOS_BREAKER_MIN_CALLS = int(os.getenv("PAYOS_BREAKER_MIN_CALLS", 10))
+PAYOS_BREAKER_FAILURE_RATE = float(os.getenv("PAYOS_BREAKER_FAILURE_RATE", 0.5))
+PAYOS_BREAKER_SLOW_RATE = float(os.getenv("PAYOS_BREAKER_SLOW_RATE", 0.8))
+PAYOS_BREAKER_OPEN = float(os.getenv("PAYOS_BREAKER_OPEN", 15))
+
+# Sinh mã đơn hàng - mỗi worker/máy chủ cần một ORDER_NODE_ID riêng (0-31)
+ORDER_NODE_ID = os.getenv("ORDER_NODE_ID")
+
+# Giữ hàng cho đơn chờ thanh toán (giây) - khớp với thời gian đếm ngược trên kiosk
+RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", 300))
+
+# Đơn chờ thanh toán quá ORDER_EXPIRY_TTL giây thì hết hạn: trả hàng, huỷ link PayOS, báo kiosk
+ORDER_EXPIRY_TTL = int(os.getenv("ORDER_EXPIRY_TTL", RESERVATION_TTL))
+ORDER_EXPIRY_TICK = float(os.getenv("ORDER_EXPIRY_TICK", 1))                # Độ chính xác của hạn chót (giây)
+ORDER_EXPIRY_CANCEL_BATCH = int(os.getenv("ORDER_EXPIRY_CANCEL_BATCH", 50))  # Số link PayOS huỷ mỗi công việc nền
+ORDER_EXPIRY_RESTORE_BATCH = int(os.getenv("ORDER_EXPIRY_RESTORE_BATCH", 500))  # Số đơn đọc mỗi lô khi nạp lại lúc khởi động
+
+# Đối soát đơn kẹt với PayOS (mất webhook, server khởi động lại giữa lúc thanh toán):
+# đơn chờ quá RECONCILE_STALE_AFTER giây được hỏi trạng thái thật trên PayOS
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", 30))        # Chu kỳ chạy (giây)
+RECONCILE_STALE_AFTER = float(os.getenv("RECONCILE_STALE_AFTER", 60))
+RECONCILE_LOOKBACK = float(os.getenv("RECONCILE_LOOKBACK", 3600))      # Lần chạy đầu xét đơn tạo trong bấy nhiêu giây trước
+RECONCILE_BATCH = int(os.getenv("RECONCILE_BATCH", 100))               # Số đơn mỗi lô
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", 4))     # Số lời gọi PayOS đồng thời
+RECONCILE_RATE = float(os.getenv("RECONCILE_RATE", 5))                 # Lời gọi PayOS/giây tối đa (token bucket)
+RECONCILE_BURST = int(os.getenv("RECONCILE_BURST", 10))
+RECONCILE_MAX_RECHECK = int(os.getenv("RECONCILE_MAX_RECHECK", 10000))  # Số đơn tối đa chờ hỏi lại PayOS
+
+# Kho đơn hàng - đơn đã kết thúc được giữ trong RAM ORDER_TTL giây rồi chuyển xuống file lưu trữ
+ORDER_TTL = int(os.getenv("ORDER_TTL", 3600))
+ORDER_MAX_COMPLETED = int(os.getenv("ORDER_MAX_COMPLETED", 100000))  # Số đơn đã kết thúc tối đa trong RAM
+ORDER_ARCHIVE_PATH = os.getenv(
+    "ORDER_ARCHIVE_PATH",
+    str(Path(__file__).parent.parent / "data" / "orders_archive.jsonl")
+)
+
+# Heartbeat máy bán hàng - máy gửi mỗi HEARTBEAT_INTERVAL giây, quá HEARTBEAT_TIMEOUT giây coi như mất kết nối
+HEARTBEAT_INTERVAL = int(os.getenv("HEARTBEAT_INTERVAL", 30))
+HEARTBEAT_TIMEOUT = int(os.getenv("HEARTBEAT_TIMEOUT", 90))
+HEARTBEAT_HISTORY = int(os.getenv("HEARTBEAT_HISTORY", 64))  # Số heartbeat gần nhất giữ lại mỗi máy
+
+# Số Idempotency-Key xác nhận xuất hàng gần nhất được nhớ để trả lời lại khi máy gửi trùng
+DISPENSE_DEDUP_SIZE = int(os.getenv("DISPENSE_DEDUP_SIZE", 10000))
+
+# Cache response đã serialize sẵn cho API sản phẩm (đặt RESPONSE_CACHE=0 để tắt khi debug)
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_MIN_COMPRESS = int(os.getenv("RESPONSE_CACHE_MIN_COMPRESS", 1024))  # Chỉ nén body lớn hơn (bytes)
+
+# VietQR sinh tại server - tài khoản nhận tiền đã liên kết với PayOS.
+# Có cấu hình: kiosk nhận mã QR ngay khi tạo đơn, link PayOS được tạo song song ở nền.
+VIETQR_BANK_BIN = os.getenv("VIETQR_BANK_BIN")        # Mã BIN ngân hàng (vd. 970436 = Vietcombank)
+VIETQR_ACCOUNT_NO = os.getenv("VIETQR_ACCOUNT_NO")
+VIETQR_ACCOUNT_NAME = os.getenv("VIETQR_ACCOUNT_NAME")
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", 1024))  # Số ảnh QR đã render giữ trong RAM
+# Tạo link PayOS ở nền thất bại: mã VietQR đã hiện trên kiosk nên không huỷ đơn mà thử lại
+# tối đa VIETQR_LINK_ATTEMPTS lần, lần thứ n chờ n * VIETQR_LINK_RETRY_DELAY giây (hết lượt: đơn hết hạn như thường)
+VIETQR_LINK_ATTEMPTS = int(os.getenv("VIETQR_LINK_ATTEMPTS", 5))
+VIETQR_LINK_RETRY_DELAY = float(os.getenv("VIETQR_LINK_RETRY_DELAY", 5))
+
+# Lưu trữ sản phẩm / stock / đơn hàng: memory (chỉ trong RAM, mặc định) hoặc sqlite (file WAL, dùng chung giữa các worker)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", str(Path(__file__).parent.parent / "data" / "vending.db"))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 4))        # Số kết nối đọc tối đa mỗi worker
+SQLITE_BATCH_SIZE = int(os.getenv("SQLITE_BATCH_SIZE", 256))    # Số thao tác ghi tối đa gom vào một commit
+STORAGE_SYNC_INTERVAL = float(os.getenv("STORAGE_SYNC_INTERVAL", 0.25))  # Chu kỳ nạp thay đổi do worker khác ghi (giây)
+
+# Server production (serve.py) - số worker (process) và thời gian chờ request đang xử lý khi tắt (giây)
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", 30))
+
+# Idempotency cho create-payment: request lặp lại cùng key trong IDEMPOTENCY_TTL giây nhận lại đúng đơn cũ.
+# Không có Idempotency-Key / session_id thì key suy ra từ máy + sản phẩm + số tiền, chỉ giữ IDEMPOTENCY_DOUBLE_TAP giây.
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", RESERVATION_TTL))
+IDEMPOTENCY_DOUBLE_TAP = float(os.getenv("IDEMPOTENCY_DOUBLE_TAP", 5))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000))
+
+# Đo độ trễ từng route cho /metrics (đặt METRICS=0 để bỏ middleware đo; PayOS / stock vẫn được đo)
+METRICS = os.getenv("METRICS", "1") != "0"
+
+# API quản trị (/api/admin/*, vd. profiler) - gửi kèm header X-Admin-Token; không đặt thì các API này bị tắt
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 60))  # Thời gian profile tối đa mỗi lần
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.005))     # Chu kỳ lấy mẫu stack mặc định (giây)
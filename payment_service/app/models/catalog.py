@@ -0,0 +1,360 @@
+"""
+Catalog sản phẩm trong bộ nhớ có chỉ mục - tra cứu O(1) thay cho duyệt danh sách.
+
+Chỉ mục:
+- theo id (dict)
+- theo category (dict category -> {id: Product}, giữ thứ tự thêm vào)
+- theo trạng thái còn bán (dict id -> Product, giữ thứ tự thêm vào)
+
+Mọi thay đổi đi qua các method của ProductCatalog để chỉ mục luôn đồng bộ.
+
+Stock được khoá theo từng sản phẩm (lock striping) để các giao dịch trên
+những sản phẩm khác nhau không tranh chấp nhau. Ngoài stock còn theo dõi
+số lượng đang giữ chỗ (reserved) cho các đơn chờ thanh toán:
+stock khả dụng = stock - reserved.
+
+Mỗi thay đổi nhìn thấy được qua API (thêm/xoá, bật/tắt bán, stock) tăng
+version của catalog lên 1 và ghi lại version thay đổi cuối của sản phẩm đó,
+để client có thể hỏi "đã đổi gì kể từ version N" (ETag / delta sync).
+Giữ chỗ không làm đổi version vì không làm đổi dữ liệu trả về.
+
+Khi có lớp lưu trữ bền vững (SQLite), mọi thay đổi được ghi xuống đó; trừ stock
+và giữ chỗ lấy kết quả từ câu UPDATE có điều kiện trong database làm chuẩn, nên
+nhiều worker dùng chung database không bán vượt stock. Giữ chỗ khi đó gắn với
+order_code trong database, worker nào cũng chốt / trả lại được; số lượng giữ chỗ
+trong RAM chỉ là bản sao để tính stock khả dụng.
+
+Thời gian mỗi thao tác ghi stock (gồm cả chờ lock và ghi database) được đo vào
+histogram vending_stock_mutation_seconds của /metrics.
+"""
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.metrics import metrics
+
+if TYPE_CHECKING:
+    from app.models.product import Product
+
+# Số lock dùng cho stock - sản phẩm id % STOCK_LOCK_STRIPES dùng chung một lock
+STOCK_LOCK_STRIPES = 64
+
+STOCK_SECONDS = metrics.histogram(
+    "vending_stock_mutation_seconds", "Thời gian một thao tác ghi stock / giữ chỗ", ("operation",)
+)
+
+
+class ProductCatalog:
+    """Kho sản phẩm có chỉ mục, thread-safe"""
+
+    def __init__(self, products: Iterable["Product"] = (), storage: Optional[Any] = None):
+        self._lock = threading.RLock()  # Bảo vệ các chỉ mục
+        self._by_id: Dict[int, "Product"] = {}
+        self._by_category: Dict[Optional[str], Dict[int, "Product"]] = {}
+        self._available: Dict[int, "Product"] = {}
+        self._available_list: Optional[List["Product"]] = None
+        self._reserved: Dict[int, int] = {}
+        self._stock_locks = [threading.Lock() for _ in range(STOCK_LOCK_STRIPES)]
+        self._version = 0
+        self._version_lock = threading.Lock()
+        # product_id -> version thay đổi cuối, sắp theo version tăng dần (kể cả sản phẩm đã xoá)
+        self._changes: "OrderedDict[int, int]" = OrderedDict()
+        self._listeners: List[Callable[[int], None]] = []
+        self._storage = None
+        for product in products:
+            self.add(product)
+        # Gắn lớp lưu trữ sau khi nạp xong để không ghi ngược dữ liệu vừa đọc từ đó
+        self._storage = storage
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._by_id
+
+    @property
+    def version(self) -> int:
+        """Version hiện tại, tăng sau mỗi thay đổi"""
+        return self._version
+
+    def product_version(self, product_id: int) -> int:
+        """Version lần thay đổi cuối của một sản phẩm (0 nếu chưa từng có)"""
+        return self._changes.get(product_id, 0)
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        """Đăng ký hàm được gọi với product_id sau mỗi thay đổi (phải nhanh, không được sửa catalog)"""
+        self._listeners.append(listener)
+
+    def _bump(self, product_id: int) -> None:
+        """Ghi nhận sản phẩm vừa thay đổi (gọi sau khi đã sửa dữ liệu)"""
+        with self._version_lock:
+            self._version += 1
+            self._changes[product_id] = self._version
+            self._changes.move_to_end(product_id)
+        for listener in self._listeners:
+            listener(product_id)
+
+    # ----- Đọc -----
+
+    def get(self, product_id: int) -> Optional["Product"]:
+        """Lấy sản phẩm theo id (kể cả sản phẩm ngừng bán)"""
+        return self._by_id.get(product_id)
+
+    def get_available(self, product_id: int) -> Optional["Product"]:
+        """Lấy sản phẩm đang bán theo id"""
+        return self._available.get(product_id)
+
+    def list_available(self) -> List["Product"]:
+        """
+        Danh sách sản phẩm đang bán.
+
+        List được cache và chỉ dựng lại khi tập sản phẩm đang bán thay đổi;
+        thay đổi stock không làm mất cache vì list giữ chính các object Product.
+        Caller không được sửa list trả về.
+        """
+        cached = self._available_list
+        if cached is None:
+            with self._lock:
+                cached = self._available_list
+                if cached is None:
+                    cached = self._available_list = list(self._available.values())
+        return cached
+
+    def list_by_category(self, category: Optional[str], available_only: bool = True) -> List["Product"]:
+        """Danh sách sản phẩm theo category"""
+        products = self._by_category.get(category, {})
+        if available_only:
+            return [p for pid, p in products.items() if pid in self._available]
+        return list(products.values())
+
+    def changed_since(self, version: int, available_only: bool = True) -> Tuple[int, List["Product"], List[int]]:
+        """
+        Các thay đổi sau version cho trước.
+
+        Returns:
+            (version hiện tại, sản phẩm đã đổi, id sản phẩm không còn trong danh sách)
+            - với available_only, sản phẩm ngừng bán được tính là đã bị xoá
+        """
+        with self._version_lock:
+            current = self._version
+            changed_ids = []
+            # Duyệt từ thay đổi mới nhất về trước, dừng ở version của client
+            for product_id, changed_at in reversed(self._changes.items()):
+                if changed_at <= version:
+                    break
+                changed_ids.append(product_id)
+        changed, removed = [], []
+        index = self._available if available_only else self._by_id
+        for product_id in reversed(changed_ids):
+            product = index.get(product_id)
+            if product is None:
+                removed.append(product_id)
+            else:
+                changed.append(product)
+        return current, changed, removed
+
+    def categories(self) -> List[Optional[str]]:
+        """Danh sách category đang có sản phẩm"""
+        return list(self._by_category)
+
+    def has_category(self, category: Optional[str]) -> bool:
+        """Category có sản phẩm trong catalog"""
+        return category in self._by_category
+
+    # ----- Ghi -----
+
+    def add(self, product: "Product") -> None:
+        """Thêm hoặc thay thế sản phẩm, cập nhật mọi chỉ mục"""
+        with self._lock:
+            if product.id in self._by_id:
+                self._unindex(self._by_id[product.id])
+            self._by_id[product.id] = product
+            self._by_category.setdefault(product.category, {})[product.id] = product
+            if product.is_available:
+                self._available[product.id] = product
+            self._available_list = None
+            if self._storage is not None:
+                self._storage.save_product(product.model_dump())
+            self._bump(product.id)
+
+    def remove(self, product_id: int) -> bool:
+        """Xoá sản phẩm khỏi catalog"""
+        with self._lock:
+            product = self._by_id.pop(product_id, None)
+            if product is None:
+                return False
+            self._unindex(product)
+            self._available_list = None
+            if self._storage is not None:
+                self._storage.delete_product(product_id)
+            self._bump(product_id)
+            return True
+
+    def _stock_lock(self, product_id: int) -> threading.Lock:
+        return self._stock_locks[product_id % STOCK_LOCK_STRIPES]
+
+    def reserved(self, product_id: int) -> int:
+        """Số lượng đang được giữ chỗ"""
+        return self._reserved.get(product_id, 0)
+
+    def available_stock(self, product_id: int) -> int:
+        """Stock còn có thể bán = stock - số lượng đang giữ chỗ"""
+        product = self._by_id.get(product_id)
+        if product is None:
+            return 0
+        return product.stock - self._reserved.get(product_id, 0)
+
+    @STOCK_SECONDS.timed("set_stock")
+    def set_stock(self, product_id: int, new_stock: int) -> bool:
+        """Đặt stock mới cho sản phẩm"""
+        with self._stock_lock(product_id):
+            product = self._by_id.get(product_id)
+            if product is None:
+                return False
+            if self._storage is not None:
+                self._storage.set_stock(product_id, new_stock)
+            product.stock = new_stock
+            self._bump(product_id)
+            return True
+
+    @STOCK_SECONDS.timed("decrement_stock")
+    def decrement_stock(self, product_id: int, quantity: int = 1) -> bool:
+        """Giảm stock nguyên tử: chỉ trừ khi sản phẩm đang bán và đủ hàng chưa bị giữ chỗ"""
+        with self._stock_lock(product_id):
+            product = self._available.get(product_id)
+            if product is None or product.stock - self._reserved.get(product_id, 0) < quantity:
+                return False
+            if self._storage is not None:
+                # Database là chuẩn: worker khác có thể đã bán phần stock mà RAM chưa biết
+                stock = self._storage.decrement_stock(product_id, quantity)
+                if stock is None:
+                    return False
+                product.stock = stock
+            else:
+                product.stock -= quantity
+            self._bump(product_id)
+            return True
+
+    @STOCK_SECONDS.timed("reserve_stock")
+    def reserve_stock(self, product_id: int, quantity: int = 1,
+                      order_code: Optional[int] = None, expires_at: float = 0.0) -> bool:
+        """
+        Giữ chỗ nguyên tử: chỉ giữ khi sản phẩm đang bán và đủ hàng khả dụng.
+
+        Với lớp lưu trữ, giữ chỗ được ghi cho order_code tới expires_at (time.time()).
+        """
+        with self._stock_lock(product_id):
+            product = self._available.get(product_id)
+            reserved = self._reserved.get(product_id, 0)
+            if product is None or product.stock - reserved < quantity:
+                return False
+            if self._storage is not None:
+                # Database là chuẩn: worker khác có thể đã giữ / bán phần stock mà RAM chưa biết
+                counts = self._storage.reserve_stock(order_code, product_id, quantity, expires_at)
+                if counts is None:
+                    return False
+                product.stock, reserved = counts
+            else:
+                reserved += quantity
+            self._set_reserved(product_id, reserved)
+            return True
+
+    @STOCK_SECONDS.timed("commit_reserved")
+    def commit_reserved(self, product_id: int, quantity: int = 1, order_code: Optional[int] = None) -> bool:
+        """Chốt phần đã giữ chỗ: trừ stock và bỏ giữ chỗ trong cùng một bước"""
+        if self._storage is not None:
+            return self._sync_reserved(self._storage.commit_reservation(order_code))
+        with self._stock_lock(product_id):
+            product = self._by_id.get(product_id)
+            reserved = self._reserved.get(product_id, 0)
+            if product is None or reserved < quantity:
+                return False
+            self._set_reserved(product_id, reserved - quantity)
+            product.stock -= quantity
+            self._bump(product_id)
+            return True
+
+    @STOCK_SECONDS.timed("release_reserved")
+    def release_reserved(self, product_id: int, quantity: int = 1, order_code: Optional[int] = None) -> bool:
+        """Trả lại phần đã giữ chỗ (huỷ / hết hạn thanh toán)"""
+        if self._storage is not None:
+            return self._sync_reserved(self._storage.release_reservation(order_code))
+        with self._stock_lock(product_id):
+            reserved = self._reserved.get(product_id, 0)
+            if reserved < quantity:
+                return False
+            self._set_reserved(product_id, reserved - quantity)
+            return True
+
+    def _sync_reserved(self, counts: Optional[Tuple[int, int, int]]) -> bool:
+        """Cập nhật RAM theo (product_id, stock, reserved) database trả về sau khi chốt / trả giữ chỗ"""
+        if counts is None:
+            return False
+        product_id, stock, reserved = counts
+        with self._stock_lock(product_id):
+            self._set_reserved(product_id, reserved)
+            product = self._by_id.get(product_id)
+            if product is not None and product.stock != stock:
+                product.stock = stock
+                self._bump(product_id)
+        return True
+
+    def _set_reserved(self, product_id: int, reserved: int) -> None:
+        if reserved:
+            self._reserved[product_id] = reserved
+        else:
+            self._reserved.pop(product_id, None)
+
+    def set_available(self, product_id: int, is_available: bool) -> bool:
+        """Bật/tắt trạng thái đang bán"""
+        with self._lock:
+            product = self._by_id.get(product_id)
+            if product is None:
+                return False
+            self._apply_available(product, is_available)
+            if self._storage is not None:
+                self._storage.save_product(product.model_dump())
+            self._bump(product_id)
+            return True
+
+    def _apply_available(self, product: "Product", is_available: bool) -> None:
+        """Cập nhật trạng thái bán và chỉ mục (gọi khi đang giữ lock)"""
+        product.is_available = is_available
+        if is_available:
+            self._available[product.id] = product
+            # Giữ thứ tự theo lúc thêm vào catalog
+            self._available = {pid: p for pid, p in self._by_id.items() if pid in self._available}
+        else:
+            self._available.pop(product.id, None)
+        self._available_list = None
+
+    def refresh(self, rows: Iterable[Tuple[int, int, bool, int]]) -> int:
+        """
+        Nhận stock / trạng thái bán / số lượng giữ chỗ do worker khác ghi vào lớp
+        lưu trữ (không ghi ngược lại). Trả về số sản phẩm đã thay đổi.
+        """
+        changed = 0
+        for product_id, stock, is_available, reserved in rows:
+            product = self._by_id.get(product_id)
+            if product is None:
+                continue
+            if product.is_available != is_available:
+                with self._lock:
+                    self._apply_available(product, is_available)
+                    self._bump(product_id)
+                changed += 1
+            with self._stock_lock(product_id):
+                self._set_reserved(product_id, reserved)
+                if product.stock != stock:
+                    product.stock = stock
+                    self._bump(product_id)
+                    changed += 1
+        return changed
+
+    def _unindex(self, product: "Product") -> None:
+        category_index = self._by_category.get(product.category)
+        if category_index is not None:
+            category_index.pop(product.id, None)
+            if not category_index:
+                del self._by_category[product.category]
+        self._available.pop(product.id, None)
@@ -0,0 +1,196 @@
+"""
+Machine Model - Máy bán hàng và sơ đồ khay hàng (planogram) của từng máy
+
+Mỗi máy có nhiều slot (khay), mỗi slot chứa một sản phẩm trong catalog với số
+lượng riêng của slot đó. Slot được đánh chỉ mục theo id và theo machine_id nên
+dựng "sản phẩm của một máy" chỉ cần một lần tra dict thay cho N lần gọi API.
+
+Mỗi thay đổi (thêm máy/slot, đổi sản phẩm hoặc số lượng trong slot) tăng
+version của máy đó, dùng làm ETag cùng với version của catalog.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from app.models.product import Product, catalog, get_product_version
+
+
+class Machine(BaseModel):
+    """Model máy bán hàng"""
+    id: str
+    name: str
+    location: Optional[str] = None
+    is_active: bool = True
+
+
+class Slot(BaseModel):
+    """Model khay hàng trong máy"""
+    id: int
+    machine_id: str
+    slot_no: int
+    product_id: Optional[int] = None
+    quantity: int = 0
+    capacity: int = 10
+
+
+class MachineProduct(Product):
+    """Sản phẩm gắn với slot của một máy (stock = số lượng trong slot)"""
+    slot_id: int
+    slot_no: int
+
+
+class MachineProductsResponse(BaseModel):
+    """Response model cho API sản phẩm theo máy"""
+    success: bool
+    machine: Machine
+    data: List[MachineProduct]
+    message: Optional[str] = None
+    version: Optional[int] = None  # Version sơ đồ khay của máy
+
+
+class MachineRegistry:
+    """Danh sách máy và slot có chỉ mục theo machine_id, thread-safe"""
+
+    def __init__(self, machines: Iterable[Machine] = (), slots: Iterable[Slot] = ()):
+        self._lock = threading.RLock()
+        self._machines: Dict[str, Machine] = {}
+        self._slots: Dict[int, Slot] = {}
+        # machine_id -> {slot_id: Slot}, giữ thứ tự thêm vào
+        self._slots_by_machine: Dict[str, Dict[int, Slot]] = {}
+        self._versions: Dict[str, int] = {}
+        for machine in machines:
+            self.add_machine(machine)
+        for slot in slots:
+            self.add_slot(slot)
+
+    def __len__(self) -> int:
+        return len(self._machines)
+
+    def __contains__(self, machine_id: str) -> bool:
+        return machine_id in self._machines
+
+    def version(self, machine_id: str) -> int:
+        """Version sơ đồ khay của máy (0 nếu chưa từng có)"""
+        return self._versions.get(machine_id, 0)
+
+    def _bump(self, machine_id: str) -> None:
+        self._versions[machine_id] = self._versions.get(machine_id, 0) + 1
+
+    # ----- Đọc -----
+
+    def get_machine(self, machine_id: str) -> Optional[Machine]:
+        return self._machines.get(machine_id)
+
+    def list_machines(self) -> List[Machine]:
+        return list(self._machines.values())
+
+    def get_slot(self, slot_id: int) -> Optional[Slot]:
+        return self._slots.get(slot_id)
+
+    def list_slots(self, machine_id: Optional[str] = None) -> List[Slot]:
+        """Slot của một máy (sắp theo slot_no), hoặc mọi slot nếu không truyền machine_id"""
+        if machine_id is None:
+            return list(self._slots.values())
+        slots = self._slots_by_machine.get(machine_id, {})
+        return sorted(slots.values(), key=lambda slot: slot.slot_no)
+
+    def products_for_machine(self, machine_id: str, include_empty: bool = False) -> List[MachineProduct]:
+        """
+        Sản phẩm đang bán trong từng slot của máy, ghép sẵn thông tin sản phẩm.
+
+        Mặc định bỏ slot trống, hết hàng hoặc chứa sản phẩm ngừng bán.
+        """
+        result = []
+        for slot in self.list_slots(machine_id):
+            if slot.product_id is None:
+                continue
+            product = catalog.get_available(slot.product_id)
+            if product is None or (slot.quantity <= 0 and not include_empty):
+                continue
+            result.append(MachineProduct(
+                **product.model_dump(exclude={"stock"}),
+                stock=slot.quantity,
+                slot_id=slot.id,
+                slot_no=slot.slot_no
+            ))
+        return result
+
+    def products_version(self, machine_id: str) -> str:
+        """
+        Khoá phiên bản của view sản phẩm theo máy: version sơ đồ khay cùng
+        version của các sản phẩm đang nằm trong slot
+        """
+        product_versions = [
+            get_product_version(slot.product_id)
+            for slot in self.list_slots(machine_id) if slot.product_id is not None
+        ]
+        return f"{self.version(machine_id)}-{max(product_versions, default=0)}"
+
+    # ----- Ghi -----
+
+    def add_machine(self, machine: Machine) -> None:
+        """Thêm hoặc thay thế thông tin máy (giữ nguyên các slot)"""
+        with self._lock:
+            self._machines[machine.id] = machine
+            self._slots_by_machine.setdefault(machine.id, {})
+            self._bump(machine.id)
+
+    def add_slot(self, slot: Slot) -> None:
+        """Thêm hoặc thay thế slot, cập nhật chỉ mục theo máy"""
+        with self._lock:
+            if slot.machine_id not in self._machines:
+                raise ValueError(f"Máy {slot.machine_id} không tồn tại")
+            old = self._slots.get(slot.id)
+            if old is not None:
+                self._slots_by_machine[old.machine_id].pop(old.id, None)
+                self._bump(old.machine_id)
+            self._slots[slot.id] = slot
+            self._slots_by_machine[slot.machine_id][slot.id] = slot
+            self._bump(slot.machine_id)
+
+    def set_slot_quantity(self, slot_id: int, quantity: int) -> bool:
+        """Đặt số lượng hàng trong slot (nạp hàng / đối soát)"""
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None:
+                return False
+            slot.quantity = quantity
+            self._bump(slot.machine_id)
+            return True
+
+    def decrement_slot(self, machine_id: str, product_id: int, quantity: int = 1) -> bool:
+        """Trừ hàng ở slot đầu tiên của máy còn đủ sản phẩm này (sau khi xuất hàng)"""
+        with self._lock:
+            for slot in self.list_slots(machine_id):
+                if slot.product_id == product_id and slot.quantity >= quantity:
+                    slot.quantity -= quantity
+                    self._bump(machine_id)
+                    return True
+            return False
+
+
+# Dữ liệu máy và slot mẫu - máy VM001 (dùng trong simulator) chứa cả 8 sản phẩm mẫu
+SAMPLE_MACHINES = [
+    Machine(id="VM001", name="Máy bán hàng sảnh A", location="Tầng 1 - Sảnh A"),
+    Machine(id="VM002", name="Máy bán hàng căng tin", location="Tầng 2 - Căng tin"),
+]
+
+SAMPLE_SLOTS = [
+    Slot(id=1, machine_id="VM001", slot_no=1, product_id=1, quantity=5),
+    Slot(id=2, machine_id="VM001", slot_no=2, product_id=2, quantity=4),
+    Slot(id=3, machine_id="VM001", slot_no=3, product_id=3, quantity=3),
+    Slot(id=4, machine_id="VM001", slot_no=4, product_id=4, quantity=4),
+    Slot(id=5, machine_id="VM001", slot_no=5, product_id=5, quantity=8),
+    Slot(id=6, machine_id="VM001", slot_no=6, product_id=6, quantity=6),
+    Slot(id=7, machine_id="VM001", slot_no=7, product_id=7, quantity=3),
+    Slot(id=8, machine_id="VM001", slot_no=8, product_id=8, quantity=2),
+    Slot(id=9, machine_id="VM002", slot_no=1, product_id=1, quantity=5),
+    Slot(id=10, machine_id="VM002", slot_no=2, product_id=5, quantity=7),
+    Slot(id=11, machine_id="VM002", slot_no=3, product_id=6, quantity=6),
+    Slot(id=12, machine_id="VM002", slot_no=4, product_id=None, quantity=0),
+]
+
+
+# Danh sách máy dùng chung cho toàn bộ ứng dụng
+machines = MachineRegistry(SAMPLE_MACHINES, SAMPLE_SLOTS)
@@ -0,0 +1,320 @@
+"""
+Order Model - Quản lý đơn hàng và vòng đời trạng thái
+
+Vòng đời:
+    CREATED -> PENDING -> PAID -> DISPENSING -> DISPENSED
+       |          |         |          |
+       +----------+---------+----------+--> CANCELLED / EXPIRED
+
+Đơn đang xử lý nằm trong RAM (tra cứu O(1) theo order_code). Đơn đã kết thúc
+được giữ thêm ORDER_TTL giây rồi chuyển xuống file lưu trữ (JSON lines) để
+bộ nhớ không tăng mãi.
+
+Với STORAGE_BACKEND=sqlite, database là nguồn chuẩn dùng chung giữa các worker:
+- tạo đơn ghi ngay xuống database, worker khác tra cứu được đơn đó;
+- đổi trạng thái đọc bản mới nhất rồi ghi có điều kiện (compare-and-set theo
+  trạng thái cũ), nên hai worker không thể cùng chuyển một đơn;
+- đơn chưa kết thúc được đọc lại từ database mỗi lần get(), và tác vụ đồng bộ
+  (app/services/storage_sync.py) báo cho listener khi worker khác đổi trạng thái.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel
+
+from app.config import ORDER_TTL, ORDER_MAX_COMPLETED, ORDER_ARCHIVE_PATH
+from app.models.storage import storage as default_storage
+
+
+class OrderStatus(str, Enum):
+    """Trạng thái đơn hàng"""
+    CREATED = "CREATED"
+    PENDING = "PENDING"
+    PAID = "PAID"
+    DISPENSING = "DISPENSING"
+    DISPENSED = "DISPENSED"
+    CANCELLED = "CANCELLED"
+    EXPIRED = "EXPIRED"
+
+
+# Các bước chuyển trạng thái hợp lệ
+ALLOWED_TRANSITIONS = {
+    # CREATED -> PAID: khách quét VietQR sinh tại server và trả tiền trước khi link PayOS kịp ghi nhận
+    OrderStatus.CREATED: {OrderStatus.PENDING, OrderStatus.PAID, OrderStatus.CANCELLED, OrderStatus.EXPIRED},
+    OrderStatus.PENDING: {OrderStatus.PAID, OrderStatus.CANCELLED, OrderStatus.EXPIRED},
+    OrderStatus.PAID: {OrderStatus.DISPENSING, OrderStatus.DISPENSED, OrderStatus.CANCELLED},
+    OrderStatus.DISPENSING: {OrderStatus.DISPENSED, OrderStatus.CANCELLED},
+    OrderStatus.DISPENSED: set(),
+    OrderStatus.CANCELLED: set(),
+    OrderStatus.EXPIRED: set(),
+}
+
+TERMINAL_STATUSES = {OrderStatus.DISPENSED, OrderStatus.CANCELLED, OrderStatus.EXPIRED}
+
+# Đơn còn chờ khách thanh toán (hết hạn / đối soát với PayOS chỉ áp dụng cho các đơn này)
+WAITING_STATUSES = (OrderStatus.CREATED, OrderStatus.PENDING)
+
+STATUS_MESSAGES = {
+    OrderStatus.CREATED: "Đang tạo thanh toán",
+    OrderStatus.PENDING: "Đang chờ thanh toán",
+    OrderStatus.PAID: "Đã thanh toán",
+    OrderStatus.DISPENSING: "Đang xuất hàng",
+    OrderStatus.DISPENSED: "Đã xuất hàng",
+    OrderStatus.CANCELLED: "Đơn hàng đã bị hủy",
+    OrderStatus.EXPIRED: "Đơn hàng đã hết hạn",
+}
+
+
+class InvalidTransitionError(ValueError):
+    """Chuyển trạng thái không hợp lệ"""
+
+
+class Order(BaseModel):
+    """Model đơn hàng"""
+    order_code: int
+    machine_id: str
+    product_id: int
+    amount: int
+    status: OrderStatus = OrderStatus.CREATED
+    checkout_url: Optional[str] = None
+    qr_code: Optional[str] = None  # Payload VietQR hiển thị trên kiosk
+    created_at: float
+    updated_at: float
+
+
+class OrderArchive:
+    """Lưu trữ bền vững đơn đã kết thúc - file JSON lines, chỉ ghi nối"""
+
+    def __init__(self, path: str = ORDER_ARCHIVE_PATH):
+        self.path = Path(path)
+
+    def append(self, orders: Iterable[Order]) -> None:
+        """Ghi một lô đơn hàng xuống file trong một lần ghi"""
+        lines = "".join(order.model_dump_json() + "\n" for order in orders)
+        if not lines:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def find(self, order_code: int) -> Optional[Order]:
+        """Tìm đơn trong file lưu trữ (chậm - chỉ dùng khi không có trong RAM)"""
+        if not self.path.exists():
+            return None
+        needle = f'"order_code":{order_code},'
+        found = None
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if needle in line:
+                    found = line
+        return Order(**json.loads(found)) if found else None
+
+
+class OrderStore:
+    """Kho đơn hàng trong RAM với máy trạng thái và giới hạn bộ nhớ"""
+
+    def __init__(self, archive: Optional[OrderArchive] = None,
+                 ttl: float = ORDER_TTL, max_completed: int = ORDER_MAX_COMPLETED,
+                 storage: Optional[Any] = None):
+        self.archive = archive or OrderArchive()
+        self.storage = storage
+        self.ttl = ttl
+        self.max_completed = max_completed
+        self._lock = threading.Lock()
+        self._orders: Dict[int, Order] = {}
+        # Đơn đã kết thúc theo thứ tự thời điểm kết thúc -> order_code: finished_at
+        self._completed: "OrderedDict[int, float]" = OrderedDict()
+        # Chỉ có RAM: mã các đơn còn chờ thanh toán, sắp tăng dần (cho list_waiting)
+        self._waiting: List[int] = []
+        self._listeners: List[Callable[[Order], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def add_listener(self, listener: Callable[[Order], None]) -> None:
+        """Đăng ký hàm được gọi sau mỗi lần đơn hàng đổi trạng thái"""
+        self._listeners.append(listener)
+
+    def get(self, order_code: int) -> Optional[Order]:
+        """Lấy đơn hàng theo mã (đơn chưa kết thúc được đọc lại từ database dùng chung nếu có)"""
+        order = self._orders.get(order_code)
+        if self.storage is None or (order is not None and order.status in TERMINAL_STATUSES):
+            return order
+        with self._lock:
+            seen = (order.status, order.updated_at) if order is not None else None
+            order = self._load(order_code)
+        if seen is not None and seen != (order.status, order.updated_at):
+            # Worker khác vừa đổi trạng thái - báo listener như khi tác vụ đồng bộ phát hiện
+            self._notify(order)
+        return order
+
+    def _load(self, order_code: int) -> Optional[Order]:
+        """Đưa bản mới nhất trong database vào RAM (gọi khi đang giữ lock)"""
+        data = self.storage.get_order(order_code)
+        order = self._orders.get(order_code)
+        if data is not None:
+            self._apply(Order(**data))
+            order = self._orders.get(order_code)
+        return order
+
+    def _apply(self, fresh: Order) -> bool:
+        """Cập nhật đơn trong RAM theo bản do worker khác ghi; True nếu có thay đổi (gọi khi đang giữ lock)"""
+        order = self._orders.get(fresh.order_code)
+        if order is None:
+            self._orders[fresh.order_code] = fresh
+            if fresh.status in TERMINAL_STATUSES:
+                self._completed[fresh.order_code] = fresh.updated_at
+            return True
+        if (fresh.status, fresh.updated_at) == (order.status, order.updated_at) or fresh.updated_at < order.updated_at:
+            return False
+        # Sửa tại chỗ: nơi khác có thể đang giữ chính object này
+        for name, value in fresh:
+            setattr(order, name, value)
+        if order.status in TERMINAL_STATUSES:
+            self._completed[order.order_code] = order.updated_at
+        return True
+
+    def refresh(self, rows: Iterable[tuple]) -> int:
+        """
+        Nhận các đơn do worker khác đổi trạng thái - mỗi dòng (order_code, status,
+        updated_at, JSON) - chỉ với đơn đang có trong RAM, rồi báo listener.
+        Trả về số đơn đã cập nhật.
+        """
+        updated = []
+        with self._lock:
+            for order_code, status, updated_at, data in rows:
+                order = self._orders.get(order_code)
+                if order is None or (order.status.value, order.updated_at) == (status, updated_at):
+                    continue
+                if self._apply(Order(**json.loads(data))):
+                    updated.append(order)
+        for order in updated:
+            self._notify(order)
+        return len(updated)
+
+    def _notify(self, order: Order) -> None:
+        for listener in self._listeners:
+            listener(order)
+
+    def find(self, order_code: int) -> Optional[Order]:
+        """Lấy đơn hàng, tìm thêm trong database / file lưu trữ nếu đã bị chuyển khỏi RAM"""
+        order = self.get(order_code)
+        if order is None:
+            order = self.archive.find(order_code)
+        return order
+
+    def list_waiting(self, after: int, until: int, limit: int, node_id: Optional[int] = None) -> List[Order]:
+        """
+        Đơn còn chờ thanh toán có after < order_code <= until, mã nhỏ nhất trước, tối đa limit đơn.
+
+        Mã đơn tăng theo thời gian tạo nên (after, until] là một khoảng thời gian tạo
+        đơn: chi phí tỉ lệ với số đơn trả về, không phải với cả kho đơn hàng.
+        node_id: chỉ lấy đơn có mã do node đó sinh (database dùng chung giữa các
+        worker); kho chỉ có RAM vốn chỉ chứa đơn của chính worker nên bỏ qua.
+        """
+        with self._lock:
+            if self.storage is not None:
+                rows = self.storage.orders_waiting(after, until, limit, node_id)
+                for data in rows:
+                    self._apply(Order(**data))
+                return [self._orders[data["order_code"]] for data in rows]
+            start = bisect_right(self._waiting, after)
+            end = min(bisect_right(self._waiting, until), start + limit)
+            return [self._orders[order_code] for order_code in self._waiting[start:end]]
+
+    def create(self, order_code: int, machine_id: str, product_id: int, amount: int, **fields) -> Order:
+        """Tạo đơn mới ở trạng thái CREATED (kèm các trường khác nếu có)"""
+        now = time.time()
+        order = Order(
+            order_code=order_code,
+            machine_id=machine_id,
+            product_id=product_id,
+            amount=amount,
+            created_at=now,
+            updated_at=now,
+            **fields,
+        )
+        with self._lock:
+            if order_code in self._orders:
+                raise ValueError(f"Đơn hàng {order_code} đã tồn tại")
+            self._orders[order_code] = order
+            if self.storage is not None:
+                self.storage.save_order(order)
+            elif order.status in WAITING_STATUSES:
+                insort(self._waiting, order_code)  # Mã đơn tăng dần nên thường chỉ là append
+        return order
+
+    def transition(self, order_code: int, new_status: OrderStatus, **fields) -> Order:
+        """
+        Chuyển trạng thái đơn hàng (kèm cập nhật các trường khác nếu có).
+
+        Raises:
+            KeyError: không có đơn hàng
+            InvalidTransitionError: bước chuyển không hợp lệ
+        """
+        evicted = []
+        with self._lock:
+            order = self._orders.get(order_code) if self.storage is None else self._load(order_code)
+            if order is None:
+                raise KeyError(order_code)
+            if new_status not in ALLOWED_TRANSITIONS[order.status]:
+                raise InvalidTransitionError(
+                    f"Không thể chuyển đơn {order_code} từ {order.status.value} sang {new_status.value}"
+                )
+            if self.storage is not None:
+                updated = order.model_copy(update={**fields, "status": new_status, "updated_at": time.time()})
+                if not self.storage.update_order(updated, expected_status=order.status.value):
+                    # Worker khác vừa chuyển đơn này trước - báo lỗi theo trạng thái mới nhất
+                    order = self._load(order_code)
+                    raise InvalidTransitionError(
+                        f"Không thể chuyển đơn {order_code} từ {order.status.value} sang {new_status.value}"
+                    )
+            if self.storage is None and order.status in WAITING_STATUSES and new_status not in WAITING_STATUSES:
+                i = bisect_left(self._waiting, order_code)
+                if i < len(self._waiting) and self._waiting[i] == order_code:
+                    del self._waiting[i]
+            for name, value in fields.items():
+                setattr(order, name, value)
+            order.status = new_status
+            order.updated_at = time.time() if self.storage is None else updated.updated_at
+            if new_status in TERMINAL_STATUSES:
+                self._completed[order_code] = order.updated_at
+                evicted = self._collect_evictions(order.updated_at)
+
+        if evicted and self.storage is None:
+            # Có database thì đơn đã nằm sẵn trong đó, không cần ghi thêm file lưu trữ
+            self.archive.append(evicted)
+        self._notify(order)
+        return order
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Chuyển các đơn đã kết thúc quá TTL xuống file lưu trữ"""
+        with self._lock:
+            evicted = self._collect_evictions(time.time() if now is None else now)
+        if evicted and self.storage is None:
+            # Có database thì đơn đã nằm sẵn trong đó, không cần ghi thêm file lưu trữ
+            self.archive.append(evicted)
+        return len(evicted)
+
+    def _collect_evictions(self, now: float) -> List[Order]:
+        """Lấy ra các đơn cần chuyển khỏi RAM (gọi khi đang giữ lock)"""
+        evicted = []
+        completed = self._completed
+        deadline = now - self.ttl
+        while completed:
+            order_code, finished_at = next(iter(completed.items()))
+            if finished_at > deadline and len(completed) <= self.max_completed:
+                break
+            completed.popitem(last=False)
+            evicted.append(self._orders.pop(order_code))
+        return evicted
+
+
+# Kho đơn hàng dùng chung cho toàn bộ ứng dụng
+order_store = OrderStore(storage=default_storage if default_storage.persistent else None)
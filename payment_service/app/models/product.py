@@ -1,9 +1,12 @@
 """
 Product Model - Quản lý sản phẩm trong máy bán hàng
 """
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 from pydantic import BaseModel
 
+from app.models.catalog import ProductCatalog
+from app.models.storage import storage
+
 
 class Product(BaseModel):
     """Model sản phẩm"""
@@ -22,6 +25,8 @@ class ProductResponse(BaseModel):
     success: bool
     data: List[Product]
     message: Optional[str] = None
+    version: Optional[int] = None        # Version catalog tại thời điểm trả lời
+    removed: Optional[List[int]] = None  # Chỉ có khi gọi ?since=: id sản phẩm cần bỏ khỏi danh sách
 
 
 # Dữ liệu sản phẩm mẫu
@@ -109,32 +114,74 @@ SAMPLE_PRODUCTS = [
 ]
 
 
+# Catalog có chỉ mục - mọi truy cập sản phẩm đi qua đây. Dữ liệu mẫu chỉ được ghi
+# vào lớp lưu trữ khi còn trống; với SQLite, lần chạy sau đọc lại stock đã lưu.
+storage.seed_products(p.model_dump() for p in SAMPLE_PRODUCTS)
+catalog = ProductCatalog(
+    (Product(**row) for row in storage.load_products()),
+    storage=storage if storage.persistent else None
+)
+
+
 def get_all_products() -> List[Product]:
-    """Lấy tất cả sản phẩm"""
-    return [p for p in SAMPLE_PRODUCTS if p.is_available]
+    """Lấy tất cả sản phẩm đang bán"""
+    return catalog.list_available()
+
+
+def get_products_by_category(category: str) -> List[Product]:
+    """Lấy sản phẩm đang bán theo category"""
+    return catalog.list_by_category(category)
+
+
+def is_known_category(category: str) -> bool:
+    """Category có trong catalog (dùng để không cache theo chuỗi tuỳ ý từ client)"""
+    return catalog.has_category(category)
+
+
+def get_catalog_version() -> int:
+    """Version hiện tại của catalog (tăng mỗi khi sản phẩm/stock thay đổi)"""
+    return catalog.version
+
+
+def get_product_version(product_id: int) -> int:
+    """Version lần thay đổi cuối của một sản phẩm"""
+    return catalog.product_version(product_id)
+
+
+def add_product_listener(listener: Callable[[int], None]) -> None:
+    """
+    Đăng ký hàm được gọi với product_id mỗi khi sản phẩm / stock thay đổi.
+
+    Mọi đường ghi (update_product_stock, decrease_product_stock, giữ chỗ được
+    chốt khi xuất hàng...) đều đi qua catalog nên không bỏ sót thay đổi nào.
+    """
+    catalog.add_listener(listener)
+
+
+def get_product_changes(since: int, category: Optional[str] = None) -> Tuple[int, List[Product], List[int]]:
+    """Sản phẩm đang bán đã thay đổi sau version since và id sản phẩm không còn bán"""
+    version, changed, removed = catalog.changed_since(since)
+    if category:
+        removed += [p.id for p in changed if p.category != category]
+        changed = [p for p in changed if p.category == category]
+    return version, changed, removed
 
 
 def get_product_by_id(product_id: int) -> Optional[Product]:
     """Lấy sản phẩm theo ID"""
-    for product in SAMPLE_PRODUCTS:
-        if product.id == product_id and product.is_available:
-            return product
-    return None
+    return catalog.get_available(product_id)
+
+
+def get_available_stock(product_id: int) -> int:
+    """Stock còn có thể bán (đã trừ phần đang giữ cho đơn chờ thanh toán)"""
+    return catalog.available_stock(product_id)
 
 
 def update_product_stock(product_id: int, new_stock: int) -> bool:
     """Cập nhật stock sản phẩm"""
-    for product in SAMPLE_PRODUCTS:
-        if product.id == product_id:
-            product.stock = new_stock
-            return True
-    return False
+    return catalog.set_stock(product_id, new_stock)
 
 
 def decrease_product_stock(product_id: int, quantity: int = 1) -> bool:
-    """Giảm stock sản phẩm khi bán"""
-    product = get_product_by_id(product_id)
-    if product and product.stock >= quantity:
-        product.stock -= quantity
-        return True
-    return False
\ No newline at end of file
+    """Giảm stock sản phẩm khi bán (kiểm tra và trừ nguyên tử)"""
+    return catalog.decrement_stock(product_id, quantity)
@@ -0,0 +1,513 @@
+"""
+Lớp lưu trữ cho sản phẩm, stock và đơn hàng - chọn bằng STORAGE_BACKEND.
+
+- memory: mọi thứ chỉ nằm trong RAM (catalog, kho đơn hàng), mất khi khởi động
+  lại và không chia sẻ được giữa các worker. Mặc định, giữ nguyên hành vi cũ.
+- sqlite: ghi xuống file SQLite ở chế độ WAL (SQLITE_PATH) - dữ liệu còn sau
+  khi khởi động lại và nhiều worker (process) dùng chung một file.
+
+Với SQLite:
+- Đọc dùng pool kết nối riêng của mỗi worker (tối đa SQLITE_POOL_SIZE kết nối).
+- Mọi câu ghi đi qua một thread ghi duy nhất: các yêu cầu đang chờ được gom
+  vào một transaction (group commit) nên N lần trừ stock đồng thời chỉ tốn
+  một lần commit. Thao tác ghi chờ tới khi commit xong, nên code async gọi
+  chúng qua storage.offload() (thread pool) để không chặn event loop.
+- Trừ stock là một câu UPDATE có điều kiện (stock - reserved >= số lượng) -
+  nguyên tử giữa các worker, không bao giờ bán vượt stock.
+- Giữ chỗ cho đơn chờ thanh toán cũng nằm trong database (cột reserved và bảng
+  reservations theo order_code): hai worker không thể cùng giữ món cuối cùng, và
+  worker nào nhận xác nhận xuất hàng cũng chốt / trả lại được giữ chỗ của đơn.
+- Câu SQL là hằng số: module sqlite3 giữ sẵn statement đã prepare theo từng
+  kết nối (cached_statements), không phải parse lại mỗi lần gọi.
+- Kết nối và thread ghi thuộc về từng process: sau close() hoặc sau khi fork
+  (server nhiều worker nạp sẵn code rồi mới fork) chúng được mở lại ở lần dùng kế tiếp.
+
+Lớp này không import model Pydantic: sản phẩm trả về dạng dict, đơn hàng
+được ghi dưới dạng JSON của model.
+"""
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.config import STORAGE_BACKEND, SQLITE_PATH, SQLITE_POOL_SIZE, SQLITE_BATCH_SIZE
+from app.services.order_id import MAX_NODE_ID, NODE_SHIFT
+
+PRODUCT_FIELDS = ("id", "name", "price", "stock", "image_url", "description", "category", "is_available")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    stock INTEGER NOT NULL CHECK (stock >= 0),
+    image_url TEXT,
+    description TEXT,
+    category TEXT,
+    is_available INTEGER NOT NULL DEFAULT 1,
+    reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+    changed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    order_code INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reservations_expires_at ON reservations (expires_at);
+CREATE TABLE IF NOT EXISTS orders (
+    order_code INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_updated_at ON orders (updated_at);
+"""
+
+SQL_SELECT_PRODUCTS = f"SELECT {', '.join(PRODUCT_FIELDS)} FROM products ORDER BY rowid"
+# Thời điểm hiện tại (giây, unix) tính trong SQLite - mọi câu ghi sản phẩm đặt changed_at bằng giá trị này
+SQL_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+# Cột thêm sau khi đã có database: tên cột -> câu ALTER (chạy khi mở database cũ)
+PRODUCT_MIGRATIONS = {
+    "reserved": "ALTER TABLE products ADD COLUMN reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0)",
+    "changed_at": "ALTER TABLE products ADD COLUMN changed_at REAL NOT NULL DEFAULT 0",
+}
+SQL_INDEX_PRODUCTS_CHANGED_AT = "CREATE INDEX IF NOT EXISTS products_changed_at ON products (changed_at)"
+
+SQL_SELECT_STOCK = "SELECT id, stock, is_available, reserved FROM products"
+SQL_SELECT_STOCK_SINCE = (
+    "SELECT id, stock, is_available, reserved, changed_at FROM products WHERE changed_at > ? ORDER BY changed_at"
+)
+SQL_COUNT_PRODUCTS = "SELECT COUNT(*) FROM products"
+SQL_UPSERT_PRODUCT = (
+    f"INSERT INTO products ({', '.join(PRODUCT_FIELDS)}, changed_at) "
+    f"VALUES ({', '.join('?' * len(PRODUCT_FIELDS))}, {SQL_NOW}) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{field} = excluded.{field}" for field in PRODUCT_FIELDS[1:] + ("changed_at",))
+)
+SQL_DELETE_PRODUCT = "DELETE FROM products WHERE id = ?"
+SQL_SET_STOCK = f"UPDATE products SET stock = ?, changed_at = {SQL_NOW} WHERE id = ?"
+SQL_DECREMENT_STOCK = (
+    f"UPDATE products SET stock = stock - ?, changed_at = {SQL_NOW} WHERE id = ? AND stock - reserved >= ? "
+    "RETURNING stock"
+)
+SQL_RESERVE_STOCK = (
+    f"UPDATE products SET reserved = reserved + ?, changed_at = {SQL_NOW} "
+    "WHERE id = ? AND is_available = 1 AND stock - reserved >= ? RETURNING stock, reserved"
+)
+SQL_RELEASE_RESERVED = (
+    f"UPDATE products SET reserved = MAX(reserved - ?, 0), changed_at = {SQL_NOW} WHERE id = ? "
+    "RETURNING stock, reserved"
+)
+SQL_COMMIT_RESERVED = (
+    f"UPDATE products SET stock = stock - ?, reserved = MAX(reserved - ?, 0), changed_at = {SQL_NOW} "
+    "WHERE id = ? AND stock >= ? RETURNING stock, reserved"
+)
+SQL_SELECT_PRODUCT_STOCK = "SELECT stock, reserved FROM products WHERE id = ?"
+SQL_SELECT_RESERVATION = "SELECT product_id, quantity, expires_at FROM reservations WHERE order_code = ?"
+SQL_INSERT_RESERVATION = "INSERT INTO reservations (order_code, product_id, quantity, expires_at) VALUES (?, ?, ?, ?)"
+SQL_DELETE_RESERVATION = "DELETE FROM reservations WHERE order_code = ? RETURNING product_id, quantity"
+SQL_DELETE_EXPIRED_RESERVATIONS = "DELETE FROM reservations WHERE expires_at <= ? RETURNING product_id, quantity"
+SQL_UPSERT_ORDER = (
+    "INSERT INTO orders (order_code, status, updated_at, data) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(order_code) DO UPDATE SET "
+    "status = excluded.status, updated_at = excluded.updated_at, data = excluded.data"
+)
+SQL_UPDATE_ORDER = (
+    "UPDATE orders SET status = ?, updated_at = ?, data = ? WHERE order_code = ? AND status = ?"
+)
+SQL_SELECT_ORDER = "SELECT data FROM orders WHERE order_code = ?"
+SQL_SELECT_ORDERS_SINCE = (
+    "SELECT order_code, status, updated_at, data FROM orders WHERE updated_at > ? ORDER BY updated_at"
+)
+SQL_SELECT_WAITING_ORDERS = (
+    "SELECT data FROM orders WHERE order_code > ? AND order_code <= ? AND status IN ('CREATED', 'PENDING') "
+    "ORDER BY order_code LIMIT ?"
+)
+SQL_SELECT_NODE_WAITING_ORDERS = (
+    "SELECT data FROM orders WHERE order_code > ? AND order_code <= ? AND status IN ('CREATED', 'PENDING') "
+    f"AND (order_code >> {NODE_SHIFT}) & {MAX_NODE_ID} = ? ORDER BY order_code LIMIT ?"
+)
+SQL_DATA_VERSION = "PRAGMA data_version"
+
+
+class MemoryStorage:
+    """Không lưu gì ra ngoài - catalog và kho đơn hàng trong RAM là nguồn dữ liệu duy nhất"""
+
+    persistent = False
+
+    def __init__(self):
+        self._seed: List[Dict[str, Any]] = []
+
+    def seed_products(self, products: Iterable[Dict[str, Any]]) -> None:
+        self._seed = list(products)
+
+    def load_products(self) -> List[Dict[str, Any]]:
+        return list(self._seed)
+
+    async def offload(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Chỉ đọc / ghi RAM, không phải chờ gì - gọi thẳng trên event loop"""
+        return fn(*args, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStorage:
+    """File SQLite (WAL) dùng chung giữa các worker, ghi theo lô qua một thread riêng"""
+
+    persistent = True
+
+    def __init__(self, path: str = SQLITE_PATH, pool_size: int = SQLITE_POOL_SIZE,
+                 batch_size: int = SQLITE_BATCH_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self._pool_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        # Kết nối kế thừa từ process cha sau fork: giữ lại, không dùng và không đóng
+        self._inherited: List[Any] = []
+        self._pid: Optional[int] = None
+        self._writer: Optional[threading.Thread] = None
+        self.commits = 0
+        self.writes = 0
+        self._open()
+
+    def _open(self) -> None:
+        """Mở pool kết nối và thread ghi cho process hiện tại"""
+        if self._pid is not None and self._pid != os.getpid():
+            self._inherited.append((self._pool, self._watch))
+        self._pid = os.getpid()
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._watch: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+        for column, sql in PRODUCT_MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(sql)
+        conn.execute(SQL_INDEX_PRODUCTS_CHANGED_AT)
+        self._pool.put(conn)
+        self._opened = 1
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def _ensure_open(self) -> None:
+        if self._pid != os.getpid() or not self._writer.is_alive():
+            with self._open_lock:
+                if self._pid != os.getpid() or not self._writer.is_alive():
+                    self._open()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: tự quản lý transaction (BEGIN IMMEDIATE ... COMMIT)
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commit không fsync, vẫn an toàn khi process chết (chỉ mất khi mất điện)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    # ----- Đọc (pool kết nối) -----
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        self._ensure_open()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            conn = self._connect() if can_open else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def load_products(self) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            rows = conn.execute(SQL_SELECT_PRODUCTS).fetchall()
+        return [self._product_row(row) for row in rows]
+
+    def load_stock(self) -> List[tuple]:
+        """(id, stock, is_available, reserved) của mọi sản phẩm"""
+        with self._reader() as conn:
+            return [(pid, stock, bool(available), reserved)
+                    for pid, stock, available, reserved in conn.execute(SQL_SELECT_STOCK)]
+
+    def stock_changed_since(self, changed_at: float) -> List[tuple]:
+        """
+        (id, stock, is_available, reserved, changed_at) của các sản phẩm được ghi sau
+        thời điểm changed_at - dùng để đồng bộ với worker khác (quét theo chỉ mục)
+        """
+        with self._reader() as conn:
+            return [(pid, stock, bool(available), reserved, at)
+                    for pid, stock, available, reserved, at in conn.execute(SQL_SELECT_STOCK_SINCE, (changed_at,))]
+
+    def get_reservation(self, order_code: int) -> Optional[tuple]:
+        """(product_id, quantity, expires_at) của giữ chỗ cho đơn, do bất kỳ worker nào tạo"""
+        with self._reader() as conn:
+            return conn.execute(SQL_SELECT_RESERVATION, (order_code,)).fetchone()
+
+    def get_order(self, order_code: int) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute(SQL_SELECT_ORDER, (order_code,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def orders_changed_since(self, updated_at: float) -> List[tuple]:
+        """
+        (order_code, status, updated_at, JSON) của các đơn được ghi sau thời điểm
+        updated_at - JSON chưa parse để bên gọi bỏ qua đơn không quan tâm với chi phí thấp
+        """
+        with self._reader() as conn:
+            return conn.execute(SQL_SELECT_ORDERS_SINCE, (updated_at,)).fetchall()
+
+    def orders_waiting(self, after: int, until: int, limit: int,
+                       node_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Đơn CREATED / PENDING có after < order_code <= until (quét theo khoá chính), mã nhỏ nhất trước;
+        có node_id thì chỉ lấy đơn có mã do node đó sinh
+        """
+        with self._reader() as conn:
+            if node_id is None:
+                rows = conn.execute(SQL_SELECT_WAITING_ORDERS, (after, until, limit)).fetchall()
+            else:
+                rows = conn.execute(SQL_SELECT_NODE_WAITING_ORDERS, (after, until, node_id, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def data_changed(self) -> bool:
+        """
+        Có kết nối khác (worker khác hoặc thread ghi) commit kể từ lần hỏi trước không.
+
+        PRAGMA data_version chỉ có nghĩa trên cùng một kết nối, nên dùng kết nối
+        riêng - chỉ gọi từ một chỗ (tác vụ đồng bộ, app/services/storage_sync.py).
+        """
+        self._ensure_open()
+        if self._watch is None:
+            self._watch = self._connect()
+        version = self._watch.execute(SQL_DATA_VERSION).fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    @staticmethod
+    def _product_row(row: tuple) -> Dict[str, Any]:
+        product = dict(zip(PRODUCT_FIELDS, row))
+        product["is_available"] = bool(product["is_available"])
+        return product
+
+    # ----- Ghi (group commit) -----
+
+    async def offload(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Chạy fn (có đọc / ghi database) trong thread pool, chờ kết quả mà không chặn event loop.
+
+        Các request đang chờ commit cùng lúc nằm ở các thread khác nhau, nên thread
+        ghi gom được chúng vào một transaction thay vì commit lần lượt từng cái.
+        """
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def _submit(self, operation: Callable[[sqlite3.Connection], Any], wait: bool = True) -> Any:
+        """Đưa một thao tác ghi vào lô kế tiếp; wait=True thì chờ commit xong và trả kết quả"""
+        self._ensure_open()
+        future: Future = Future()
+        self._writes.put((operation, future))
+        return future.result() if wait else None
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        while True:
+            item = self._writes.get()
+            if item is None:
+                break
+            # Gom mọi thao tác đang chờ (tối đa batch_size) vào một transaction
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._writes.put(None)  # Xử lý nốt lô này rồi mới dừng
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for operation, _ in batch:
+                # SAVEPOINT để một thao tác lỗi không kéo theo cả lô
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((operation(conn), None))
+                    conn.execute("RELEASE op")
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((None, e))
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.commits += 1
+        self.writes += len(batch)
+        for (_, future), (result, error) in zip(batch, results):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def seed_products(self, products: Iterable[Dict[str, Any]]) -> None:
+        """Ghi dữ liệu mẫu khi database còn trống (lần chạy đầu tiên)"""
+        products = list(products)
+
+        def seed(conn: sqlite3.Connection) -> None:
+            if conn.execute(SQL_COUNT_PRODUCTS).fetchone()[0] == 0:
+                conn.executemany(SQL_UPSERT_PRODUCT, [tuple(p[f] for f in PRODUCT_FIELDS) for p in products])
+
+        self._submit(seed)
+
+    def save_product(self, product: Dict[str, Any]) -> None:
+        values = tuple(product[field] for field in PRODUCT_FIELDS)
+        self._submit(lambda conn: conn.execute(SQL_UPSERT_PRODUCT, values))
+
+    def delete_product(self, product_id: int) -> None:
+        self._submit(lambda conn: conn.execute(SQL_DELETE_PRODUCT, (product_id,)))
+
+    def set_stock(self, product_id: int, stock: int) -> None:
+        self._submit(lambda conn: conn.execute(SQL_SET_STOCK, (stock, product_id)))
+
+    def decrement_stock(self, product_id: int, quantity: int = 1) -> Optional[int]:
+        """
+        Trừ stock nếu còn đủ (nguyên tử giữa mọi worker).
+
+        Returns:
+            stock còn lại sau khi trừ, hoặc None nếu không đủ hàng / không có sản phẩm
+        """
+        def decrement(conn: sqlite3.Connection) -> Optional[int]:
+            row = conn.execute(SQL_DECREMENT_STOCK, (quantity, product_id, quantity)).fetchone()
+            return row[0] if row else None
+
+        return self._submit(decrement)
+
+    def reserve_stock(self, order_code: int, product_id: int, quantity: int,
+                      expires_at: float) -> Optional[tuple]:
+        """
+        Giữ chỗ cho đơn nếu stock chưa bị giữ còn đủ (nguyên tử giữa mọi worker).
+
+        Giữ chỗ đã quá expires_at (kể cả của worker đã chết) được trả lại trong
+        cùng transaction. Gọi lại với cùng order_code không giữ thêm.
+
+        Returns:
+            (stock, reserved) của sản phẩm sau khi giữ, hoặc None nếu không đủ hàng
+        """
+        def reserve(conn: sqlite3.Connection) -> Optional[tuple]:
+            for expired_product, expired_quantity in conn.execute(
+                    SQL_DELETE_EXPIRED_RESERVATIONS, (time.time(),)).fetchall():
+                conn.execute(SQL_RELEASE_RESERVED, (expired_quantity, expired_product)).fetchall()
+            if conn.execute(SQL_SELECT_RESERVATION, (order_code,)).fetchone() is not None:
+                return conn.execute(SQL_SELECT_PRODUCT_STOCK, (product_id,)).fetchone()
+            row = conn.execute(SQL_RESERVE_STOCK, (quantity, product_id, quantity)).fetchone()
+            if row is not None:
+                conn.execute(SQL_INSERT_RESERVATION, (order_code, product_id, quantity, expires_at))
+            return row
+
+        return self._submit(reserve)
+
+    def release_reservation(self, order_code: int) -> Optional[tuple]:
+        """
+        Trả lại giữ chỗ của đơn.
+
+        Returns:
+            (product_id, stock, reserved) sau khi trả, hoặc None nếu đơn không còn giữ chỗ
+        """
+        def release(conn: sqlite3.Connection) -> Optional[tuple]:
+            row = conn.execute(SQL_DELETE_RESERVATION, (order_code,)).fetchone()
+            if row is None:
+                return None
+            product_id, quantity = row
+            counts = conn.execute(SQL_RELEASE_RESERVED, (quantity, product_id)).fetchone()
+            return (product_id, *counts) if counts else None
+
+        return self._submit(release)
+
+    def commit_reservation(self, order_code: int) -> Optional[tuple]:
+        """
+        Chốt giữ chỗ của đơn: trừ stock và bỏ giữ chỗ trong cùng một transaction.
+
+        Không đủ stock để trừ (stock bị sửa thấp hơn phần đang giữ) thì không đổi gì:
+        giữ chỗ còn nguyên và được trả khi hết hạn / huỷ đơn như bình thường.
+
+        Returns:
+            (product_id, stock, reserved) sau khi chốt, hoặc None nếu đơn không còn giữ chỗ / không chốt được
+        """
+        def commit(conn: sqlite3.Connection) -> Optional[tuple]:
+            row = conn.execute(SQL_SELECT_RESERVATION, (order_code,)).fetchone()
+            if row is None:
+                return None
+            product_id, quantity, _ = row
+            counts = conn.execute(SQL_COMMIT_RESERVED, (quantity, quantity, product_id, quantity)).fetchone()
+            if counts is None:
+                return None
+            conn.execute(SQL_DELETE_RESERVATION, (order_code,)).fetchall()
+            return (product_id, *counts)
+
+        return self._submit(commit)
+
+    def save_order(self, order: Any, wait: bool = True) -> None:
+        """Ghi (hoặc ghi đè) đơn hàng; wait=False thì không chờ commit, đơn được ghi cùng lô kế tiếp"""
+        values = (order.order_code, order.status.value, order.updated_at, order.model_dump_json())
+        self._submit(lambda conn: conn.execute(SQL_UPSERT_ORDER, values), wait=wait)
+
+    def update_order(self, order: Any, expected_status: str) -> bool:
+        """Ghi trạng thái mới của đơn chỉ khi trạng thái trong database vẫn là expected_status"""
+        values = (order.status.value, order.updated_at, order.model_dump_json(), order.order_code, expected_status)
+        return self._submit(lambda conn: conn.execute(SQL_UPDATE_ORDER, values).rowcount == 1)
+
+    def flush(self) -> None:
+        """Chờ mọi thao tác ghi đã gửi trước đó được commit"""
+        self._submit(lambda conn: None)
+
+    def close(self) -> None:
+        """Ghi nốt hàng đợi rồi đóng mọi kết nối (lần dùng sau sẽ mở lại)"""
+        if self._pid != os.getpid() or not self._writer.is_alive():
+            return
+        self._writes.put(None)
+        self._writer.join()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None
+
+
+def create_storage(backend: str = STORAGE_BACKEND):
+    """Tạo lớp lưu trữ theo tên backend (memory | sqlite)"""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"STORAGE_BACKEND không hợp lệ: {backend} (chọn memory hoặc sqlite)")
+
+
+# Lớp lưu trữ dùng chung cho toàn bộ ứng dụng
+storage = create_storage()
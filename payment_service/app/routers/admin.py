@@ -0,0 +1,93 @@
+"""
+Router quản trị - chỉ dùng được khi đặt ADMIN_TOKEN và gửi kèm header X-Admin-Token
+"""
+import hmac
+import inspect
+import threading
+from typing import Callable, Iterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from app.config import ADMIN_TOKEN, PROFILER_INTERVAL, PROFILER_MAX_SECONDS
+from app.services.profiler import ProfilerBusyError, profiler
+from app.services.reconciler import ReconcilerBusyError, reconciler
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+def route_endpoints(routes, path: str) -> Iterator[Callable]:
+    """Hàm xử lý của mọi route có path (duyệt cả router được include lồng nhau)"""
+    for route in routes:
+        if getattr(route, "path", None) == path and hasattr(route, "endpoint"):
+            yield inspect.unwrap(route.endpoint)
+        # Router include qua app.include_router: FastAPI mới bọc lại, bản cũ trải phẳng
+        nested = getattr(getattr(route, "original_router", route), "routes", None)
+        if nested is not None and nested is not routes:
+            yield from route_endpoints(nested, path)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """Chặn request không có token quản trị đúng"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="API quản trị bị tắt (chưa cấu hình ADMIN_TOKEN)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Sai hoặc thiếu X-Admin-Token")
+
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+async def profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS, description="Thời gian lấy mẫu (giây)"),
+    interval: float = Query(PROFILER_INTERVAL, ge=0.001, le=1, description="Chu kỳ lấy mẫu (giây)"),
+    route: Optional[str] = Query(None, description="Chỉ giữ mẫu của request tới route này (kể cả task con), vd. /api/create-payment"),
+    threads: str = Query("loop", pattern="^(loop|all)$", description="loop: chỉ thread event loop; all: mọi thread"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+):
+    """
+    Profile worker nhận request này bằng cách lấy mẫu stack trong seconds giây.
+
+    Trả về collapsed stacks (flamegraph.pl / speedscope đọc được), hoặc JSON kèm
+    danh sách hàm tốn CPU nhất khi format=json. Chạy nhiều worker thì chỉ worker
+    nhận request được profile.
+    """
+    codes = None
+    if route is not None:
+        codes = {endpoint.__code__ for endpoint in route_endpoints(request.app.routes, route)}
+        if not codes:
+            raise HTTPException(status_code=404, detail=f"Không có route {route}")
+
+    thread_ids = [threading.get_ident()] if threads == "loop" else None
+    try:
+        result = await profiler.profile(seconds, interval, thread_ids=thread_ids, codes=codes, route=route)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "json":
+        return {
+            "success": True,
+            "mode": result.mode,
+            "duration": round(result.duration, 3),
+            "interval": result.interval,
+            "samples": result.samples,
+            "matched": result.matched,
+            "top": [{"function": name, "samples": count} for name, count in result.top()],
+            "collapsed": result.collapsed(),
+        }
+    return PlainTextResponse(result.collapsed(), headers={
+        "X-Profile-Samples": str(result.samples),
+        "X-Profile-Matched": str(result.matched),
+    })
+
+
+@router.post("/reconcile", dependencies=[Depends(require_admin)])
+async def reconcile():
+    """
+    Đối soát ngay các đơn chờ thanh toán đã cũ với PayOS (không chờ tới chu kỳ
+    RECONCILE_INTERVAL), trả về số đơn đã hỏi / đã sửa và thời gian chạy.
+    """
+    try:
+        report = await reconciler.run_once()
+    except ReconcilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, **report.to_dict(), "pending_recheck": reconciler.pending_recheck}
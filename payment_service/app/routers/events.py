@@ -0,0 +1,94 @@
+"""
+Router đẩy sự kiện trạng thái đơn hàng tới kiosk qua Server-Sent Events (SSE)
+
+- GET /api/events/orders/{order_code}: theo dõi một đơn, tự đóng khi đơn kết thúc
+- GET /api/events/machines/{machine_id}: theo dõi mọi đơn của một máy
+"""
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.models.order import Order, STATUS_MESSAGES, TERMINAL_STATUSES, order_store
+from app.models.storage import storage
+from app.services.pubsub import pubsub, order_topic, machine_topic
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Gửi comment giữ kết nối mỗi KEEPALIVE_INTERVAL giây để proxy không cắt kết nối
+KEEPALIVE_INTERVAL = 15
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Tắt buffer của nginx
+}
+
+
+def order_event(order: Order) -> dict:
+    """Nội dung sự kiện trạng thái đơn hàng"""
+    return {
+        "order_code": order.order_code,
+        "status": order.status.value,
+        "machine_id": order.machine_id,
+        "product_id": order.product_id,
+        "message": STATUS_MESSAGES[order.status],
+        "final": order.status in TERMINAL_STATUSES,
+    }
+
+
+def publish_order_update(order: Order) -> None:
+    """Đẩy trạng thái mới của đơn tới topic của đơn và của máy"""
+    data = order_event(order)
+    pubsub.publish(order_topic(order.order_code), data)
+    pubsub.publish(machine_topic(order.machine_id), data)
+
+
+order_store.add_listener(publish_order_update)
+
+
+async def _stream(topic: str, order_code: int = None):
+    """
+    Sinh các dòng SSE cho một topic.
+
+    Với topic của một đơn hàng: gửi trạng thái hiện tại trước (đăng ký rồi mới
+    đọc nên không lỡ sự kiện nào) và đóng stream khi đơn kết thúc.
+    """
+    with pubsub.subscribe(topic) as subscription:
+        if order_code is not None:
+            order = await storage.offload(order_store.get, order_code)
+            if order is None:
+                return
+            yield f"event: status\ndata: {json.dumps(order_event(order), ensure_ascii=False)}\n\n"
+            if order.status in TERMINAL_STATUSES:
+                return
+
+        while True:
+            message = await subscription.get(timeout=KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: status\ndata: {message}\n\n"
+            if order_code is not None and '"final": true' in message:
+                return
+
+
+@router.get("/orders/{order_code}")
+async def order_events(order_code: int):
+    """Theo dõi trạng thái một đơn hàng"""
+    if await storage.offload(order_store.get, order_code) is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy đơn hàng")
+    return StreamingResponse(
+        _stream(order_topic(order_code), order_code),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.get("/machines/{machine_id}")
+async def machine_events(machine_id: str):
+    """Theo dõi mọi đơn hàng của một máy"""
+    return StreamingResponse(
+        _stream(machine_topic(machine_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
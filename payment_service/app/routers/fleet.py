@@ -0,0 +1,32 @@
+"""
+Router trạng thái đội máy bán hàng (dựa trên heartbeat)
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.telemetry import ONLINE, OFFLINE, fleet
+
+router = APIRouter(prefix="/api/fleet", tags=["fleet"])
+
+
+@router.get("/status")
+async def fleet_status(status: Optional[str] = None):
+    """Tổng quan đội máy; lọc danh sách theo status=ONLINE|OFFLINE nếu có"""
+    if status is not None and status.upper() not in (ONLINE, OFFLINE):
+        raise HTTPException(status_code=400, detail="status phải là ONLINE hoặc OFFLINE")
+    machines = fleet.list_machines(status.upper() if status else None)
+    return {
+        "success": True,
+        "summary": fleet.summary(),
+        "data": machines,
+    }
+
+
+@router.get("/machines/{machine_id}")
+async def machine_status(machine_id: str):
+    """Trạng thái và lịch sử heartbeat gần đây của một máy"""
+    machine = fleet.get(machine_id)
+    if machine is None:
+        raise HTTPException(status_code=404, detail="Máy chưa gửi heartbeat nào")
+    return {"success": True, "data": machine}
@@ -0,0 +1,94 @@
+"""
+Router máy bán hàng và slot (sơ đồ khay hàng)
+
+GET /api/machines/{machine_id}/products trả về sản phẩm của mọi slot trong máy
+đã ghép sẵn thông tin sản phẩm, để kiosk khởi động chỉ cần một request thay cho
+một request lấy slot rồi thêm một request cho mỗi sản phẩm.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.models.machine import MachineProductsResponse, machines
+from app.routers.products import is_not_modified, not_modified
+
+router = APIRouter(prefix="/api", tags=["machines"])
+
+
+def machine_products_etag(machine_id: str, include_empty: bool = False) -> str:
+    """ETag của view sản phẩm theo máy: đổi khi slot của máy hoặc sản phẩm trong slot thay đổi"""
+    suffix = "-all" if include_empty else ""
+    return f'W/"machine-{machine_id}-{machines.products_version(machine_id)}{suffix}"'
+
+
+@router.get("/machines")
+async def list_machines():
+    """Lấy danh sách máy bán hàng"""
+    data = machines.list_machines()
+    return {"success": True, "data": data, "message": f"Tìm thấy {len(data)} máy"}
+
+
+@router.get("/machines/{machine_id}")
+async def get_machine(machine_id: str):
+    """Lấy thông tin máy theo ID"""
+    machine = machines.get_machine(machine_id)
+    if machine is None:
+        raise HTTPException(status_code=404, detail="Máy không tồn tại")
+    return {"success": True, "data": machine}
+
+
+@router.get("/machines/{machine_id}/products", response_model=MachineProductsResponse)
+async def get_machine_products(machine_id: str, request: Request, response: Response,
+                               include_empty: bool = False):
+    """Sản phẩm theo từng slot của máy (kèm slot_id, slot_no; stock = số lượng trong slot)"""
+    machine = machines.get_machine(machine_id)
+    if machine is None:
+        raise HTTPException(status_code=404, detail="Máy không tồn tại")
+
+    etag = machine_products_etag(machine_id, include_empty)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    products = machines.products_for_machine(machine_id, include_empty)
+    response.headers["ETag"] = etag
+    return MachineProductsResponse(
+        success=True,
+        machine=machine,
+        data=products,
+        message=f"Tìm thấy {len(products)} sản phẩm trong máy {machine_id}",
+        version=machines.version(machine_id)
+    )
+
+
+@router.get("/slots")
+async def list_slots(machine_id: Optional[str] = None):
+    """Lấy danh sách slot (lọc theo máy nếu có machine_id)"""
+    if machine_id is not None and machine_id not in machines:
+        raise HTTPException(status_code=404, detail="Máy không tồn tại")
+    data = machines.list_slots(machine_id)
+    return {"success": True, "data": data, "message": f"Tìm thấy {len(data)} slot"}
+
+
+@router.get("/slots/{slot_id}")
+async def get_slot(slot_id: int):
+    """Lấy thông tin slot theo ID"""
+    slot = machines.get_slot(slot_id)
+    if slot is None:
+        raise HTTPException(status_code=404, detail="Slot không tồn tại")
+    return {"success": True, "data": slot}
+
+
+@router.put("/slots/{slot_id}/quantity")
+async def update_slot_quantity(slot_id: int, quantity: int):
+    """Cập nhật số lượng hàng trong slot (nạp hàng)"""
+    slot = machines.get_slot(slot_id)
+    if slot is None:
+        raise HTTPException(status_code=404, detail="Slot không tồn tại")
+    if quantity < 0 or quantity > slot.capacity:
+        raise HTTPException(status_code=400, detail=f"Số lượng phải từ 0 đến {slot.capacity}")
+
+    machines.set_slot_quantity(slot_id, quantity)
+    return {
+        "success": True,
+        "message": f"Đã cập nhật slot {slot.slot_no} của máy {slot.machine_id} thành {quantity}"
+    }
@@ -0,0 +1,15 @@
+"""
+Router metrics - Prometheus scrape số liệu của worker nhận request
+"""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.services.metrics import CONTENT_TYPE, metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Histogram độ trễ route / PayOS / stock và bộ đếm PayOS theo định dạng text của Prometheus"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
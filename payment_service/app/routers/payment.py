@@ -1,13 +1,34 @@
 """
 Router xử lý các API thanh toán
 """
-import time
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+import asyncio
+import logging
+import math
+from typing import Any, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from pydantic import BaseModel
 
-from app.services.payos_service import create_payment_link
+from app.config import DOMAIN, IDEMPOTENCY_DOUBLE_TAP, VIETQR_LINK_ATTEMPTS, VIETQR_LINK_RETRY_DELAY
+from app.services.payos_client import create_payment_link_async, payment_link_queue
+from app.services.vietqr_gen import IMAGE_MEDIA_TYPES, order_description, vietqr
+from app.services.order_id import next_order_code
+from app.services.inventory import inventory
+from app.services.order_expiry import order_expiry
+from app.services.dispense import DispenseError, dispense_ledger
+from app.services.payos_webhook import payment_ledger
+from app.services.telemetry import fleet
+from app.services.idempotency import SingleFlightCache
 from app.models.product import get_product_by_id
+from app.models.machine import machines
+from app.models.storage import storage
+from app.models.order import (
+    OrderStatus, InvalidTransitionError, STATUS_MESSAGES, WAITING_STATUSES, order_store
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -16,31 +37,111 @@ class CreatePaymentRequest(BaseModel):
     """Request model cho tạo thanh toán"""
     machine_id: str
     product_id: int
-    amount: int
+    amount: int  # Số tiền kiosk hiển thị - không dùng để tính tiền, đơn luôn lấy giá sản phẩm trên server
+    session_id: Optional[str] = None  # Phiên mua hàng trên kiosk - dùng làm idempotency key nếu không gửi header
+
+
+class HeartbeatRequest(BaseModel):
+    """Request model cho heartbeat của máy"""
+    machine_id: str
+    status: str = "ONLINE"
+    timestamp: Optional[str] = None
+    products: Any = None  # Danh sách/bảng sản phẩm máy đang bán (chỉ giữ bản mới nhất)
+
+
+class DispenseRequest(BaseModel):
+    """Request model cho xác nhận xuất hàng"""
+    order_code: int
+    machine_id: str
+    product_id: Optional[int] = None
+    status: str = "DISPENSED"  # Khác DISPENSED (vd. FAILED, JAMMED): máy không xuất được hàng
+
+
+class DispenseResponse(BaseModel):
+    """Response model cho xác nhận xuất hàng"""
+    success: bool
+    order_code: int
+    status: str
+    duplicate: bool = False
+    message: str
 
 
 class PaymentResponse(BaseModel):
     """Response model cho thanh toán"""
     success: bool
     order_code: int
-    checkout_url: str = None
-    qr_url: str = None
-    message: str = None
+    checkout_url: Optional[str] = None
+    qr_code: Optional[str] = None  # Payload VietQR - kiosk render trực tiếp thành mã QR
+    qr_url: Optional[str] = None   # Ảnh QR render sẵn tại server
+    message: Optional[str] = None
+
+
+# Request tạo thanh toán đang xử lý / vừa xử lý, theo idempotency key
+payment_requests = SingleFlightCache()
+
+
+def payment_request_key(request: CreatePaymentRequest,
+                        idempotency_key: Optional[str]) -> Tuple[tuple, Optional[float], bool]:
+    """
+    (key, ttl, derived) cho một request tạo thanh toán.
+
+    Key luôn gồm máy + sản phẩm + số tiền nên gửi lại cùng key cho sản phẩm
+    khác được coi là request khác. Không có Idempotency-Key thì dùng session_id;
+    không có cả hai thì chỉ gộp các lần bấm trong IDEMPOTENCY_DOUBLE_TAP giây.
+    """
+    fingerprint = (request.machine_id, request.product_id, request.amount)
+    if idempotency_key:
+        return ("key", idempotency_key) + fingerprint, None, False
+    if request.session_id:
+        return ("session", request.session_id) + fingerprint, None, True
+    return ("tap",) + fingerprint, IDEMPOTENCY_DOUBLE_TAP, True
+
+
+def awaiting_payment(result: "PaymentResponse") -> bool:
+    """Đơn của kết quả cũ vẫn đang chờ thanh toán (chưa trả tiền, chưa huỷ / hết hạn)"""
+    order = order_store.get(result.order_code)
+    return order is not None and order.status in (OrderStatus.CREATED, OrderStatus.PENDING)
 
 
 @router.post("/api/create-payment", response_model=PaymentResponse)
-async def create_payment_api(request: CreatePaymentRequest):
-    """API tạo thanh toán cho sản phẩm"""
+async def create_payment_api(
+    request: CreatePaymentRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    API tạo thanh toán cho sản phẩm.
+
+    Kiosk gửi lại cùng Idempotency-Key (hoặc session_id) khi timeout / khách bấm
+    hai lần: các request trùng đang chạy chờ chung một lời gọi PayOS, request
+    lặp lại sau đó nhận lại đúng đơn cũ (header Idempotent-Replayed: true).
+    """
+    key, ttl, derived = payment_request_key(request, idempotency_key)
+    # Key tự suy ra chỉ dùng lại đơn còn chờ thanh toán - khách sau mua cùng món phải có đơn mới
+    result, replayed = await payment_requests.run(
+        key, lambda: start_payment(request), ttl=ttl, reuse=awaiting_payment if derived else None
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+async def start_payment(request: CreatePaymentRequest) -> PaymentResponse:
+    """Tạo đơn, giữ hàng và tạo thanh toán (mã VietQR / link PayOS)"""
     # Kiểm tra sản phẩm tồn tại
     product = get_product_by_id(request.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Sản phẩm không tồn tại")
+    # Số tiền phải trả lấy từ giá sản phẩm, không tin số tiền client gửi lên
+    # (sổ thanh toán so tiền nhận được với order.amount)
+    amount = product.price
     
-    if product.stock <= 0:
-        raise HTTPException(status_code=400, detail="Sản phẩm đã hết hàng")
+    # Tạo order code (không trùng giữa các máy/worker)
+    order_code = next_order_code()
     
-    # Tạo order code
-    order_code = int(time.time())
+    # Giữ 1 sản phẩm cho đơn trong lúc khách thanh toán
+    if not await storage.offload(inventory.reserve, order_code, product.id):
+        raise HTTPException(status_code=400, detail="Sản phẩm đã hết hàng")
     
     # Tạo items cho PayOS
     items = [{
@@ -49,53 +150,199 @@ async def create_payment_api(request: CreatePaymentRequest):
         "price": product.price
     }]
     
+    # Có tài khoản VietQR: sinh mã QR ngay tại server, trả cho kiosk luôn và tạo link PayOS ở nền
+    description = order_description(order_code) if vietqr.configured else None
+    qr_code = None
+    try:
+        if description is not None:
+            qr_code = vietqr.payload(amount, description)
+        await storage.offload(order_store.create, order_code, request.machine_id, product.id, amount,
+                              qr_code=qr_code)
+        order_expiry.track(order_code)
+    except BaseException:
+        # Lỗi hoặc request bị huỷ trước khi đơn được theo dõi hết hạn -> trả hàng đã giữ ngay
+        await asyncio.shield(storage.offload(inventory.release, order_code))
+        raise
+
+    if qr_code is not None:
+        payment_link_queue.submit(open_payment_link, order_code, amount, description, items)
+        return PaymentResponse(
+            success=True,
+            order_code=order_code,
+            qr_code=qr_code,
+            qr_url=qr_image_url(order_code),
+            message="Tạo mã QR thành công"
+        )
+    
     # Tạo payment link
-    result = create_payment_link(
+    result = await create_payment_link_async(
         order_code=order_code,
-        amount=request.amount,
+        amount=amount,
         description=f"Mua {product.name} - Máy {request.machine_id}",
         items=items
     )
     
     if result["success"]:
+        await storage.offload(
+            order_store.transition, order_code, OrderStatus.PENDING,
+            checkout_url=result["checkout_url"], qr_code=result.get("qr_code")
+        )
         return PaymentResponse(
             success=True,
             order_code=order_code,
             checkout_url=result["checkout_url"],
-            qr_url=result.get("qr_url"),
+            qr_code=result.get("qr_code"),
+            qr_url=qr_image_url(order_code) if result.get("qr_code") else None,
             message="Tạo thanh toán thành công"
         )
     else:
+        await storage.offload(cancel_order, order_code)
+        if "retry_after" in result:
+            # PayOS đang lỗi hàng loạt (circuit breaker mở) - kiosk báo khách thử lại sau
+            raise HTTPException(status_code=503, detail=f"Lỗi tạo thanh toán: {result['error']}",
+                                headers={"Retry-After": str(math.ceil(result["retry_after"]))})
         raise HTTPException(status_code=500, detail=f"Lỗi tạo thanh toán: {result['error']}")
 
 
+def cancel_order(order_code: int) -> None:
+    """Huỷ đơn không tạo được thanh toán và trả hàng đã giữ (trừ khi webhook đã ghi nhận tiền)"""
+    if payment_ledger.get(order_code) is not None:
+        return
+    inventory.release(order_code)
+    order_store.transition(order_code, OrderStatus.CANCELLED)
+
+
+def qr_image_url(order_code: int) -> Optional[str]:
+    """Link ảnh QR của đơn (chỉ khi server render được ảnh)"""
+    return f"{DOMAIN}/api/qr/{order_code}" if vietqr.can_render else None
+
+
+async def open_payment_link(order_code: int, amount: int, description: str, items: list,
+                            attempt: int = 1) -> None:
+    """
+    Tạo link PayOS cho đơn đã có mã VietQR (chạy nền).
+
+    Mã QR đã hiện trên kiosk, khách có thể đã chuyển khoản: lỗi thì không huỷ đơn mà
+    đưa lại vào hàng đợi sau một khoảng chờ; hết lượt thử thì đơn hết hạn như thường
+    (hẹn giờ hết hạn không huỷ đơn đã được ghi nhận thanh toán).
+    """
+    result = await create_payment_link_async(
+        order_code=order_code,
+        amount=amount,
+        description=description,
+        items=items
+    )
+    if result["success"]:
+        try:
+            await storage.offload(order_store.transition, order_code, OrderStatus.PENDING,
+                                  checkout_url=result["checkout_url"])
+        except (KeyError, InvalidTransitionError):
+            pass  # Đơn đã được thanh toán / kết thúc trước khi PayOS trả lời
+        return
+
+    order = await storage.offload(order_store.get, order_code)
+    if order is None or order.status not in WAITING_STATUSES or payment_ledger.get(order_code) is not None:
+        return  # Đã thanh toán / kết thúc trong lúc chờ PayOS
+    if attempt >= VIETQR_LINK_ATTEMPTS:
+        logger.error("Không tạo được link PayOS sau %d lần, đơn giữ mã VietQR tới khi hết hạn", attempt,
+                     extra={"order_code": order_code})
+        return
+    logger.warning("Tạo link PayOS lỗi (lần %d), thử lại sau %.0fs", attempt, attempt * VIETQR_LINK_RETRY_DELAY,
+                   extra={"order_code": order_code})
+    asyncio.get_running_loop().call_later(
+        attempt * VIETQR_LINK_RETRY_DELAY, payment_link_queue.submit,
+        open_payment_link, order_code, amount, description, items, attempt + 1
+    )
+
+
+@router.get("/api/qr/{order_code}")
+async def get_order_qr(order_code: int, format: str = "svg"):
+    """Ảnh mã QR thanh toán của đơn hàng (svg hoặc png)"""
+    if format not in IMAGE_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format phải là svg hoặc png")
+    order = await storage.offload(order_store.get, order_code)
+    if order is None or not order.qr_code:
+        raise HTTPException(status_code=404, detail="Đơn hàng không có mã QR")
+    if not vietqr.can_render:
+        raise HTTPException(status_code=501, detail="Server chưa cài segno để render ảnh QR")
+
+    # Render lần đầu tốn vài ms CPU -> chạy trong threadpool, các lần sau lấy từ cache
+    image = await run_in_threadpool(vietqr.render_payload, order.qr_code, format)
+    return Response(content=image, media_type=IMAGE_MEDIA_TYPES[format],
+                    headers={"Cache-Control": "private, max-age=600"})
+
+
 @router.get("/api/order-status/{order_code}")
 async def get_order_status(order_code: int):
     """Kiểm tra trạng thái đơn hàng"""
-    # TODO: Implement order status check with database
-    # Hiện tại trả về PENDING để test
+    order = await storage.offload(order_store.get, order_code)
+    if order is None:
+        # Đơn đã kết thúc lâu có thể đã chuyển xuống file lưu trữ
+        order = await run_in_threadpool(order_store.find, order_code)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy đơn hàng")
+    
+    # Webhook đã xác nhận thanh toán nhưng đơn chưa kịp cập nhật (đang chờ xử lý nền)
+    status = order.status
+    if status in (OrderStatus.CREATED, OrderStatus.PENDING) and payment_ledger.get(order_code):
+        status = OrderStatus.PAID
+    
     return {
         "success": True,
         "order_code": order_code,
-        "status": "PENDING",
-        "message": "Đang chờ thanh toán"
+        "status": status.value,
+        "product_id": order.product_id,
+        "machine_id": order.machine_id,
+        "amount": order.amount,
+        "message": STATUS_MESSAGES[status]
     }
 
 
-@router.post("/api/dispense-complete")
-async def dispense_complete(data: dict):
-    """Xác nhận xuất hàng thành công"""
-    # TODO: Implement dispense confirmation logic
-    return {
-        "success": True,
-        "message": "Đã xác nhận xuất hàng thành công"
-    }
+@router.post("/api/dispense-complete", response_model=DispenseResponse)
+async def dispense_complete(
+    data: DispenseRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Xác nhận xuất hàng thành công: chuyển đơn sang DISPENSED và trừ stock.
+
+    Máy có thể gửi lại cùng Idempotency-Key khi mạng lỗi; các lần sau không trừ stock nữa.
+    Máy báo lỗi (status khác DISPENSED) thì đơn giữ nguyên trạng thái và không trừ stock.
+    """
+    if data.status.upper() != OrderStatus.DISPENSED.value:
+        try:
+            order = await storage.offload(dispense_ledger.fail, data.order_code, data.machine_id, data.status)
+        except DispenseError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        return DispenseResponse(
+            success=False,
+            order_code=order.order_code,
+            status=order.status.value,
+            message=f"Máy báo xuất hàng lỗi ({data.status}), chưa trừ stock"
+        )
+
+    try:
+        record, duplicate = await storage.offload(dispense_ledger.confirm, data.order_code, data.machine_id,
+                                                  idempotency_key)
+    except DispenseError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    if not duplicate:
+        # Trừ hàng trong slot của máy để sơ đồ khay khớp với thực tế
+        machines.decrement_slot(record.machine_id, record.product_id)
+
+    return DispenseResponse(
+        success=True,
+        order_code=record.order_code,
+        status=OrderStatus.DISPENSED.value,
+        duplicate=duplicate,
+        message="Xác nhận xuất hàng đã được xử lý trước đó" if duplicate else "Đã xác nhận xuất hàng thành công"
+    )
 
 
 @router.post("/api/heartbeat")
-async def machine_heartbeat(data: dict):
+async def machine_heartbeat(data: HeartbeatRequest):
     """Nhận heartbeat từ máy bán hàng"""
-    # TODO: Implement machine status tracking
+    fleet.ingest(data.machine_id, data.status, data.products)
     return {
         "success": True,
         "message": "Heartbeat received"
@@ -132,10 +379,10 @@ async def home():
 @router.post("/create-payment")
 async def create_payment():
     """Tạo thanh toán và redirect đến PayOS"""
-    order_code = int(time.time())
+    order_code = next_order_code()
     items = [{"name": "Gói Premium", "quantity": 1, "price": 10000}]
     
-    result = create_payment_link(
+    result = await create_payment_link_async(
         order_code=order_code,
         amount=10000,
         description=f"Thanh toan {order_code}",
@@ -1,39 +1,140 @@
 """
 Router xử lý các API sản phẩm
+
+Các API đọc trả về ETag theo version của catalog: kiosk gửi lại If-None-Match
+và nhận 304 (không body) khi catalog chưa đổi, hoặc gọi ?since=<version> để
+chỉ nhận các sản phẩm đã thay đổi.
+
+Response danh sách / chi tiết sản phẩm được cache dưới dạng JSON bytes (kèm
+bản gzip/brotli) theo version; catalog báo mỗi sản phẩm thay đổi để bỏ đúng
+các mục liên quan.
 """
-from typing import List
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
 from app.models.product import (
     Product, ProductResponse, 
-    get_all_products, get_product_by_id, 
-    update_product_stock, decrease_product_stock
+    get_all_products, get_products_by_category, get_product_by_id, is_known_category,
+    update_product_stock, decrease_product_stock, get_available_stock,
+    get_catalog_version, get_product_version, get_product_changes, add_product_listener
 )
+from app.models.storage import storage
+from app.services.response_cache import ResponseCache
 
 router = APIRouter(prefix="/api", tags=["products"])
 
+# Danh sách (theo category) và chi tiết từng sản phẩm cache riêng để đổi stock
+# một sản phẩm chỉ bỏ đúng mục của nó cùng vài mục danh sách
+list_cache = ResponseCache()
+detail_cache = ResponseCache()
+
+
+def invalidate_product(product_id: int) -> None:
+    """Bỏ các response cache chứa sản phẩm vừa thay đổi"""
+    detail_cache.invalidate(product_id)
+    list_cache.clear()
+
+
+add_product_listener(invalidate_product)
+
+
+def catalog_etag(version: int) -> str:
+    """ETag của response danh sách sản phẩm tại một version catalog"""
+    return f'W/"catalog-{version}"'
+
+
+def product_etag(product_id: int, version: int) -> str:
+    """ETag của response chi tiết sản phẩm tại version thay đổi cuối của nó"""
+    return f'W/"product-{product_id}-{version}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Client đã có bản ứng với etag (header If-None-Match)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # So sánh yếu: bỏ tiền tố W/ ở cả hai phía
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
 
 @router.get("/products", response_model=ProductResponse)
-async def get_products():
-    """Lấy danh sách tất cả sản phẩm"""
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0, description="Chỉ trả về sản phẩm thay đổi sau version này")
+):
+    """Lấy danh sách tất cả sản phẩm (có thể lọc theo category, hoặc chỉ phần thay đổi với ?since=)"""
+    # Đọc version trước dữ liệu: nếu catalog đổi giữa chừng, client chỉ nhận lại thay đổi lần sau
+    version = get_catalog_version()
+    etag = catalog_etag(version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
     try:
-        products = get_all_products()
-        return ProductResponse(
+        # since lớn hơn version hiện tại (vd. server vừa khởi động lại) -> trả toàn bộ danh sách
+        if since is not None and since <= version:
+            response.headers["ETag"] = etag
+            version, products, removed = get_product_changes(since, category)
+            return ProductResponse(
+                success=True,
+                data=products,
+                message=f"{len(products)} sản phẩm thay đổi, {len(removed)} sản phẩm bị bỏ",
+                version=version,
+                removed=removed
+            )
+
+        # Chỉ cache theo category có trong catalog: key là chuỗi client gửi lên,
+        # category tuỳ ý (luôn rỗng) không được phép làm phình cache
+        category = category or None
+        cacheable = list_cache.enabled and (category is None or is_known_category(category))
+        cached = list_cache.get(category, version) if cacheable else None
+        if cached is not None:
+            return cached.to_response(request)
+
+        products = get_products_by_category(category) if category else get_all_products()
+        result = ProductResponse(
             success=True,
             data=products,
-            message=f"Tìm thấy {len(products)} sản phẩm"
+            message=f"Tìm thấy {len(products)} sản phẩm",
+            version=version
         )
+        if not cacheable:
+            response.headers["ETag"] = etag
+            return result
+        return list_cache.put(category, version, etag, result.model_dump_json().encode()).to_response(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi server: {str(e)}")
 
 
 @router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: int):
+async def get_product(product_id: int, request: Request, response: Response):
     """Lấy thông tin sản phẩm theo ID"""
+    # Kiểm tra tồn tại trước: sản phẩm không có (hoặc ngừng bán) trả 404, không kèm ETag / 304
     product = get_product_by_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Sản phẩm không tồn tại")
-    return product
+
+    version = get_product_version(product_id)
+    etag = product_etag(product_id, version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    cached = detail_cache.get(product_id, version)
+    if cached is not None:
+        return cached.to_response(request)
+
+    if not detail_cache.enabled:
+        response.headers["ETag"] = etag
+        return product
+    return detail_cache.put(product_id, version, etag, product.model_dump_json().encode()).to_response(request)
 
 
 @router.put("/products/{product_id}/stock")
@@ -42,7 +143,7 @@ async def update_stock(product_id: int, new_stock: int):
     if new_stock < 0:
         raise HTTPException(status_code=400, detail="Stock không thể âm")
     
-    success = update_product_stock(product_id, new_stock)
+    success = await storage.offload(update_product_stock, product_id, new_stock)
     if not success:
         raise HTTPException(status_code=404, detail="Sản phẩm không tồn tại")
     
@@ -62,16 +163,13 @@ async def purchase_product(product_id: int, quantity: int = 1):
     if not product:
         raise HTTPException(status_code=404, detail="Sản phẩm không tồn tại")
     
-    if product.stock < quantity:
+    # Kiểm tra và trừ stock trong cùng một bước nguyên tử
+    if not await storage.offload(decrease_product_stock, product_id, quantity):
         raise HTTPException(
             status_code=400, 
-            detail=f"Không đủ hàng. Stock hiện tại: {product.stock}"
+            detail=f"Không đủ hàng. Stock hiện tại: {get_available_stock(product_id)}"
         )
     
-    success = decrease_product_stock(product_id, quantity)
-    if not success:
-        raise HTTPException(status_code=500, detail="Lỗi cập nhật stock")
-    
     return {
         "success": True,
         "message": f"Đã mua {quantity} {product.name}",
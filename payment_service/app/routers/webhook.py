@@ -0,0 +1,47 @@
+"""
+Router nhận webhook thanh toán từ PayOS
+
+Handler chỉ làm phần bắt buộc trước khi trả lời PayOS: xác thực chữ ký và
+ghi nhận thanh toán (idempotent theo order_code). Việc cập nhật đơn hàng và
+đẩy thông báo tới kiosk được đưa vào hàng đợi nền.
+"""
+import json
+import logging
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.models.storage import storage
+from app.services.background import background_queue
+from app.services.payos_webhook import (
+    InvalidWebhookSignature, PaymentRejected, apply_payment, payment_ledger, webhook_verifier
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["webhook"])
+
+
+@router.post("/payos-webhook")
+async def payos_webhook(request: Request):
+    """Nhận thông báo thanh toán từ PayOS"""
+    try:
+        payload = json.loads(await request.body())
+        data = webhook_verifier.verify(payload)
+    except (ValueError, InvalidWebhookSignature):
+        raise HTTPException(status_code=400, detail="Webhook không hợp lệ")
+
+    # Chỉ xử lý giao dịch thành công (PayOS cũng gửi payload thử khi xác nhận URL)
+    if data.get("code") != "00" or "orderCode" not in data:
+        return {"success": True, "message": "Đã nhận webhook"}
+
+    try:
+        record = await storage.offload(payment_ledger.record, data)
+    except PaymentRejected as e:
+        # Trả 200 để PayOS không gửi lại; đơn không chuyển PAID, cần đối chiếu / hoàn tiền thủ công
+        logger.warning("%s", e, extra={"order_code": data["orderCode"]})
+        return {"success": True, "message": "Thanh toán không được ghi nhận"}
+    if record is None:
+        return {"success": True, "message": "Webhook đã được xử lý trước đó"}
+
+    background_queue.submit(storage.offload, apply_payment, record)
+    return {"success": True, "message": "Đã ghi nhận thanh toán"}
@@ -0,0 +1,82 @@
+"""
+Hàng đợi công việc nền - cho phép handler trả lời ngay và xử lý phần chậm sau.
+
+Công việc có thể là hàm thường hoặc coroutine function. Worker được khởi
+động lười trên event loop đang chạy ở lần submit đầu tiên. Công việc chạy với
+request_id của request đã submit nó, để log của phần chạy nền vẫn nối được
+với request gốc.
+"""
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, List, Optional
+
+from app.services.log import request_id
+
+logger = logging.getLogger(__name__)
+
+# Số công việc tối đa chờ trong hàng đợi
+BACKGROUND_QUEUE_SIZE = 10000
+
+
+class BackgroundQueue:
+    """Hàng đợi công việc nền chạy trên event loop"""
+
+    def __init__(self, maxsize: int = BACKGROUND_QUEUE_SIZE, workers: int = 1):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, fn: Callable, *args: Any) -> bool:
+        """Đưa công việc vào hàng đợi (không chờ); trả về False nếu hàng đợi đầy"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args, request_id.get()))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Hàng đợi nền đầy, bỏ công việc %s", getattr(fn, "__name__", fn))
+            return False
+
+    def pending(self) -> int:
+        """Số công việc đang chờ"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self) -> None:
+        """Chờ xử lý hết các công việc đang có"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Xử lý nốt công việc còn lại rồi dừng worker (gọi khi tắt server)"""
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    async def _worker(self) -> None:
+        while True:
+            fn, args, rid = await self._queue.get()
+            request_id.set(rid)
+            try:
+                result = fn(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("Lỗi công việc nền %s: %s", getattr(fn, "__name__", fn), e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+
+# Hàng đợi dùng chung cho toàn bộ ứng dụng
+background_queue = BackgroundQueue()
@@ -0,0 +1,142 @@
+"""
+Sổ xác nhận xuất hàng (idempotent).
+
+Máy gửi xác nhận xuất hàng kèm Idempotency-Key; mạng ở kiosk chập chờn nên
+cùng một xác nhận có thể tới nhiều lần. Lần đầu: chuyển đơn sang DISPENSED và
+trừ stock trong cùng một bước. Các lần sau được trả lời từ bộ nhớ đệm chống
+trùng (giới hạn kích thước) mà không đụng tới kho hàng.
+
+Bước chuyển PAID -> DISPENSED của OrderStore là cổng duy nhất: chỉ một lời gọi
+vượt qua được, nên stock chỉ bị trừ đúng một lần cho mỗi đơn kể cả khi khóa
+chống trùng đã bị đẩy khỏi bộ nhớ đệm. Khóa đã dùng cho đơn khác bị từ chối
+(409) thay vì trả lại bản ghi của đơn cũ.
+
+Máy báo xuất hàng lỗi (kẹt hàng...) thì không chuyển DISPENSED và không trừ
+stock: đơn giữ nguyên trạng thái đã thanh toán để máy thử lại hoặc hoàn tiền.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.config import DISPENSE_DEDUP_SIZE
+from app.models.order import InvalidTransitionError, Order, OrderStatus, order_store
+from app.models.product import catalog as product_catalog
+from app.services.inventory import inventory as inventory_engine
+from app.services.payos_webhook import apply_payment, payment_ledger
+
+logger = logging.getLogger(__name__)
+
+
+class DispenseError(ValueError):
+    """Không thể xác nhận xuất hàng"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+@dataclass
+class DispenseRecord:
+    """Một lần xuất hàng đã được ghi nhận"""
+    order_code: int
+    machine_id: str
+    product_id: int
+    dispensed_at: float
+    stock_committed: bool
+
+
+class DispenseLedger:
+    """Ghi nhận xuất hàng theo Idempotency-Key, mỗi đơn trừ stock đúng một lần"""
+
+    def __init__(self, orders=order_store, inventory=inventory_engine, catalog=product_catalog,
+                 max_keys: int = DISPENSE_DEDUP_SIZE):
+        self.orders = orders
+        self.inventory = inventory
+        self.catalog = catalog
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # Idempotency-Key -> bản ghi (LRU)
+        self._seen: "OrderedDict[str, DispenseRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _remember(self, key: str, record: DispenseRecord) -> None:
+        self._seen[key] = record
+        if len(self._seen) > self.max_keys:
+            self._seen.popitem(last=False)
+
+    def _get_order(self, order_code: int, machine_id: str) -> Order:
+        order = self.orders.get(order_code)
+        if order is None:
+            raise DispenseError(404, "Không tìm thấy đơn hàng")
+        if order.machine_id != machine_id:
+            raise DispenseError(409, "Đơn hàng không thuộc máy này")
+        return order
+
+    def fail(self, order_code: int, machine_id: str, status: str) -> Order:
+        """
+        Ghi nhận máy xuất hàng lỗi: không đổi trạng thái đơn, không trừ stock.
+
+        Raises:
+            DispenseError: đơn không tồn tại hoặc không thuộc máy này
+        """
+        order = self._get_order(order_code, machine_id)
+        logger.warning("Máy %s báo xuất hàng lỗi (%s), đơn đang ở trạng thái %s", machine_id, status,
+                       order.status.value, extra={"order_code": order_code})
+        return order
+
+    def confirm(self, order_code: int, machine_id: str,
+                idempotency_key: Optional[str] = None) -> Tuple[DispenseRecord, bool]:
+        """
+        Xác nhận máy đã xuất hàng cho đơn.
+
+        Returns:
+            (bản ghi, duplicate) - duplicate=True nếu xác nhận này đã được xử lý trước đó
+
+        Raises:
+            DispenseError: đơn không tồn tại, chưa thanh toán, không thuộc máy này
+                hoặc Idempotency-Key đã được dùng cho đơn khác
+        """
+        key = idempotency_key or f"order:{order_code}"
+        with self._lock:
+            record = self._seen.get(key)
+            if record is not None:
+                if record.order_code != order_code or record.machine_id != machine_id:
+                    raise DispenseError(409, "Idempotency-Key đã được dùng cho đơn hàng khác")
+                self._seen.move_to_end(key)
+                return record, True
+
+            order = self._get_order(order_code, machine_id)
+            if order.status in (OrderStatus.CREATED, OrderStatus.PENDING):
+                # Webhook đã ghi nhận thanh toán nhưng hàng đợi nền chưa kịp chuyển đơn sang PAID
+                payment = payment_ledger.get(order_code)
+                if payment is not None:
+                    apply_payment(payment)
+
+            try:
+                self.orders.transition(order_code, OrderStatus.DISPENSED)
+            except InvalidTransitionError:
+                if order.status == OrderStatus.DISPENSED:
+                    # Đã xuất với khóa khác (hoặc khóa đã bị đẩy khỏi bộ đệm) - không trừ stock lần nữa
+                    record = DispenseRecord(order_code, machine_id, order.product_id, order.updated_at, False)
+                    self._remember(key, record)
+                    return record, True
+                raise DispenseError(409, f"Đơn hàng đang ở trạng thái {order.status.value}, không thể xuất hàng")
+
+            # Chốt phần hàng đã giữ; nếu giữ chỗ đã hết hạn thì trừ thẳng vào stock
+            committed = self.inventory.commit(order_code) or self.catalog.decrement_stock(order.product_id)
+            if not committed:
+                logger.warning("Đơn đã xuất hàng nhưng không trừ được stock sản phẩm %s", order.product_id,
+                               extra={"order_code": order_code})
+            record = DispenseRecord(order_code, machine_id, order.product_id, time.time(), committed)
+            self._remember(key, record)
+            return record, False
+
+
+# Sổ dùng chung cho toàn bộ ứng dụng
+dispense_ledger = DispenseLedger()
@@ -0,0 +1,96 @@
+"""
+Gộp request trùng (single-flight) và trả lời lại kết quả cũ theo idempotency key.
+
+- Các request cùng key đến khi request đầu còn đang chạy không gọi lại hàm xử
+  lý (vd. gọi PayOS) mà chờ chung kết quả của request đầu. Hàm xử lý chạy
+  trong một task riêng: request nào bị huỷ (client ngắt kết nối), kể cả request
+  đầu, cũng không huỷ lời gọi chung của các request còn lại.
+- Kết quả thành công được giữ thêm ttl giây: request lặp lại (khách bấm hai
+  lần, kiosk gửi lại khi timeout) nhận ngay kết quả đó.
+- Lỗi không được cache: request sau được xử lý lại từ đầu.
+
+Cache nằm trong RAM của từng worker (chạy trên event loop, không cần lock).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS
+
+
+class SingleFlightCache:
+    """Bảng key -> kết quả (có hạn dùng) kèm các lời gọi đang chạy theo key"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # key -> (hết hạn lúc, kết quả), cũ nhất ở đầu
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.calls = 0      # Số lần thật sự gọi hàm xử lý
+        self.coalesced = 0  # Số request chờ chung lời gọi đang chạy
+        self.replayed = 0   # Số request được trả lời từ cache
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Optional[Any]:
+        """Kết quả còn hạn của key (None nếu chưa có / đã hết hạn)"""
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= (time.monotonic() if now is None else now):
+            del self._results[key]
+            return None
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._results[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_keys:
+            self._results.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        self._results.pop(key, None)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]], ttl: Optional[float] = None,
+                  reuse: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+        """
+        Chạy fn() một lần cho mỗi key.
+
+        Args:
+            ttl: thời gian giữ kết quả (mặc định self.ttl)
+            reuse: hàm kiểm tra kết quả cũ còn dùng lại được không (vd. đơn chưa bị thanh toán)
+
+        Returns:
+            (kết quả, replayed) - replayed=True nếu kết quả lấy từ cache hoặc từ lời gọi đang chạy
+        """
+        cached = self.get(key)
+        if cached is not None:
+            if reuse is None or reuse(cached):
+                self.replayed += 1
+                return cached, True
+            self.discard(key)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # shield: request chờ bị huỷ (client ngắt) không huỷ lời gọi chung
+            return await asyncio.shield(task), True
+
+        task = asyncio.get_running_loop().create_task(self._call(key, fn, ttl))
+        # Lỗi đã được trả cho các request đang chờ - tránh cảnh báo khi mọi request đều đã ngắt
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        self.calls += 1
+        return await asyncio.shield(task), False
+
+    async def _call(self, key: Hashable, fn: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        """Lời gọi chung của một key - chạy tới khi xong kể cả khi request đã gọi nó bị huỷ"""
+        try:
+            value = await fn()
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, value, ttl)
+        return value
@@ -0,0 +1,129 @@
+"""
+Engine tồn kho - giữ chỗ (reserve) / chốt (commit) / trả lại (release) theo đơn hàng.
+
+- reserve: khi tạo link thanh toán, giữ 1 sản phẩm cho đơn để khách khác không mua mất
+- commit:  khi máy xuất hàng thành công, trừ stock thật và bỏ giữ chỗ
+- release: khi đơn bị huỷ hoặc hết hạn, trả sản phẩm về stock khả dụng
+
+Mỗi thao tác trên stock là nguyên tử theo từng sản phẩm (lock của catalog),
+nên không bao giờ bán vượt stock dù có nhiều coroutine/thread cùng mua.
+
+Với STORAGE_BACKEND=sqlite, giữ chỗ nằm trong database dùng chung theo
+order_code: đơn do worker này tạo vẫn được hẹn hết hạn ở đây, còn đơn do worker
+khác giữ chỗ được tra trong database khi cần chốt / trả lại.
+"""
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import RESERVATION_TTL
+from app.models.product import catalog as product_catalog
+from app.models.storage import storage as default_storage
+
+
+@dataclass
+class Reservation:
+    """Một lần giữ chỗ cho đơn hàng"""
+    order_code: int
+    product_id: int
+    quantity: int
+    expires_at: float  # time.monotonic() của worker đã giữ chỗ
+
+
+class InventoryEngine:
+    """Quản lý giữ chỗ stock theo mã đơn hàng"""
+
+    def __init__(self, catalog=product_catalog, ttl: float = RESERVATION_TTL, storage: Optional[Any] = None):
+        self.catalog = catalog
+        self.ttl = ttl
+        self.storage = storage
+        self._lock = threading.Lock()  # Chỉ bảo vệ bảng reservation, không giữ khi đụng stock
+        self._reservations: Dict[int, Reservation] = {}
+        self._deadlines: List[Tuple[float, int]] = []  # heap (expires_at, order_code)
+
+    def __len__(self) -> int:
+        return len(self._reservations)
+
+    def get(self, order_code: int) -> Optional[Reservation]:
+        """Lấy reservation của đơn hàng"""
+        return self._reservations.get(order_code)
+
+    def reserve(self, order_code: int, product_id: int, quantity: int = 1,
+                ttl: Optional[float] = None) -> bool:
+        """
+        Giữ chỗ sản phẩm cho đơn hàng.
+
+        Gọi lại với cùng order_code là idempotent. Trả về False nếu không đủ hàng.
+        """
+        self.release_expired()
+        if order_code in self._reservations:
+            return True
+        ttl = self.ttl if ttl is None else ttl
+        if not self.catalog.reserve_stock(product_id, quantity, order_code=order_code, expires_at=time.time() + ttl):
+            return False
+
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            if order_code in self._reservations:
+                # Một lời gọi song song đã giữ chỗ trước - trả lại phần vừa giữ
+                duplicate = True
+            else:
+                duplicate = False
+                self._reservations[order_code] = Reservation(order_code, product_id, quantity, expires_at)
+                heapq.heappush(self._deadlines, (expires_at, order_code))
+        if duplicate and self.storage is None:
+            # Giữ chỗ trong database theo order_code vốn không bị giữ hai lần
+            self.catalog.release_reserved(product_id, quantity)
+        return True
+
+    def commit(self, order_code: int) -> bool:
+        """Chốt giữ chỗ khi xuất hàng thành công (trừ stock thật)"""
+        reservation = self._pop(order_code)
+        if reservation is None:
+            return False
+        return self.catalog.commit_reserved(reservation.product_id, reservation.quantity, order_code=order_code)
+
+    def release(self, order_code: int) -> bool:
+        """Trả lại hàng đã giữ khi đơn bị huỷ hoặc hết hạn"""
+        reservation = self._pop(order_code)
+        if reservation is None:
+            return False
+        return self.catalog.release_reserved(reservation.product_id, reservation.quantity, order_code=order_code)
+
+    def release_expired(self, now: Optional[float] = None) -> List[int]:
+        """Trả lại mọi giữ chỗ đã quá hạn, trả về danh sách mã đơn đã giải phóng"""
+        now = time.monotonic() if now is None else now
+        deadlines = self._deadlines
+        if not deadlines or deadlines[0][0] > now:
+            return []
+
+        released = []
+        while True:
+            with self._lock:
+                if not deadlines or deadlines[0][0] > now:
+                    break
+                expires_at, order_code = heapq.heappop(deadlines)
+                reservation = self._reservations.get(order_code)
+                # Bỏ qua mục heap cũ của đơn đã commit/release
+                if reservation is None or reservation.expires_at != expires_at:
+                    continue
+                del self._reservations[order_code]
+            self.catalog.release_reserved(reservation.product_id, reservation.quantity, order_code=order_code)
+            released.append(order_code)
+        return released
+
+    def _pop(self, order_code: int) -> Optional[Reservation]:
+        with self._lock:
+            reservation = self._reservations.pop(order_code, None)
+        if reservation is None and self.storage is not None:
+            # Đơn do worker khác tạo (xác nhận xuất hàng / webhook tới worker này)
+            row = self.storage.get_reservation(order_code)
+            if row is not None:
+                reservation = Reservation(order_code, row[0], row[1], time.monotonic())
+        return reservation
+
+
+# Engine dùng chung cho toàn bộ ứng dụng
+inventory = InventoryEngine(storage=default_storage if default_storage.persistent else None)
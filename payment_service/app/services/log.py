@@ -0,0 +1,271 @@
+"""
+Logging có cấu trúc, không chặn event loop.
+
+- Handler xử lý request chỉ thêm LogRecord vào bộ đệm (deque, không lock, không
+  đánh thức thread nào); cứ flush_interval giây một thread nền lấy hết ra, định
+  dạng (text hoặc JSON) và ghi ra stderr bằng một lần write. Log ERROR được ghi
+  ngay. Bộ đệm đầy thì bỏ log và báo số log đã bỏ ở lần ghi sau, không bao giờ
+  chặn request. (QueueHandler chuẩn đánh thức thread ghi ở mỗi log - trên máy
+  ít CPU việc chuyển GIL qua lại còn tốn hơn tự ghi.)
+- Kiểm tra level trước khi tạo record (logger.debug(...) khi đang ở INFO gần như
+  không tốn gì), và message chỉ được ghép từ template + tham số (kiểu %s) ở thread
+  ghi - không dùng f-string khi gọi logger.
+- Mã tương quan: mỗi request HTTP có một request_id (lấy từ header X-Request-ID
+  hoặc tự sinh, trả lại trong response) gắn vào mọi log phát sinh khi xử lý
+  request đó, kể cả công việc nền được submit từ request.
+- Cảnh báo lặp lại cùng một template bị giới hạn: tối đa burst lần mỗi window
+  giây, lần ghi kế tiếp kèm số lần đã bỏ qua.
+
+Tham số (extra={"order_code": ...}) được ghi thành trường riêng: key=value ở
+dạng text, khoá riêng ở dạng JSON.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, TextIO, Tuple
+
+# request_id của request đang xử lý ("-" ngoài request)
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+# ASGI scope của request đang xử lý (router ghi route khớp vào scope["route"]) - task con tạo trong
+# request (vd. lời gọi chung của SingleFlightCache) thừa hưởng; profiler dùng để lọc mẫu theo route
+request_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_scope", default=None)
+
+# Header X-Request-ID do client gửi chỉ được dùng lại khi đủ ngắn và an toàn để ghi log
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Số template tối đa được theo dõi cho giới hạn cảnh báo lặp lại
+RATE_LIMIT_MAX_KEYS = 1024
+
+# Thuộc tính sẵn có của LogRecord - phần còn lại là trường do extra= thêm vào
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "suppressed", "taskName",
+}
+
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """2026-01-01 12:00:00.123 WARNING app.services.payos_client [req] message key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = (f"{self.formatTime(record)} {record.levelname:<7} {record.name} "
+                f"[{getattr(record, 'request_id', '-')}] {record.getMessage()}")
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            line += f" (đã bỏ qua {suppressed} lần lặp lại)"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+    def formatTime(self, record, datefmt=None):
+        return datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi log một dòng JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            **_fields(record),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Cho qua tối đa burst cảnh báo (WARNING trở lên) cùng template mỗi window giây"""
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._state: Dict[Tuple[str, str], List] = {}  # (logger, template) -> [bắt đầu cửa sổ, số đã ghi, số bỏ qua]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        state = self._state.get(key)
+        if state is None or record.created - state[0] >= self.window:
+            if state is None and len(self._state) >= RATE_LIMIT_MAX_KEYS:
+                self._state.clear()
+            if state is not None and state[2]:
+                record.suppressed = state[2]
+            self._state[key] = [record.created, 1, 0]
+            return True
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class BackgroundHandler(logging.Handler):
+    """Gom record vào bộ đệm; thread nền định dạng và ghi ra stream theo lô"""
+
+    def __init__(self, stream: TextIO, formatter: logging.Formatter, maxsize: int = 10000,
+                 flush_interval: float = 0.1):
+        super().__init__()
+        self.stream = stream
+        self.setFormatter(formatter)
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._unreported = 0
+        self._closed = False
+        self.start()
+
+    def start(self) -> None:
+        """Tạo bộ đệm + thread ghi (gọi lại trong process con sau fork: thread không theo sang)"""
+        self._buffer: Deque[logging.LogRecord] = deque()
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # Không lấy lock của Handler: deque.append an toàn giữa các thread, không có I/O ở đây
+        if not self.filter(record):
+            return False
+        if len(self._buffer) >= self.maxsize:
+            self.dropped += 1
+            self._unreported += 1
+            return False
+        record.request_id = request_id.get()
+        self._buffer.append(record)
+        if record.levelno >= logging.ERROR:
+            self._wake.set()  # Lỗi được ghi ngay, không chờ hết chu kỳ
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle(record)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Định dạng và ghi mọi record đang chờ bằng một lần write"""
+        with self._write_lock:
+            buffer = self._buffer
+            lines = []
+            if self._unreported:
+                lines.append(self.format(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": "Bộ đệm log đầy, đã bỏ %d log", "args": (self._unreported,),
+                })))
+                self._unreported = 0
+            while buffer:
+                record = buffer.popleft()
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except Exception:
+                    pass  # Không có chỗ ghi log thì thôi, không làm hỏng request
+
+    def close(self) -> None:
+        """Ghi nốt log còn trong bộ đệm (logging.shutdown gọi khi thoát)"""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+        super().close()
+
+
+_handler: Optional[BackgroundHandler] = None
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", buffer_size: int = 10000,
+                  flush_interval: float = 0.1, rate_burst: int = 10, rate_window: float = 10.0) -> None:
+    """Cấu hình root logger ghi qua BackgroundHandler (gọi lần đầu có tác dụng, các lần sau bỏ qua)"""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = BackgroundHandler(sys.stderr, JsonFormatter() if fmt == "json" else TextFormatter(),
+                                 buffer_size, flush_interval)
+    _handler.addFilter(RateLimitFilter(rate_burst, rate_window))
+
+    # Định dạng log không dùng file/dòng gọi, thread, process: bỏ thu thập (theo mục
+    # Optimization của logging HOWTO), tạo record nhanh hơn vài µs
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    # httpx ghi INFO cho từng request ra PayOS - chỉ giữ cảnh báo
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+    # serve.py fork worker sau khi import: tạo lại bộ đệm + thread ghi trong từng worker
+    os.register_at_fork(after_in_child=_handler.start)
+
+
+def flush_logging() -> None:
+    """Ghi ngay mọi log đang chờ (dùng trong benchmark / script trước khi in kết quả)"""
+    if _handler is not None:
+        _handler.flush()
+
+
+class RequestIdMiddleware:
+    """Middleware ASGI gắn request_id cho mỗi request HTTP và trả lại qua header X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")
+                break
+        if rid is None or not REQUEST_ID_PATTERN.match(rid):
+            rid = new_request_id()
+        header = (b"x-request-id", rid.encode())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        token = request_id.set(rid)
+        scope_token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_scope.reset(scope_token)
+            request_id.reset(token)
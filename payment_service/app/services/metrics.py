@@ -0,0 +1,205 @@
+"""
+Metrics trong RAM của từng worker, xuất theo định dạng text của Prometheus (GET /metrics).
+
+- Histogram độ trễ dùng bucket cố định tăng theo luỹ thừa 2 (1 µs ... ~33 s):
+  ghi một mẫu chỉ là bisect trên 26 cận + tăng một ô đếm, không cấp phát, không lock.
+  Trên event loop không có tranh chấp; từ thread khác (pool SQLite, to_thread)
+  hiếm khi mất một lần đếm - chấp nhận được cho số liệu quan sát.
+- MetricsMiddleware (ASGI thuần) đo mọi request theo route template
+  (/api/products/{product_id}, không theo đường dẫn thật) + method + status;
+  method lạ và URL không khớp route nào gom vào nhãn cố định để số chuỗi có giới hạn.
+- Counter / gauge sẵn có ở chỗ khác (vd. bộ đếm của ResilientEndpoint) được
+  đọc lúc scrape qua add_collector, không tốn gì trên đường xử lý request.
+
+Mỗi worker giữ số liệu riêng: chạy nhiều worker thì mỗi lần scrape trả về số
+của worker nhận request đó (nhãn worker = pid để phân biệt).
+"""
+import functools
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Cận trên các bucket (giây): 1 µs, 2 µs, 4 µs ... 2^25 µs ≈ 33.5 s
+DEFAULT_BUCKETS = tuple(1e-6 * 2 ** i for i in range(26))
+
+# Method chuẩn giữ nguyên làm nhãn; method lạ gom vào OTHER, request không khớp route vào <unmatched>
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+OTHER_METHOD = "OTHER"
+UNMATCHED_ROUTE = "<unmatched>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (tên, kiểu counter|gauge, mô tả, nhãn, giá trị)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class Histogram:
+    """Một chuỗi histogram (một bộ giá trị nhãn)"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Ô cuối: lớn hơn cận lớn nhất (+Inf)
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Ước lượng percentile = cận trên của bucket chứa nó (None khi chưa có mẫu)"""
+        total = self.count
+        if not total:
+            return None
+        rank = total * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+
+class HistogramFamily:
+    """Histogram có nhãn: mỗi bộ giá trị nhãn là một Histogram riêng"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def observe(self, seconds: float, *values: str) -> None:
+        self.labels(*values).observe(seconds)
+
+    def timed(self, *values: str) -> Callable:
+        """Decorator đo thời gian chạy của hàm (đồng bộ) vào chuỗi có nhãn values"""
+        child = self.labels(*values)
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def render(self, extra: Dict[str, str]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            labels = {**dict(zip(self.labelnames, values)), **extra}
+            cumulative = 0
+            for le, n in zip(bounds, list(child.counts)):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {child.sum!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập hợp histogram + hàm thu thập counter/gauge của một worker"""
+
+    def __init__(self, worker: Optional[str] = None):
+        self.worker = worker  # None: pid của process, lấy lúc scrape (serve.py fork worker sau khi import)
+        self._histograms: Dict[str, HistogramFamily] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> HistogramFamily:
+        """Lấy (hoặc tạo) histogram theo tên"""
+        family = self._histograms.get(name)
+        if family is None:
+            family = self._histograms[name] = HistogramFamily(name, help, labelnames, buckets)
+        return family
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Đăng ký hàm trả về các mẫu counter/gauge, được gọi mỗi lần scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Toàn bộ metrics theo định dạng text của Prometheus"""
+        extra = {"worker": self.worker or str(os.getpid())}
+        lines: List[str] = []
+        for family in list(self._histograms.values()):
+            lines.extend(family.render(extra))
+
+        declared = set()
+        for collector in self._collectors:
+            for name, kind, help, labels, value in collector():
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels({**labels, **extra})} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI ghi độ trễ mỗi request HTTP theo route template, method và status"""
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        self.requests = (registry or metrics).histogram(
+            "vending_http_request_seconds", "Thời gian xử lý request HTTP", ("method", "route", "status")
+        )
+        self._children: Dict[Tuple[str, str, int], Histogram] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # Lỗi không bắt được: ServerErrorMiddleware bên ngoài trả 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            # Method / URL do client gửi lên: gom giá trị lạ để số chuỗi không tăng theo request
+            method = scope["method"] if scope["method"] in HTTP_METHODS else OTHER_METHOD
+            key = (method, route.path if route is not None else UNMATCHED_ROUTE, status)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self.requests.labels(key[0], key[1], str(status))
+            child.observe(elapsed)
+
+
+# Registry dùng chung cho toàn bộ ứng dụng
+metrics = MetricsRegistry()
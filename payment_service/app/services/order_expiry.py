@@ -0,0 +1,154 @@
+"""
+Hết hạn đơn chờ thanh toán - khách bỏ đi giữa chừng thì trả hàng cho khách sau.
+
+- Mỗi đơn tạo ra được hẹn hạn chót (ORDER_EXPIRY_TTL giây) trên timer wheel
+  (app/services/timer_wheel.py): hẹn / huỷ hẹn O(1), mỗi tick chỉ duyệt các đơn
+  tới hạn trong tick đó chứ không quét mọi đơn đang chờ.
+- Đơn rời trạng thái chờ (PAID, CANCELLED...) được bỏ hẹn ngay qua listener của
+  order_store, kể cả khi worker khác đổi trạng thái (storage_sync báo về).
+- Tới hạn mà đơn vẫn CREATED / PENDING và chưa có webhook thanh toán: chuyển
+  sang EXPIRED (listener của order_store đẩy trạng thái cuối cho kiosk qua SSE),
+  trả hàng đã giữ, rồi huỷ link PayOS ở nền theo lô ORDER_EXPIRY_CANCEL_BATCH
+  đơn - khách không trả tiền được cho đơn đã hết hạn.
+- Timer wheel chỉ nằm trong RAM: khi khởi động (kể cả worker được serve.py tạo
+  lại), các đơn còn chờ trong database được hẹn lại theo created_at + TTL; đơn
+  đã quá hạn thì hết hạn ngay ở tick đầu tiên. Chạy nhiều worker (node id cố
+  định) thì mỗi worker chỉ nạp lại đơn có mã do chính nó sinh.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import ORDER_EXPIRY_TTL, ORDER_EXPIRY_TICK, ORDER_EXPIRY_CANCEL_BATCH, ORDER_EXPIRY_RESTORE_BATCH
+from app.models.order import WAITING_STATUSES, InvalidTransitionError, Order, OrderStatus, order_store
+from app.services.background import BackgroundQueue
+from app.models.storage import storage
+from app.services.inventory import inventory as default_inventory
+from app.services.order_id import order_code_at, partition_node_id
+from app.services.payos_client import payos_client
+from app.services.payos_webhook import payment_ledger
+from app.services.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+
+class OrderExpiryScheduler:
+    """Hẹn giờ hết hạn cho đơn chờ thanh toán"""
+
+    def __init__(self, orders=order_store, inventory=default_inventory,
+                 cancel_links: Optional[Callable[[List[int], str], Awaitable[int]]] = None,
+                 ttl: float = ORDER_EXPIRY_TTL, tick: float = ORDER_EXPIRY_TICK,
+                 batch_size: int = ORDER_EXPIRY_CANCEL_BATCH, restore_batch: int = ORDER_EXPIRY_RESTORE_BATCH):
+        self.orders = orders
+        self.inventory = inventory
+        self.cancel_links = cancel_links or payos_client.cancel_payment_links
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.restore_batch = restore_batch
+        self.expired = 0
+        self.cancel_queue = BackgroundQueue()
+        self._wheel = TimerWheel(tick=tick, now=time.time())
+        self._watcher: Optional[asyncio.Task] = None
+        orders.add_listener(self._on_update)
+
+    def __len__(self) -> int:
+        return len(self._wheel)
+
+    def track(self, order_code: int, now: Optional[float] = None) -> None:
+        """Hẹn hạn chót cho đơn vừa tạo"""
+        now = time.time() if now is None else now
+        self.schedule(order_code, now + self.ttl)
+
+    def schedule(self, order_code: int, deadline: float) -> None:
+        """Hẹn (hoặc dời) hạn chót của đơn; hạn đã qua thì đơn hết hạn ở lần tiến timer wheel kế tiếp"""
+        self._wheel.schedule(order_code, deadline)
+
+    async def restore(self, now: Optional[float] = None) -> int:
+        """
+        Hẹn lại hạn chót (created_at + TTL) cho các đơn còn chờ trong database của node này;
+        trả về số đơn đã hẹn. Đơn đã quá hạn được hết hạn ở lần tiến timer wheel kế tiếp.
+        """
+        now = time.time() if now is None else now
+        after, until, node_id = 0, order_code_at(now + 1), partition_node_id()
+        restored = 0
+        while True:
+            batch = await storage.offload(self.orders.list_waiting, after, until, self.restore_batch, node_id)
+            for order in batch:
+                self.schedule(order.order_code, order.created_at + self.ttl)
+            restored += len(batch)
+            if len(batch) < self.restore_batch:
+                return restored
+            after = batch[-1].order_code
+
+    def _on_update(self, order: Order) -> None:
+        if order.status not in WAITING_STATUSES:
+            self._wheel.cancel(order.order_code)
+
+    def expire_due(self, now: Optional[float] = None) -> List[int]:
+        """Tiến timer wheel, chuyển các đơn tới hạn sang EXPIRED; trả về mã các đơn đã hết hạn"""
+        expired = self._expire(now)
+        self._cancel_links(expired)
+        return expired
+
+    def _expire(self, now: Optional[float] = None) -> List[int]:
+        """Chuyển các đơn tới hạn sang EXPIRED và trả hàng (có ghi database - chạy được ngoài event loop)"""
+        now = time.time() if now is None else now
+        expired = []
+        for order_code in self._wheel.advance(now):
+            order = self.orders.get(order_code)
+            if order is None or order.status not in WAITING_STATUSES or payment_ledger.get(order_code):
+                # Webhook đã ghi nhận tiền, đơn sắp chuyển PAID ở nền - không huỷ
+                continue
+            try:
+                self.orders.transition(order_code, OrderStatus.EXPIRED)
+            except (KeyError, InvalidTransitionError):
+                continue  # Vừa được thanh toán / huỷ ở nơi khác
+            self.inventory.release(order_code)
+            expired.append(order_code)
+        self.expired += len(expired)
+        return expired
+
+    def _cancel_links(self, expired: List[int]) -> None:
+        """Huỷ link PayOS của các đơn vừa hết hạn ở nền, theo lô (gọi trên event loop)"""
+        for i in range(0, len(expired), self.batch_size):
+            self.cancel_queue.submit(self._cancel_batch, expired[i:i + self.batch_size])
+
+    async def _cancel_batch(self, order_codes: List[int]) -> None:
+        cancelled = await self.cancel_links(order_codes, "Hết thời gian thanh toán")
+        logger.info("Đã huỷ %d/%d link PayOS của đơn hết hạn", cancelled, len(order_codes))
+
+    async def _watch(self) -> None:
+        try:
+            restored = await self.restore()
+        except Exception as e:
+            logger.error("Lỗi khi nạp lại đơn chờ thanh toán: %s", e, exc_info=True)
+        else:
+            if restored:
+                logger.info("Đã hẹn lại hạn chót cho %d đơn chờ thanh toán", restored)
+        while True:
+            await asyncio.sleep(self._wheel.tick)
+            try:
+                expired = await storage.offload(self._expire)
+            except Exception as e:
+                logger.error("Lỗi khi cho đơn hết hạn: %s", e, exc_info=True)
+                continue
+            self._cancel_links(expired)
+            if expired:
+                logger.info("%d đơn hết hạn thanh toán, đã trả hàng", len(expired))
+
+    def start(self) -> None:
+        """Nạp lại đơn còn chờ trong database rồi chạy vòng hết hạn đơn trên event loop hiện tại"""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        """Dừng vòng hết hạn, huỷ nốt các link đang chờ huỷ"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        await self.cancel_queue.stop()
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+order_expiry = OrderExpiryScheduler()
@@ -0,0 +1,111 @@
+"""
+Sinh mã đơn hàng (orderCode) - tăng dần theo thời gian, không trùng giữa các worker/máy.
+
+Bố cục 53 bit (an toàn với số nguyên JavaScript, PayOS chấp nhận):
+
+    | 40 bit: mili-giây từ EPOCH | 5 bit: node id | 8 bit: sequence |
+
+- 40 bit thời gian đủ dùng ~34 năm kể từ 2025-01-01.
+- 32 node id: mỗi worker/máy chủ phải có ORDER_NODE_ID riêng.
+- 256 mã mỗi mili-giây mỗi node (~256k mã/giây). Khi hết sequence trong một
+  mili-giây, bộ sinh mượn mili-giây kế tiếp thay vì chờ đồng hồ.
+"""
+import os
+import socket
+import threading
+import time
+import zlib
+from typing import Optional
+
+from app.config import ORDER_NODE_ID
+
+EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+
+TIMESTAMP_BITS = 40
+NODE_BITS = 5
+SEQUENCE_BITS = 8
+
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+NODE_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + NODE_BITS
+MAX_ORDER_CODE = (1 << (TIMESTAMP_BITS + NODE_BITS + SEQUENCE_BITS)) - 1  # 2^53 - 1
+
+
+class OrderCodeGenerator:
+    """Bộ sinh mã đơn hàng kiểu Snowflake, thread-safe"""
+
+    def __init__(self, node_id: int):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"node_id phải nằm trong khoảng 0-{MAX_NODE_ID}")
+        self.node_id = node_id
+        self._node_bits = node_id << NODE_SHIFT
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_code(self) -> int:
+        """Sinh mã đơn hàng tiếp theo"""
+        now_ms = time.time_ns() // 1_000_000 - EPOCH_MS
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Cùng mili-giây (hoặc đồng hồ bị lùi): tăng sequence trên mốc cũ
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << TIMESTAMP_SHIFT) | self._node_bits | self._sequence
+
+
+def parse_order_code(order_code: int) -> dict:
+    """Tách mã đơn hàng thành thời điểm tạo, node id và sequence"""
+    return {
+        "timestamp_ms": (order_code >> TIMESTAMP_SHIFT) + EPOCH_MS,
+        "node_id": (order_code >> NODE_SHIFT) & MAX_NODE_ID,
+        "sequence": order_code & MAX_SEQUENCE,
+    }
+
+
+def order_code_at(timestamp: float) -> int:
+    """Mã đơn nhỏ nhất có thể sinh tại thời điểm timestamp (giây) - mốc để lọc đơn theo thời gian tạo"""
+    return max(0, int(timestamp * 1000) - EPOCH_MS) << TIMESTAMP_SHIFT
+
+
+def default_node_id() -> int:
+    """
+    Lấy node id từ ORDER_NODE_ID; nếu không cấu hình thì suy ra từ hostname + pid.
+
+    Giá trị suy ra chỉ phù hợp khi chạy một tiến trình - triển khai nhiều worker
+    hoặc nhiều máy phải đặt ORDER_NODE_ID riêng cho từng tiến trình.
+    """
+    if ORDER_NODE_ID is not None:
+        return int(ORDER_NODE_ID)
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+    return zlib.crc32(seed) & MAX_NODE_ID
+
+
+# Bộ sinh dùng chung cho tiến trình hiện tại
+order_code_generator = OrderCodeGenerator(default_node_id())
+
+
+def next_order_code() -> int:
+    """Sinh mã đơn hàng mới cho tiến trình hiện tại"""
+    return order_code_generator.next_code()
+
+
+def current_node_id() -> int:
+    """Node id của tiến trình hiện tại (serve.py đặt lại bộ sinh cho từng worker sau khi fork)"""
+    return order_code_generator.node_id
+
+
+def partition_node_id() -> Optional[int]:
+    """
+    Node id để chia đơn trong database dùng chung giữa các worker (mỗi worker xử lý đơn do nó sinh).
+
+    Chỉ khi node id được đặt cố định (ORDER_NODE_ID, serve.py đặt cho từng worker);
+    node id suy ra từ pid đổi sau mỗi lần khởi động nên trả về None - xét mọi đơn.
+    """
+    return current_node_id() if os.getenv("ORDER_NODE_ID") is not None else None
@@ -0,0 +1,210 @@
+"""
+Client PayOS bất đồng bộ - không chặn event loop khi chờ PayOS.
+
+Dùng một httpx.AsyncClient duy nhất (connection pool keep-alive) cho mọi lời gọi,
+timeout cấu hình được và giới hạn số lời gọi đồng thời bằng semaphore.
+Mỗi lời gọi đi qua lớp chống chịu lỗi (app/services/resilience.py): thử lại lỗi
+tạm thời, hedging tuỳ chọn và circuit breaker - PayOS chậm / lỗi hàng loạt thì
+trả lỗi ngay thay vì để request của kiosk treo tới timeout.
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+import httpx
+from payos import APIError, AsyncPayOS, ConnectionError, ConnectionTimeoutError
+from payos.types import PaymentLink
+
+from app.config import (
+    PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY, PAYOS_BASE_URL, PAYOS_FAKE,
+    PAYOS_TIMEOUT, PAYOS_CONNECT_TIMEOUT,
+    PAYOS_MAX_CONNECTIONS, PAYOS_MAX_KEEPALIVE, PAYOS_KEEPALIVE_EXPIRY,
+    PAYOS_MAX_CONCURRENCY, PAYOS_HEDGE,
+)
+from app.services.background import BackgroundQueue
+from app.services.metrics import metrics
+from app.services.payos_service import build_payment_data, extract_checkout_url
+from app.services.resilience import CircuitOpenError, ResilientEndpoint
+
+logger = logging.getLogger(__name__)
+
+# Mã lỗi PayOS khi orderCode đã có link thanh toán (lần gửi trước thật ra đã thành công)
+DUPLICATE_ORDER_CODE = "231"
+# Mã lỗi PayOS khi link không tồn tại, hoặc (khi huỷ) không còn chờ thanh toán - đã trả tiền / đã huỷ
+LINK_NOT_PENDING = "101"
+CHECKOUT_URL = f"{PAYOS_BASE_URL}/web/{{}}" if PAYOS_FAKE else "https://pay.payos.vn/web/{}"
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Lỗi tạm thời (đáng thử lại): timeout, mất kết nối, PayOS quá tải (429) hoặc lỗi 5xx"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError, ConnectionTimeoutError)):
+        return True
+    if isinstance(error, APIError):
+        return error.status_code in (408, 429) or (error.status_code or 0) >= 500
+    return False
+
+
+class AsyncPayOSClient:
+    """Lớp client PayOS async với pool kết nối dùng chung"""
+
+    def __init__(
+        self,
+        max_concurrency: int = PAYOS_MAX_CONCURRENCY,
+        timeout: float = PAYOS_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._transport = transport  # Cho phép benchmark gắn transport giả lập
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._payos: Optional[AsyncPayOS] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # PayOS chặn tạo trùng orderCode nên gửi lại / hedge lời gọi tạo link là an toàn
+        self.create_endpoint = ResilientEndpoint("PayOS create", is_transient_error, hedge=PAYOS_HEDGE)
+        # Huỷ link chạy nền nên không cần hedge; breaker riêng để lỗi huỷ không chặn tạo link
+        self.cancel_endpoint = ResilientEndpoint("PayOS cancel", is_transient_error)
+        self.get_endpoint = ResilientEndpoint("PayOS get", is_transient_error)
+
+    def _ensure_client(self) -> AsyncPayOS:
+        """Khởi tạo lười (lazy) để pool và semaphore gắn với event loop đang chạy"""
+        if self._payos is None:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=PAYOS_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=PAYOS_MAX_CONNECTIONS,
+                    max_keepalive_connections=PAYOS_MAX_KEEPALIVE,
+                    keepalive_expiry=PAYOS_KEEPALIVE_EXPIRY,
+                ),
+                transport=self._transport,
+            )
+            self._payos = AsyncPayOS(
+                client_id=PAYOS_CLIENT_ID,
+                api_key=PAYOS_API_KEY,
+                checksum_key=PAYOS_CHECKSUM_KEY,
+                base_url=PAYOS_BASE_URL,
+                timeout=self.timeout,
+                http_client=self._http_client,
+                max_retries=0,  # Thử lại do ResilientEndpoint quyết định (có tính vào circuit breaker)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._payos
+
+    @property
+    def in_flight(self) -> int:
+        """Số lời gọi PayOS đang chạy"""
+        if self._semaphore is None:
+            return 0
+        return self.max_concurrency - self._semaphore._value
+
+    async def create_payment_link(self, order_code: int, amount: int, description: str, items: list) -> dict:
+        """
+        Tạo link thanh toán PayOS (async).
+
+        Trả về dict cùng định dạng với payos_service.create_payment_link.
+        Khi PayOS đang lỗi / chậm hàng loạt (circuit breaker mở) trả về ngay
+        {"success": False, "retry_after": giây} mà không gửi request.
+        """
+        payos = self._ensure_client()
+        payment_data = build_payment_data(order_code, amount, description, items)
+        attempts = 0
+
+        async def create():
+            nonlocal attempts
+            attempts += 1
+            async with self._semaphore:
+                try:
+                    return await payos.payment_requests.create(payment_data)
+                except APIError as e:
+                    # Lần gửi trước bị timeout nhưng PayOS đã tạo link: lấy lại link đó
+                    if e.error_code != DUPLICATE_ORDER_CODE or attempts == 1:
+                        raise
+                    link = await payos.payment_requests.get(order_code)
+                    return {"checkout_url": CHECKOUT_URL.format(link.id)}
+
+        try:
+            response = await self.create_endpoint.call(create)
+        except CircuitOpenError as e:
+            return {"success": False, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            logger.error("Tạo link PayOS thất bại: %s", str(e) or type(e).__name__, extra={"order_code": order_code})
+            return {"success": False, "error": str(e) or type(e).__name__}
+
+        checkout_url = extract_checkout_url(response)
+        logger.info("Link thanh toán: %s", checkout_url, extra={"order_code": order_code})
+
+        if checkout_url:
+            # qr_code: payload VietQR do PayOS sinh, kiosk render trực tiếp thành mã QR
+            return {"success": True, "checkout_url": checkout_url, "qr_code": getattr(response, "qr_code", None)}
+        return {"success": False, "error": "Không lấy được link thanh toán", "raw": str(response)}
+
+    async def get_payment_link(self, order_code: int) -> Optional[PaymentLink]:
+        """
+        Trạng thái link thanh toán của đơn trên PayOS (None nếu PayOS không có link này).
+
+        Raises:
+            CircuitOpenError: PayOS đang lỗi hàng loạt
+            Exception: lỗi của lần thử cuối
+        """
+        payos = self._ensure_client()
+
+        async def get():
+            async with self._semaphore:
+                try:
+                    return await payos.payment_requests.get(order_code)
+                except APIError as e:
+                    if e.error_code != LINK_NOT_PENDING:
+                        raise
+                    return None
+
+        return await self.get_endpoint.call(get)
+
+    async def cancel_payment_link(self, order_code: int, reason: Optional[str] = None) -> bool:
+        """
+        Huỷ link thanh toán của đơn để khách không trả tiền được nữa.
+
+        Trả về True nếu đã huỷ; False nếu link không còn chờ thanh toán hoặc lỗi.
+        """
+        payos = self._ensure_client()
+
+        async def cancel():
+            async with self._semaphore:
+                try:
+                    return await payos.payment_requests.cancel(order_code, reason)
+                except APIError as e:
+                    if e.error_code != LINK_NOT_PENDING:
+                        raise
+                    return None
+
+        try:
+            return await self.cancel_endpoint.call(cancel) is not None
+        except Exception as e:
+            logger.warning("Huỷ link PayOS thất bại: %s", str(e) or type(e).__name__, extra={"order_code": order_code})
+            return False
+
+    async def cancel_payment_links(self, order_codes: List[int], reason: Optional[str] = None) -> int:
+        """Huỷ link của một lô đơn song song (giới hạn bởi semaphore chung), trả về số link đã huỷ"""
+        results = await asyncio.gather(*(self.cancel_payment_link(code, reason) for code in order_codes))
+        return sum(results)
+
+    async def aclose(self):
+        """Đóng pool kết nối (gọi khi tắt server)"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._payos = None
+        self._semaphore = None
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+payos_client = AsyncPayOSClient()
+metrics.add_collector(payos_client.create_endpoint.samples)
+metrics.add_collector(payos_client.cancel_endpoint.samples)
+metrics.add_collector(payos_client.get_endpoint.samples)
+
+# Hàng đợi tạo link PayOS chạy nền (khi kiosk đã có mã VietQR sinh tại server)
+payment_link_queue = BackgroundQueue(workers=PAYOS_MAX_CONCURRENCY)
+
+
+async def create_payment_link_async(order_code: int, amount: int, description: str, items: list) -> dict:
+    """Tạo link thanh toán qua client dùng chung"""
+    return await payos_client.create_payment_link(order_code, amount, description, items)
@@ -1,15 +1,19 @@
 """
 Dịch vụ PayOS - xử lý logic tạo link thanh toán
 """
+import logging
 import re
 from payos import PayOS
-from app.config import PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY
+from app.config import PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY, PAYOS_BASE_URL
+
+logger = logging.getLogger(__name__)
 
 # Khởi tạo instance PayOS
 payos = PayOS(
     client_id=PAYOS_CLIENT_ID,
     api_key=PAYOS_API_KEY,
-    checksum_key=PAYOS_CHECKSUM_KEY
+    checksum_key=PAYOS_CHECKSUM_KEY,
+    base_url=PAYOS_BASE_URL
 )
 
 
@@ -30,7 +34,7 @@ def extract_checkout_url(response) -> str | None:
 
     # Cách 2: Dùng Regex nếu cách 1 thất bại
     if not checkout_url:
-        print("⚠️ Đang dùng Regex để tìm link...")
+        logger.warning("Response PayOS không có checkout_url, dùng Regex để tìm link")
         response_str = str(response)
         match = re.search(r"checkout_url='([^']+)'", response_str)
         if match:
@@ -39,6 +43,20 @@ def extract_checkout_url(response) -> str | None:
     return checkout_url
 
 
+def build_payment_data(order_code: int, amount: int, description: str, items: list) -> dict:
+    """Tạo payload gửi lên PayOS (dùng chung cho client sync và async)"""
+    from app.config import DOMAIN
+
+    return {
+        "orderCode": order_code,
+        "amount": amount,
+        "description": description,
+        "items": items,
+        "returnUrl": f"{DOMAIN}/success",
+        "cancelUrl": f"{DOMAIN}/cancel"
+    }
+
+
 def create_payment_link(order_code: int, amount: int, description: str, items: list) -> dict:
     """
     Tạo link thanh toán PayOS.
@@ -52,17 +70,8 @@ def create_payment_link(order_code: int, amount: int, description: str, items: l
     Returns:
         dict với checkout_url hoặc error
     """
-    from app.config import DOMAIN
-    
     try:
-        payment_data = {
-            "orderCode": order_code,
-            "amount": amount,
-            "description": description,
-            "items": items,
-            "returnUrl": f"{DOMAIN}/success",
-            "cancelUrl": f"{DOMAIN}/cancel"
-        }
+        payment_data = build_payment_data(order_code, amount, description, items)
 
         # Gọi API PayOS
         service = payos.payment_requests
@@ -72,7 +81,7 @@ def create_payment_link(order_code: int, amount: int, description: str, items: l
             response = service.create_payment_link(payment_data)
 
         checkout_url = extract_checkout_url(response)
-        print(f"👉 Link thanh toán: {checkout_url}")
+        logger.info("Link thanh toán: %s", checkout_url, extra={"order_code": order_code})
 
         if checkout_url:
             return {"success": True, "checkout_url": checkout_url}
@@ -80,5 +89,5 @@ def create_payment_link(order_code: int, amount: int, description: str, items: l
             return {"success": False, "error": "Không lấy được link thanh toán", "raw": str(response)}
 
     except Exception as e:
-        print(f"❌ LỖI: {str(e)}")
+        logger.error("Tạo link PayOS thất bại: %s", e, extra={"order_code": order_code})
         return {"success": False, "error": str(e)}
@@ -0,0 +1,159 @@
+"""
+Xác thực webhook PayOS và sổ ghi nhận thanh toán theo order_code.
+
+Chữ ký PayOS: HMAC-SHA256 (checksum key) của chuỗi "key=value&..." tạo từ
+trường `data`, sắp xếp theo key. Đối tượng HMAC được khởi tạo sẵn với key một
+lần; mỗi lần xác thực chỉ cần copy() và update() phần dữ liệu.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.config import PAYOS_CHECKSUM_KEY, ORDER_MAX_COMPLETED
+from app.models.order import InvalidTransitionError, OrderStatus, order_store
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidWebhookSignature(ValueError):
+    """Chữ ký webhook không hợp lệ"""
+
+
+class PaymentRejected(ValueError):
+    """Thanh toán không được ghi nhận: không có đơn hàng hoặc trả thiếu tiền"""
+
+
+def _to_signature_value(value: Any) -> str:
+    """Chuyển giá trị sang chuỗi theo đúng quy tắc ký của PayOS"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return json.dumps(
+            [dict(sorted(item.items())) if isinstance(item, dict) else item for item in value],
+            separators=(",", ":"), ensure_ascii=False,
+        )
+    if value in ("undefined", "null"):
+        return ""
+    return str(value)
+
+
+def signature_payload(data: Dict[str, Any]) -> bytes:
+    """Chuỗi dữ liệu được ký: key=value nối bằng '&', sắp xếp theo key"""
+    return "&".join(f"{key}={_to_signature_value(data[key])}" for key in sorted(data)).encode("utf-8")
+
+
+class WebhookVerifier:
+    """Ký / xác thực dữ liệu webhook PayOS với HMAC khởi tạo sẵn"""
+
+    def __init__(self, checksum_key: str = PAYOS_CHECKSUM_KEY):
+        self._base = hmac.new((checksum_key or "").encode("utf-8"), digestmod=hashlib.sha256)
+
+    def sign(self, data: Dict[str, Any]) -> str:
+        mac = self._base.copy()
+        mac.update(signature_payload(data))
+        return mac.hexdigest()
+
+    def verify(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Xác thực payload webhook, trả về trường `data` nếu hợp lệ.
+
+        Raises:
+            InvalidWebhookSignature: thiếu dữ liệu hoặc sai chữ ký
+        """
+        data = payload.get("data")
+        signature = payload.get("signature")
+        if not isinstance(data, dict) or not isinstance(signature, str):
+            raise InvalidWebhookSignature("Thiếu data hoặc signature")
+        if not hmac.compare_digest(self.sign(data), signature):
+            raise InvalidWebhookSignature("Sai chữ ký webhook")
+        return data
+
+
+@dataclass
+class PaymentRecord:
+    """Thanh toán đã được PayOS xác nhận"""
+    order_code: int
+    amount: int
+    reference: Optional[str]
+    transaction_time: Optional[str]
+    received_at: float
+
+
+class PaymentLedger:
+    """
+    Bảng tra cứu thanh toán đã xác nhận theo order_code (idempotent).
+
+    Chỉ ghi nhận thanh toán đủ tiền cho đơn đang có: có bản ghi nghĩa là đơn đã
+    được trả đủ (kiosk thấy PAID, đơn không bị hết hạn). Trả thiếu chỉ được ghi
+    log để hoàn tiền thủ công, đơn vẫn chờ và hết hạn như bình thường.
+
+    Giữ tối đa max_records bản ghi gần nhất; đơn cũ hơn đã kết thúc trong
+    OrderStore nên webhook lặp lại cũng không thể đổi trạng thái của chúng.
+    """
+
+    def __init__(self, orders=order_store, max_records: int = ORDER_MAX_COMPLETED):
+        self.orders = orders
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._payments: "OrderedDict[int, PaymentRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._payments)
+
+    def get(self, order_code: int) -> Optional[PaymentRecord]:
+        return self._payments.get(order_code)
+
+    def record(self, data: Dict[str, Any]) -> Optional[PaymentRecord]:
+        """
+        Ghi nhận thanh toán; trả về None nếu order_code đã được ghi nhận trước đó.
+
+        Raises:
+            PaymentRejected: không có đơn hàng hoặc số tiền nhỏ hơn giá trị đơn (không ghi nhận)
+        """
+        order_code = int(data["orderCode"])
+        amount = int(data.get("amount") or 0)
+        if order_code in self._payments:
+            return None
+        order = self.orders.get(order_code)
+        if order is None:
+            raise PaymentRejected("Thanh toán cho đơn không tồn tại")
+        if amount < order.amount:
+            raise PaymentRejected(f"Đơn thanh toán thiếu: {amount}/{order.amount}")
+        with self._lock:
+            if order_code in self._payments:
+                return None
+            record = PaymentRecord(
+                order_code=order_code,
+                amount=amount,
+                reference=data.get("reference"),
+                transaction_time=data.get("transactionDateTime"),
+                received_at=time.time(),
+            )
+            self._payments[order_code] = record
+            if len(self._payments) > self.max_records:
+                self._payments.popitem(last=False)
+            return record
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+webhook_verifier = WebhookVerifier()
+payment_ledger = PaymentLedger()
+
+
+def apply_payment(record: PaymentRecord) -> None:
+    """Chuyển đơn hàng sang PAID sau khi thanh toán đủ tiền được ghi nhận (chạy nền)"""
+    try:
+        order_store.transition(record.order_code, OrderStatus.PAID)
+    except KeyError:
+        logger.warning("Webhook cho đơn không có trong bộ nhớ", extra={"order_code": record.order_code})
+    except InvalidTransitionError as e:
+        # Ví dụ: khách trả tiền sau khi đơn đã hết hạn -> cần hoàn tiền thủ công
+        logger.warning("%s", e, extra={"order_code": record.order_code})
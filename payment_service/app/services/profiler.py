@@ -0,0 +1,200 @@
+"""
+Profiler lấy mẫu stack theo yêu cầu cho worker đang chạy (không cần gắn debugger).
+
+Trong thời gian profile, cứ mỗi interval giây thời gian CPU của process thì
+đọc stack hiện tại và đếm số lần mỗi stack xuất hiện. Kết quả ở dạng collapsed
+stacks ("a;b;c 12" mỗi dòng) - đưa thẳng vào flamegraph.pl, speedscope, inferno.
+
+- Lấy mẫu bằng timer SIGPROF (setitimer) khi event loop chạy ở main thread
+  (run_server.py, serve.py): handler chạy ngay giữa hai bytecode của loop nên
+  mẫu không bị lệch về chỗ nhả GIL. Nền tảng không có setitimer hoặc loop chạy
+  ở thread khác thì dùng một thread đọc sys._current_frames() (kém chính xác hơn:
+  chỉ lấy được mẫu khi thread kia nhả GIL).
+- Không profile thì không có timer, thread hay hook nào trên đường xử lý
+  request - chi phí bằng 0.
+- Lọc theo route: giữ mẫu lấy trong context của một request tới route đó
+  (request_scope do RequestIdMiddleware đặt - gồm cả task con mà request tạo ra,
+  vd. lời gọi chung của SingleFlightCache, vốn không nằm trên stack của endpoint),
+  hoặc mẫu mà stack đang nằm trong hàm xử lý của route (so khớp code object).
+  Lấy mẫu bằng thread không đọc được context của thread khác nên chỉ so khớp
+  code object.
+- Mẫu là thời gian chiếm CPU: coroutine đang await (vd. chờ PayOS) không có
+  trên stack, loop rảnh không sinh mẫu.
+
+Mỗi worker chỉ chạy một phiên profile tại một thời điểm.
+"""
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.log import request_scope
+
+
+class ProfilerBusyError(Exception):
+    """Worker đang chạy một phiên profile khác"""
+
+
+class Profile:
+    """Kết quả một phiên profile"""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, interval: float, mode: str):
+        self.stacks = stacks      # stack (tuple tên frame, gốc -> lá) -> số mẫu
+        self.samples = samples    # Tổng số lần lấy mẫu (kể cả mẫu bị lọc bỏ)
+        self.duration = duration
+        self.interval = interval
+        self.mode = mode          # signal | thread
+
+    @property
+    def matched(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, stack nhiều mẫu nhất trước"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """Hàm có nhiều mẫu tự thân nhất (frame lá của stack)"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        return leaves.most_common(limit)
+
+
+class _Session:
+    """Trạng thái của phiên profile đang chạy"""
+
+    def __init__(self, thread_ids: Optional[Set[int]], codes: Optional[Set[CodeType]], route: Optional[str]):
+        self.thread_ids = thread_ids
+        self.codes = codes
+        self.route = route
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    """Lấy mẫu stack trong một khoảng thời gian giới hạn"""
+
+    def __init__(self):
+        self._session: Optional[_Session] = None
+        self._labels: Dict[CodeType, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._session is not None
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+            label = self._labels[code] = f"{code.co_qualname} ({short}:{code.co_firstlineno})"
+        return label
+
+    @staticmethod
+    def _in_route(session: _Session) -> bool:
+        """Context hiện tại thuộc một request tới route đang lọc (chỉ đúng cho thread đang chạy)"""
+        scope = request_scope.get()
+        route = scope.get("route") if scope is not None else None
+        return session.route is not None and getattr(route, "path", None) == session.route
+
+    def _record(self, session: _Session, ident: int, frame: Optional[FrameType], thread_name: bool,
+                in_route: bool = False) -> None:
+        """Ghi stack của một thread (bỏ qua nếu có lọc route mà mẫu không thuộc route đó)"""
+        codes = []
+        matched = session.codes is None or in_route
+        while frame is not None:
+            code = frame.f_code
+            if not matched and code in session.codes:
+                matched = True
+            codes.append(code)
+            frame = frame.f_back
+        if not matched:
+            return
+        stack = tuple(self._label(code) for code in reversed(codes))
+        if thread_name:
+            stack = (f"thread {ident}",) + stack
+        session.stacks[stack] += 1
+
+    def _sample(self, session: _Session, current: Optional[FrameType] = None, skip: Optional[int] = None) -> None:
+        session.samples += 1
+        # Với SIGPROF, handler chạy trong context của task bị ngắt trên main thread
+        in_route = current is not None and self._in_route(session)
+        if session.thread_ids is None:
+            for ident, frame in sys._current_frames().items():
+                if ident != skip:
+                    # Với SIGPROF, frame của main thread lúc này là chính handler - dùng frame bị ngắt
+                    if current is not None and ident == threading.main_thread().ident:
+                        self._record(session, ident, current, thread_name=True, in_route=in_route)
+                    else:
+                        self._record(session, ident, frame, thread_name=True)
+        elif current is not None:
+            self._record(session, threading.get_ident(), current, thread_name=False, in_route=in_route)
+        else:
+            frames = sys._current_frames()
+            for ident in session.thread_ids:
+                self._record(session, ident, frames.get(ident), thread_name=False)
+
+    async def profile(self, seconds: float, interval: float, thread_ids: Optional[Iterable[int]] = None,
+                      codes: Optional[Set[CodeType]] = None, route: Optional[str] = None) -> Profile:
+        """
+        Lấy mẫu trong seconds giây (không chặn event loop).
+
+        thread_ids: chỉ lấy mẫu các thread này (None: mọi thread, stack có thêm thread ở gốc)
+        codes: chỉ giữ stack đi qua một trong các code object này (lọc theo route)
+        route: path template của route đang lọc - giữ thêm mẫu lấy trong context của request tới route này
+
+        Raises:
+            ProfilerBusyError: đang có phiên profile khác
+        """
+        if self._session is not None:
+            raise ProfilerBusyError("Worker đang chạy một phiên profile khác")
+        ids = set(thread_ids) if thread_ids is not None else None
+        session = self._session = _Session(ids, codes, route)
+        use_signal = (hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+                      and (ids is None or ids == {threading.get_ident()}))
+        start = time.perf_counter()
+        try:
+            if use_signal:
+                await self._profile_signal(session, seconds, interval)
+            else:
+                await self._profile_thread(session, seconds, interval)
+        finally:
+            self._session = None
+        return Profile(session.stacks, session.samples, time.perf_counter() - start, interval,
+                       "signal" if use_signal else "thread")
+
+    async def _profile_signal(self, session: _Session, seconds: float, interval: float) -> None:
+        previous = signal.signal(signal.SIGPROF, lambda signum, frame: self._sample(session, frame))
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            # Client ngắt kết nối giữa chừng cũng tắt timer
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+
+    async def _profile_thread(self, session: _Session, seconds: float, interval: float) -> None:
+        stop = threading.Event()
+
+        def run():
+            me = threading.get_ident()
+            while not stop.wait(interval):
+                self._sample(session, skip=me)
+
+        sampler = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            sampler.join()
+
+
+# Profiler dùng chung cho toàn bộ ứng dụng (mỗi worker một instance)
+profiler = SamplingProfiler()
@@ -0,0 +1,105 @@
+"""
+Pub/sub trong tiến trình - đẩy sự kiện tới các kết nối SSE đang mở.
+
+- Mỗi subscriber có một asyncio.Queue giới hạn kích thước; khi đầy thì bỏ tin cũ
+  nhất (subscriber chậm không làm nghẽn publisher).
+- publish() an toàn khi gọi từ thread khác: tin được chuyển về event loop
+  bằng call_soon_threadsafe.
+- Tin được serialize một lần cho mọi subscriber của topic.
+"""
+import asyncio
+import json
+import threading
+from typing import Dict, Optional, Set
+
+# Số tin tối đa chờ trong hàng đợi của một subscriber
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class Subscription:
+    """Một kết nối đang theo dõi một topic"""
+
+    def __init__(self, broker: "PubSub", topic: str):
+        self.broker = broker
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message: str) -> None:
+        """Đưa tin vào hàng đợi, bỏ tin cũ nhất nếu đầy (chạy trên event loop)"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Chờ tin tiếp theo; trả về None nếu hết thời gian chờ"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PubSub:
+    """Broker pub/sub theo topic"""
+
+    def __init__(self):
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Đăng ký theo dõi topic (gọi từ event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._loop_thread = threading.get_ident()
+        subscription = Subscription(self, topic)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[subscription.topic]
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        """Số subscriber của một topic (hoặc tổng nếu không truyền topic)"""
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(s) for s in self._topics.values())
+
+    def publish(self, topic: str, data: dict) -> None:
+        """Gửi tin tới mọi subscriber của topic (an toàn khi gọi từ thread khác)"""
+        if topic not in self._topics:
+            return
+        message = json.dumps(data, ensure_ascii=False)
+        if threading.get_ident() == self._loop_thread:
+            self._deliver(topic, message)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, topic, message)
+
+    def _deliver(self, topic: str, message: str) -> None:
+        for subscription in tuple(self._topics.get(topic, ())):
+            subscription.deliver(message)
+
+
+# Broker dùng chung cho toàn bộ ứng dụng
+pubsub = PubSub()
+
+
+def order_topic(order_code: int) -> str:
+    return f"order:{order_code}"
+
+
+def machine_topic(machine_id: str) -> str:
+    return f"machine:{machine_id}"
@@ -0,0 +1,291 @@
+"""
+Đối soát đơn kẹt với PayOS - webhook bị mất, hoặc server khởi động lại giữa lúc khách thanh toán.
+
+- Đơn còn CREATED / PENDING sau RECONCILE_STALE_AFTER giây được hỏi trạng thái
+  thật qua payos.payment_requests.get, rồi ghi lại tại chỗ: đã trả tiền thì ghi
+  vào sổ thanh toán và chuyển PAID như khi nhận webhook; link đã huỷ / hết hạn
+  thì chuyển CANCELLED / EXPIRED và trả hàng đã giữ.
+- Chạy tăng dần theo con trỏ là mã đơn: mã đơn tăng theo thời gian tạo, nên mỗi
+  lần chỉ đọc các đơn tạo sau con trỏ tới mốc "đủ cũ", không quét lại cả kho
+  đơn hàng. Đơn PayOS vẫn báo chờ thanh toán (hoặc không có link) được hỏi lại
+  sau RECONCILE_STALE_AFTER giây, nhưng chỉ tới hạn chót của đơn (created_at +
+  ORDER_EXPIRY_TTL): quá hạn thì giao cho hẹn giờ hết hạn (order_expiry) và không
+  hỏi nữa. Danh sách chờ hỏi lại giữ tối đa RECONCILE_MAX_RECHECK đơn - đầy thì
+  đơn mới cũng được giao thẳng cho hẹn giờ hết hạn.
+- Đơn được hỏi theo lô RECONCILE_BATCH đơn, tối đa RECONCILE_CONCURRENCY lời
+  gọi đồng thời và RECONCILE_RATE lời gọi/giây (token bucket) để không tranh hạn
+  mức API với việc tạo link cho khách đang mua.
+- Nhiều worker dùng chung database: mỗi worker chỉ đối soát đơn có mã do chính
+  nó sinh (node id trong mã đơn), nên mỗi đơn chỉ được hỏi một lần và tổng số
+  lời gọi PayOS không nhân lên theo số worker (serve.py giữ nguyên node id khi
+  khởi động lại worker).
+- PayOS báo đã trả tiền nhưng thiếu so với giá trị đơn: không chuyển PAID (cùng
+  đường với webhook trả thiếu), đơn vẫn chờ và hết hạn như bình thường.
+
+Chạy trên event loop của từng worker; phần đọc / ghi đơn và trả hàng chạy qua
+storage.offload để không chặn event loop khi dùng SQLite.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from app.config import (
+    RECONCILE_INTERVAL, RECONCILE_STALE_AFTER, RECONCILE_LOOKBACK, RECONCILE_BATCH,
+    RECONCILE_CONCURRENCY, RECONCILE_RATE, RECONCILE_BURST, RECONCILE_MAX_RECHECK,
+)
+from app.models.order import WAITING_STATUSES, InvalidTransitionError, Order, OrderStatus, order_store
+from app.models.storage import storage
+from app.services.inventory import inventory as default_inventory
+from app.services.metrics import Sample, metrics
+from app.services.order_expiry import order_expiry
+from app.services.order_id import order_code_at, partition_node_id
+from app.services.payos_client import payos_client
+from app.services.payos_webhook import PaymentRejected, apply_payment, payment_ledger
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái link PayOS đã kết thúc mà không có tiền -> trạng thái đơn tương ứng
+CLOSED_LINK_STATUSES = {"CANCELLED": OrderStatus.CANCELLED, "EXPIRED": OrderStatus.EXPIRED}
+
+
+class ReconcilerBusyError(Exception):
+    """Đang có một lần đối soát khác chạy trên worker này"""
+
+
+class TokenBucket:
+    """Nạp rate token mỗi giây, tối đa burst token; mỗi lời gọi lấy một token"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Chờ tới khi có token (rate <= 0: không giới hạn)"""
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class ReconcileReport:
+    """Kết quả một lần đối soát"""
+    checked: int = 0      # Số đơn đã hỏi PayOS
+    paid: int = 0         # Khách đã trả tiền nhưng mất webhook -> PAID
+    cancelled: int = 0    # Link đã bị huỷ trên PayOS -> CANCELLED, trả hàng
+    expired: int = 0      # Link đã hết hạn trên PayOS -> EXPIRED, trả hàng
+    pending: int = 0      # PayOS vẫn chờ thanh toán -> hỏi lại sau
+    underpaid: int = 0    # Đã trả nhưng thiếu tiền -> không chuyển PAID, hỏi lại sau
+    missing: int = 0      # PayOS không có link của đơn -> hỏi lại sau
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def fixed(self) -> int:
+        """Số đơn đã được sửa theo trạng thái thật trên PayOS"""
+        return self.paid + self.cancelled + self.expired
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "fixed": self.fixed, "seconds": round(self.seconds, 3)}
+
+
+class PaymentReconciler:
+    """Định kỳ đối soát đơn chờ thanh toán đã cũ với trạng thái trên PayOS"""
+
+    def __init__(
+        self,
+        orders=order_store,
+        inventory=default_inventory,
+        expiry=order_expiry,
+        get_link: Optional[Callable[[int], Awaitable[Any]]] = None,
+        interval: float = RECONCILE_INTERVAL,
+        stale_after: float = RECONCILE_STALE_AFTER,
+        lookback: float = RECONCILE_LOOKBACK,
+        batch_size: int = RECONCILE_BATCH,
+        concurrency: int = RECONCILE_CONCURRENCY,
+        rate: float = RECONCILE_RATE,
+        burst: int = RECONCILE_BURST,
+        max_recheck: int = RECONCILE_MAX_RECHECK,
+    ):
+        self.orders = orders
+        self.inventory = inventory
+        self.expiry = expiry
+        self.get_link = get_link or payos_client.get_payment_link
+        self.interval = interval
+        self.stale_after = stale_after
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_recheck = max_recheck
+        self.bucket = TokenBucket(rate, burst)
+        # Mã đơn lớn nhất đã đối soát - lần chạy đầu xét các đơn tạo trong lookback giây trước
+        self.cursor = order_code_at(time.time() - lookback)
+        self.runs = 0
+        self.totals = ReconcileReport()
+        self.last: Optional[ReconcileReport] = None
+        self._recheck: Dict[int, float] = {}  # order_code -> thời điểm hỏi lại PayOS
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_recheck(self) -> int:
+        """Số đơn đang chờ tới lượt hỏi lại PayOS"""
+        return len(self._recheck)
+
+    async def run_once(self, now: Optional[float] = None) -> ReconcileReport:
+        """
+        Đối soát các đơn đã đủ cũ kể từ con trỏ và các đơn tới lượt hỏi lại.
+
+        Raises:
+            ReconcilerBusyError: đang có lần đối soát khác chạy
+        """
+        if self._running:
+            raise ReconcilerBusyError("Đang có một lần đối soát khác chạy")
+        self._running = True
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        report = ReconcileReport()
+        try:
+            due = [code for code, at in self._recheck.items() if at <= now]
+            for code in due:
+                del self._recheck[code]
+            for i in range(0, len(due), self.batch_size):
+                batch = await storage.offload(self._get_orders, due[i:i + self.batch_size])
+                await self._check(batch, report, now)
+
+            until = order_code_at(now - self.stale_after)
+            while self.cursor < until:
+                batch = await storage.offload(self.orders.list_waiting, self.cursor, until, self.batch_size,
+                                              partition_node_id())
+                self.cursor = batch[-1].order_code if len(batch) == self.batch_size else until
+                await self._check(batch, report, now)
+        finally:
+            self._running = False
+        report.seconds = time.perf_counter() - start
+
+        self.last = report
+        self.runs += 1
+        for name, value in asdict(report).items():
+            setattr(self.totals, name, getattr(self.totals, name) + value)
+        if report.checked or report.errors:
+            logger.info("Đối soát PayOS: hỏi %d đơn, sửa %d (PAID %d, CANCELLED %d, EXPIRED %d), "
+                        "%d còn chờ, %d trả thiếu, %d lỗi, %.2fs", report.checked, report.fixed, report.paid,
+                        report.cancelled, report.expired, report.pending + report.missing,
+                        report.underpaid, report.errors, report.seconds)
+        return report
+
+    def _get_orders(self, order_codes: List[int]) -> List[Order]:
+        """Đọc các đơn còn tồn tại trong lô (có đọc database - chạy qua storage.offload)"""
+        return [order for order in map(self.orders.get, order_codes) if order is not None]
+
+    async def _check(self, orders: List[Order], report: ReconcileReport, now: float) -> None:
+        """Hỏi PayOS trạng thái một lô đơn (giới hạn đồng thời + token bucket)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(order: Order) -> None:
+            async with semaphore:
+                await self.bucket.acquire()
+                try:
+                    link = await self.get_link(order.order_code)
+                except Exception as e:
+                    report.errors += 1
+                    self._retry(order, now)
+                    logger.warning("Không hỏi được trạng thái PayOS: %s", str(e) or type(e).__name__,
+                                   extra={"order_code": order.order_code})
+                    return
+            report.checked += 1
+            outcome = await storage.offload(self._apply, order.order_code, link)
+            if outcome is not None:
+                setattr(report, outcome, getattr(report, outcome) + 1)
+            if outcome in ("pending", "underpaid", "missing"):
+                self._retry(order, now)
+
+        await asyncio.gather(*(check(order) for order in orders if order.status in WAITING_STATUSES))
+
+    def _retry(self, order: Order, now: float) -> None:
+        """Hẹn hỏi lại PayOS sau stale_after giây; đơn đã quá hạn chót (hoặc danh sách đầy) giao cho hẹn giờ hết hạn"""
+        deadline = order.created_at + self.expiry.ttl
+        if now < deadline and len(self._recheck) < self.max_recheck:
+            self._recheck[order.order_code] = now + self.stale_after
+        else:
+            self.expiry.schedule(order.order_code, deadline)
+
+    def _apply(self, order_code: int, link: Any) -> Optional[str]:
+        """
+        Ghi trạng thái thật trên PayOS vào đơn hàng; trả về tên bộ đếm của ReconcileReport
+        ứng với kết quả, hoặc None nếu đơn đã được xử lý ở nơi khác
+        """
+        order = self.orders.get(order_code)
+        if order is None or order.status not in WAITING_STATUSES:
+            return None  # Webhook / hẹn giờ hết hạn đã xử lý trong lúc chờ PayOS trả lời
+
+        status = link.status if link is not None else None
+        if status == "PAID":
+            transaction = link.transactions[-1] if link.transactions else None
+            try:
+                record = payment_ledger.record({
+                    "orderCode": order_code,
+                    "amount": link.amount_paid,
+                    "reference": transaction.reference if transaction else None,
+                    "transactionDateTime": transaction.transaction_date_time if transaction else None,
+                })
+            except PaymentRejected as e:
+                logger.warning("%s", e, extra={"order_code": order_code})
+                return "underpaid"
+            if record is None:
+                return None  # Webhook vừa tới, đơn đang được chuyển PAID ở nền
+            apply_payment(record)
+            logger.info("Đơn đã thanh toán nhưng không nhận được webhook", extra={"order_code": order_code})
+            return "paid"
+        if status in CLOSED_LINK_STATUSES:
+            try:
+                self.orders.transition(order_code, CLOSED_LINK_STATUSES[status])
+            except (KeyError, InvalidTransitionError):
+                return None
+            self.inventory.release(order_code)
+            return status.lower()
+        return "missing" if link is None else "pending"
+
+    def samples(self) -> Iterator[Sample]:
+        """Bộ đếm đối soát cho /metrics"""
+        totals = asdict(self.totals)
+        for outcome in ("paid", "cancelled", "expired", "pending", "underpaid", "missing", "errors"):
+            yield ("vending_reconcile_orders_total", "counter", "Số đơn đã đối soát với PayOS theo kết quả",
+                   {"outcome": outcome}, totals[outcome])
+        yield "vending_reconcile_runs_total", "counter", "Số lần đối soát", {}, self.runs
+        yield ("vending_reconcile_last_seconds", "gauge", "Thời gian lần đối soát gần nhất", {},
+               self.last.seconds if self.last else 0.0)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except ReconcilerBusyError:
+                pass  # Admin vừa chạy đối soát bằng tay
+            except Exception as e:
+                logger.error("Lỗi đối soát PayOS: %s", e, exc_info=True)
+
+    def start(self) -> None:
+        """Chạy vòng đối soát trên event loop hiện tại"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+reconciler = PaymentReconciler()
+metrics.add_collector(reconciler.samples)
@@ -0,0 +1,326 @@
+"""
+Lớp chống chịu lỗi cho lời gọi ra dịch vụ ngoài (PayOS).
+
+- Circuit breaker theo từng endpoint, tính cả lỗi lẫn lời gọi chậm: khi tỉ lệ
+  lỗi hoặc tỉ lệ lời gọi chậm trong cửa sổ gần nhất vượt ngưỡng, mạch mở và
+  lời gọi bị từ chối ngay (CircuitOpenError) thay vì treo tới timeout. Hết
+  open_seconds thì cho một lời gọi thử (half-open): thành công thì đóng mạch.
+- Thử lại có giới hạn số lần và tổng thời gian, chờ giữa các lần theo backoff
+  mũ có jitter để các worker không cùng dồn lại gọi một lúc.
+- Hedging (tuỳ chọn): lời gọi chưa xong sau p95 độ trễ gần đây thì gửi thêm
+  một lời gọi song song, lấy kết quả thành công về trước. Chỉ bật cho thao tác
+  idempotent (PayOS không tạo trùng link cho cùng orderCode).
+
+Chạy trên event loop của từng worker, không cần lock. Thời gian mỗi lời gọi
+(gồm cả thử lại) và từng lần gửi thật được ghi vào histogram của /metrics;
+các bộ đếm được đọc lúc scrape qua samples().
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+from app.config import (
+    PAYOS_RETRIES, PAYOS_DEADLINE, PAYOS_BACKOFF_BASE, PAYOS_BACKOFF_CAP,
+    PAYOS_HEDGE_MIN_DELAY, PAYOS_SLOW_CALL,
+    PAYOS_BREAKER_WINDOW, PAYOS_BREAKER_MIN_CALLS, PAYOS_BREAKER_FAILURE_RATE,
+    PAYOS_BREAKER_SLOW_RATE, PAYOS_BREAKER_OPEN,
+)
+from app.services.metrics import Sample, metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Số mẫu độ trễ gần nhất dùng để tính p95 cho hedging
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+CALL_SECONDS = metrics.histogram(
+    "vending_external_call_seconds", "Thời gian một lời gọi dịch vụ ngoài, gồm cả thử lại / hedging",
+    ("endpoint", "outcome"),
+)
+ATTEMPT_SECONDS = metrics.histogram(
+    "vending_external_attempt_seconds", "Thời gian từng lần gửi request tới dịch vụ ngoài",
+    ("endpoint", "outcome"),
+)
+
+
+class CircuitOpenError(Exception):
+    """Mạch đang mở - lời gọi bị từ chối ngay, không gửi đi"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"{endpoint} tạm ngừng nhận lời gọi, thử lại sau {retry_after:.0f} giây")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker tính theo cửa sổ window lời gọi gần nhất (lỗi + chậm)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = PAYOS_BREAKER_WINDOW,
+        min_calls: int = PAYOS_BREAKER_MIN_CALLS,
+        failure_rate: float = PAYOS_BREAKER_FAILURE_RATE,
+        slow_call: float = PAYOS_SLOW_CALL,
+        slow_rate: float = PAYOS_BREAKER_SLOW_RATE,
+        open_seconds: float = PAYOS_BREAKER_OPEN,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)  # (lỗi, chậm) của từng lời gọi
+        self._failures = 0
+        self._slow = 0
+        self._probing = False
+
+    def retry_after(self, now: Optional[float] = None) -> float:
+        """Số giây còn lại trước khi cho lời gọi thử"""
+        if self.state != self.OPEN:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.opened_at + self.open_seconds - now)
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Lời gọi có được gửi đi không"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.retry_after(now) > 0:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # Half-open: mỗi lúc chỉ một lời gọi thử
+        if self._probing:
+            self.rejected += 1
+            return False
+        self._probing = True
+        return True
+
+    def record(self, latency: float, ok: bool, now: Optional[float] = None) -> None:
+        """Ghi kết quả một lời gọi đã được allow()"""
+        slow = latency >= self.slow_call
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if ok and not slow:
+                self._close()
+            else:
+                self._open(now)
+            return
+        if self.state == self.OPEN:
+            return  # Lời gọi bắt đầu trước khi mạch mở
+
+        failed = not ok
+        if len(self._outcomes) == self._outcomes.maxlen:
+            old_failed, old_slow = self._outcomes[0]
+            self._failures -= old_failed
+            self._slow -= old_slow
+        self._outcomes.append((failed, slow))
+        self._failures += failed
+        self._slow += slow
+
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and (
+            self._failures >= self.failure_rate * calls or self._slow >= self.slow_rate * calls
+        ):
+            self._open(now)
+
+    def cancelled(self) -> None:
+        """Lời gọi bị huỷ giữa chừng (vd. hedge thua) - không tính là lỗi"""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now: Optional[float]) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic() if now is None else now
+        self.times_opened += 1
+        logger.warning("Circuit breaker %s mở: tạm ngừng gọi trong %.0f giây", self.name, self.open_seconds)
+
+    def _close(self) -> None:
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+        self._slow = 0
+        logger.info("Circuit breaker %s đóng lại", self.name)
+
+
+class LatencyWindow:
+    """Độ trễ của các lời gọi thành công gần nhất, tính percentile khi cần"""
+
+    def __init__(self, size: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """None khi chưa đủ mẫu"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))]
+
+
+def backoff_delay(attempt: int, base: float = PAYOS_BACKOFF_BASE, cap: float = PAYOS_BACKOFF_CAP) -> float:
+    """Thời gian chờ trước lần thử lại thứ attempt+1: ngẫu nhiên trong [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ResilientEndpoint:
+    """Một endpoint của dịch vụ ngoài: breaker + thử lại + hedging"""
+
+    def __init__(
+        self,
+        name: str,
+        is_transient: Callable[[BaseException], bool],
+        retries: int = PAYOS_RETRIES,
+        deadline: float = PAYOS_DEADLINE,
+        hedge: bool = False,
+        hedge_min_delay: float = PAYOS_HEDGE_MIN_DELAY,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.is_transient = is_transient  # Lỗi tạm thời: được thử lại và tính vào breaker
+        self.retries = retries
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Chờ bao lâu thì gửi lời gọi thứ hai (None: chưa đủ số liệu, không hedge)"""
+        p95 = self.latency.percentile(95)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def samples(self) -> Iterator[Sample]:
+        """Bộ đếm của endpoint và trạng thái breaker cho /metrics"""
+        labels = {"endpoint": self.name}
+        for name, help, value in (
+            ("calls", "Số lời gọi", self.calls),
+            ("retries", "Số lần thử lại", self.retried),
+            ("hedges", "Số lời gọi hedge đã gửi", self.hedged),
+            ("hedge_wins", "Số lần lời gọi hedge về trước", self.hedge_wins),
+            ("failures", "Số lời gọi thất bại (kể cả bị breaker từ chối)", self.failures),
+            ("breaker_opened", "Số lần circuit breaker mở", self.breaker.times_opened),
+            ("breaker_rejected", "Số lời gọi bị circuit breaker từ chối", self.breaker.rejected),
+        ):
+            yield f"vending_external_{name}_total", "counter", help, labels, value
+        yield ("vending_external_breaker_open", "gauge", "1 khi circuit breaker đang mở / half-open",
+               labels, int(self.breaker.state != CircuitBreaker.CLOSED))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Gọi fn() với breaker, thử lại và hedging.
+
+        Raises:
+            CircuitOpenError: mạch đang mở
+            Exception: lỗi của lần thử cuối (lỗi không tạm thời được ném ra ngay)
+        """
+        start = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            result = await self._call(fn)
+            outcome = "ok"
+            return result
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            CALL_SECONDS.observe(time.perf_counter() - start, self.name, outcome)
+
+    async def _call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.failures += 1
+                raise CircuitOpenError(self.name, self.breaker.retry_after())
+            try:
+                if self.hedge:
+                    return await self._hedged(fn, deadline)
+                return await self._attempt(fn, deadline)
+            except Exception as e:
+                delay = backoff_delay(attempt)
+                if attempt >= self.retries or not self.is_transient(e) or time.monotonic() + delay >= deadline:
+                    self.failures += 1
+                    raise
+            attempt += 1
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], deadline: float) -> T:
+        """Một lời gọi, ghi kết quả vào breaker (đã được allow())"""
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), max(0.0, deadline - start))
+        except asyncio.CancelledError:
+            self.breaker.cancelled()
+            ATTEMPT_SECONDS.observe(time.monotonic() - start, self.name, "cancelled")
+            raise
+        except Exception as e:
+            latency = time.monotonic() - start
+            self.breaker.record(latency, ok=not self.is_transient(e))
+            ATTEMPT_SECONDS.observe(latency, self.name, "error")
+            raise
+        latency = time.monotonic() - start
+        self.breaker.record(latency, ok=True)
+        ATTEMPT_SECONDS.observe(latency, self.name, "ok")
+        self.latency.add(latency)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]], deadline: float) -> T:
+        """Gửi lời gọi thứ hai nếu lời gọi đầu chậm hơn p95; lấy kết quả thành công về trước"""
+        tasks = [asyncio.ensure_future(self._attempt(fn, deadline))]
+        delay = self.hedge_delay()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.breaker.state == CircuitBreaker.CLOSED:
+                    self.hedged += 1
+                    tasks.append(asyncio.ensure_future(self._attempt(fn, deadline)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
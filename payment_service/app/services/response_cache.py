@@ -0,0 +1,123 @@
+"""
+Cache response đã serialize sẵn (JSON bytes + bản nén gzip/brotli) theo version.
+
+Mỗi mục ghi lại version của dữ liệu lúc dựng; khi đọc, mục có version khác
+version hiện tại bị coi như không có. Nhờ vậy cache luôn đúng kể cả khi bỏ lỡ
+một lần invalidate, còn invalidate() chỉ để giải phóng bộ nhớ sớm.
+
+Bản nén được tạo lười ở lần đầu có client yêu cầu, rồi dùng lại cho mọi
+request sau. brotli là tuỳ chọn: không cài thì chỉ phục vụ gzip.
+"""
+import gzip
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.config import RESPONSE_CACHE, RESPONSE_CACHE_MIN_COMPRESS
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli không bắt buộc
+    brotli = None
+
+
+def _compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    compressors = {"gzip": lambda body: gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=5)
+    return compressors
+
+
+COMPRESSORS = _compressors()
+# Thứ tự ưu tiên khi client chấp nhận nhiều cách nén
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Chọn cách nén tốt nhất mà client chấp nhận (bỏ qua mục có q=0)"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in COMPRESSORS and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+class CachedResponse:
+    """Body JSON dựng sẵn của một view tại một version"""
+
+    __slots__ = ("version", "etag", "body", "_encoded", "_lock")
+
+    def __init__(self, version: int, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(body, Content-Encoding) cho cách nén đã chọn; body nhỏ được gửi nguyên"""
+        if encoding is None or len(self.body) < RESPONSE_CACHE_MIN_COMPRESS:
+            return self.body, None
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    body = self._encoded[encoding] = COMPRESSORS[encoding](self.body)
+        return body, encoding
+
+    def to_response(self, request: Request) -> Response:
+        body, encoding = self.encoded(choose_encoding(request.headers.get("accept-encoding")))
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """Bảng key -> CachedResponse, mỗi mục chỉ hợp lệ với đúng version đã dựng"""
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, CachedResponse] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: int) -> Optional[CachedResponse]:
+        entry = self._entries.get(key) if self.enabled else None
+        if entry is None or entry.version != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, version: int, etag: str, body: bytes) -> CachedResponse:
+        entry = CachedResponse(version, etag, body)
+        if self.enabled:
+            with self._lock:
+                current = self._entries.get(key)
+                # Không ghi đè bản mới hơn bằng bản dựng từ dữ liệu cũ
+                if current is None or current.version <= version:
+                    self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,81 @@
+"""
+Đồng bộ dữ liệu trong RAM của worker với database dùng chung (STORAGE_BACKEND=sqlite).
+
+Mỗi worker giữ catalog và đơn hàng đang xử lý trong RAM để đọc nhanh; khi
+worker khác bán hàng, đổi stock hay chuyển trạng thái đơn, tác vụ này nạp lại
+phần đã đổi từ database. Việc kiểm tra rất rẻ (PRAGMA data_version) nên chỉ
+đọc bảng khi thật sự có commit mới, và chỉ đọc các dòng được ghi sau lần nạp
+trước (chỉ mục theo changed_at / updated_at) chứ không quét lại cả bảng. Việc
+nạp chạy trong thread pool để không chặn event loop.
+
+- Catalog tăng version cho sản phẩm đổi stock nên cache response / ETag vẫn đúng.
+- Đơn hàng đổi trạng thái ở worker khác được báo cho listener của kho đơn hàng,
+  nên kiosk đang giữ kết nối SSE ở worker này vẫn nhận được sự kiện PAID.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from app.config import STORAGE_SYNC_INTERVAL
+from app.models.catalog import ProductCatalog
+from app.models.order import OrderStore, order_store
+from app.models.product import catalog as product_catalog
+from app.models.storage import storage as default_storage
+
+logger = logging.getLogger(__name__)
+
+# Đọc lùi thêm một khoảng khi lấy sản phẩm / đơn đã đổi: dòng ghi trước có thể
+# commit sau (đồng hồ giữa các worker và thứ tự commit không khớp tuyệt đối)
+CHANGE_LOOKBACK = 1.0
+
+
+class StorageSync:
+    """Định kỳ đưa thay đổi do worker khác ghi vào catalog và kho đơn hàng của worker này"""
+
+    def __init__(self, catalog: ProductCatalog = product_catalog, orders: OrderStore = order_store,
+                 storage: Any = default_storage, interval: float = STORAGE_SYNC_INTERVAL):
+        self.catalog = catalog
+        self.orders = orders
+        self.storage = storage
+        self.interval = interval
+        self._stock_since = time.time()
+        self._orders_since = time.time()
+        self._task: Optional[asyncio.Task] = None
+
+    def sync(self) -> int:
+        """Nạp thay đổi nếu database có commit mới; trả về số sản phẩm + đơn hàng đã cập nhật"""
+        if not self.storage.persistent or not self.storage.data_changed():
+            return 0
+        changed = 0
+        stock = self.storage.stock_changed_since(self._stock_since - CHANGE_LOOKBACK)
+        if stock:
+            self._stock_since = max(self._stock_since, stock[-1][4])
+            changed += self.catalog.refresh(row[:4] for row in stock)
+        orders = self.storage.orders_changed_since(self._orders_since - CHANGE_LOOKBACK)
+        if orders:
+            self._orders_since = max(self._orders_since, orders[-1][2])
+            changed += self.orders.refresh(orders)
+        return changed
+
+    def start(self) -> None:
+        """Chạy vòng đồng bộ trên event loop hiện tại (chỉ khi dùng lớp lưu trữ bền vững)"""
+        if self.storage.persistent and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.storage.offload(self.sync)
+            except Exception as e:
+                logger.warning("Lỗi đồng bộ dữ liệu từ database: %s", e)
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+storage_sync = StorageSync()
@@ -0,0 +1,182 @@
+"""
+Telemetry đội máy bán hàng - nhận heartbeat và phát hiện máy mất kết nối.
+
+- Mỗi máy có một ring buffer kích thước cố định (HEARTBEAT_HISTORY) lưu thời
+  điểm nhận heartbeat: bộ nhớ không tăng theo số heartbeat đã nhận.
+- Máy mất kết nối được phát hiện bằng timer wheel thay vì quét cả đội máy:
+  heartbeat chỉ cập nhật last_seen (không đụng tới bánh xe); khi hạn chót của
+  một máy tới, nếu máy đã gửi heartbeat mới thì hẹn lại, ngược lại đánh dấu OFFLINE.
+"""
+import asyncio
+import logging
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from app.config import HEARTBEAT_HISTORY, HEARTBEAT_TIMEOUT
+from app.services.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+ONLINE = "ONLINE"
+OFFLINE = "OFFLINE"
+
+
+class HeartbeatRing:
+    """Ring buffer thời điểm nhận heartbeat của một máy (cấp phát một lần)"""
+
+    __slots__ = ("times", "size", "count", "pos")
+
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.size = size
+        self.count = 0  # Tổng số heartbeat đã nhận
+        self.pos = 0    # Ô sẽ ghi tiếp theo
+
+    def push(self, timestamp: float) -> None:
+        self.times[self.pos] = timestamp
+        self.pos = (self.pos + 1) % self.size
+        self.count += 1
+
+    def last(self) -> float:
+        return self.times[self.pos - 1] if self.count else 0.0
+
+    def recent(self) -> List[float]:
+        """Các thời điểm còn trong buffer, cũ nhất trước"""
+        if self.count < self.size:
+            return list(self.times[:self.count])
+        return list(self.times[self.pos:]) + list(self.times[:self.pos])
+
+
+class MachineTelemetry:
+    """Trạng thái mới nhất và lịch sử heartbeat của một máy"""
+
+    __slots__ = ("machine_id", "ring", "status", "reported_status", "products", "online_since")
+
+    def __init__(self, machine_id: str, history: int):
+        self.machine_id = machine_id
+        self.ring = HeartbeatRing(history)
+        self.status = ONLINE
+        self.reported_status = ONLINE
+        self.products: Any = None
+        self.online_since = 0.0
+
+    @property
+    def last_seen(self) -> float:
+        return self.ring.last()
+
+    def to_dict(self, now: float, detail: bool = False) -> Dict[str, Any]:
+        """detail=True kèm danh sách sản phẩm máy báo về"""
+        times = self.ring.recent()
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        data = {
+            "machine_id": self.machine_id,
+            "status": self.status,
+            "reported_status": self.reported_status,
+            "last_seen": self.last_seen,
+            "seconds_since_last": round(now - self.last_seen, 3),
+            "online_since": self.online_since if self.status == ONLINE else None,
+            "heartbeats": self.ring.count,
+            "avg_interval": round(sum(intervals) / len(intervals), 3) if intervals else None,
+            "max_interval": round(max(intervals), 3) if intervals else None,
+        }
+        if detail:
+            data["products"] = self.products
+        return data
+
+
+class FleetTelemetry:
+    """Nhận heartbeat của cả đội máy và theo dõi máy nào đang online"""
+
+    def __init__(self, timeout: float = HEARTBEAT_TIMEOUT, history: int = HEARTBEAT_HISTORY,
+                 tick: float = 1.0):
+        self.timeout = timeout
+        self.history = history
+        self._lock = threading.Lock()
+        self._machines: Dict[str, MachineTelemetry] = {}
+        self._online = 0
+        self._wheel = TimerWheel(tick=tick, now=time.time())
+        self._watcher: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._machines)
+
+    def ingest(self, machine_id: str, status: str = ONLINE, products: Any = None,
+               now: Optional[float] = None) -> MachineTelemetry:
+        """Ghi nhận một heartbeat"""
+        now = time.time() if now is None else now
+        with self._lock:
+            machine = self._machines.get(machine_id)
+            if machine is None:
+                machine = self._machines[machine_id] = MachineTelemetry(machine_id, self.history)
+                machine.status = OFFLINE
+            machine.ring.push(now)
+            machine.reported_status = status
+            if products is not None:
+                machine.products = products
+            if machine.status == OFFLINE:
+                machine.status = ONLINE
+                machine.online_since = now
+                self._online += 1
+                self._wheel.schedule(machine_id, now + self.timeout)
+        return machine
+
+    def check_offline(self, now: Optional[float] = None) -> List[str]:
+        """Tiến timer wheel, trả về các máy vừa chuyển sang OFFLINE"""
+        now = time.time() if now is None else now
+        offline = []
+        for machine_id in self._wheel.advance(now):
+            with self._lock:
+                machine = self._machines[machine_id]
+                deadline = machine.last_seen + self.timeout
+                if deadline > now:
+                    # Đã có heartbeat mới kể từ lần hẹn trước -> hẹn lại theo last_seen
+                    self._wheel.schedule(machine_id, deadline)
+                    continue
+                machine.status = OFFLINE
+                self._online -= 1
+            offline.append(machine_id)
+        return offline
+
+    def get(self, machine_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Trạng thái của một máy"""
+        now = time.time() if now is None else now
+        self.check_offline(now)
+        machine = self._machines.get(machine_id)
+        return machine.to_dict(now, detail=True) if machine else None
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Số máy online / offline"""
+        self.check_offline(now)
+        total = len(self._machines)
+        return {"total": total, "online": self._online, "offline": total - self._online}
+
+    def list_machines(self, status: Optional[str] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Danh sách máy (lọc theo ONLINE / OFFLINE nếu có)"""
+        now = time.time() if now is None else now
+        self.check_offline(now)
+        return [
+            m.to_dict(now) for m in list(self._machines.values())
+            if status is None or m.status == status
+        ]
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._wheel.tick)
+            for machine_id in self.check_offline():
+                logger.warning("Máy %s mất kết nối (không có heartbeat %.0fs)", machine_id, self.timeout)
+
+    def start(self) -> None:
+        """Chạy vòng phát hiện máy mất kết nối trên event loop hiện tại"""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+
+# Instance dùng chung cho toàn bộ ứng dụng
+fleet = FleetTelemetry()
@@ -0,0 +1,79 @@
+"""
+Timer wheel (hashed) - lập lịch hàng chục nghìn hạn chót mà không phải quét toàn bộ.
+
+Thời gian được chia thành các tick; mỗi khóa được đặt vào ô (slot) ứng với tick
+của hạn chót. Mỗi lần advance() chỉ duyệt các ô của những tick đã trôi qua, nên
+chi phí tỉ lệ với số khóa tới hạn chứ không phải tổng số khóa đang theo dõi.
+Hạn chót xa hơn một vòng bánh xe vẫn nằm trong ô và được bỏ qua tới vòng sau.
+"""
+import threading
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+class TimerWheel:
+    """Bánh xe hẹn giờ: schedule / cancel O(1), advance tỉ lệ với số ô đã trôi qua"""
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, now: float = 0.0):
+        self.tick = tick
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._wheel: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self._deadlines: Dict[Hashable, Tuple[float, int]] = {}  # khóa -> (hạn chót, ô)
+        self._current = int(now / tick) - 1  # Tick đã xử lý gần nhất
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Hạn chót hiện tại của khóa (None nếu không có)"""
+        entry = self._deadlines.get(key)
+        return entry[0] if entry else None
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Đặt (hoặc dời) hạn chót cho khóa"""
+        with self._lock:
+            old = self._deadlines.get(key)
+            if old is not None:
+                self._wheel[old[1]].discard(key)
+            # Hạn chót đã qua được xử lý ở lần advance kế tiếp
+            slot = max(int(deadline / self.tick), self._current + 1) % self.slots
+            self._deadlines[key] = (deadline, slot)
+            self._wheel[slot].add(key)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Bỏ hẹn giờ của khóa; trả về False nếu khóa không được hẹn"""
+        with self._lock:
+            entry = self._deadlines.pop(key, None)
+            if entry is None:
+                return False
+            self._wheel[entry[1]].discard(key)
+            return True
+
+    def advance(self, now: float) -> List[Hashable]:
+        """
+        Tiến bánh xe tới thời điểm now, trả về (và bỏ hẹn) các khóa đã tới hạn.
+
+        Một ô chỉ được xử lý khi tick của nó đã trôi qua hết, nên khóa có thể
+        hết hạn trễ tối đa một tick.
+        """
+        expired = []
+        with self._lock:
+            target = int(now / self.tick) - 1
+            if target <= self._current:
+                return expired
+            # Khoảng trống dài hơn một vòng: mỗi ô chỉ cần duyệt một lần
+            steps = min(target - self._current, self.slots)
+            for step in range(1, steps + 1):
+                bucket = self._wheel[(self._current + step) % self.slots]
+                if not bucket:
+                    continue
+                due = [key for key in bucket if self._deadlines[key][0] <= now]
+                for key in due:
+                    bucket.discard(key)
+                    del self._deadlines[key]
+                expired.extend(due)
+            self._current = target
+        return expired
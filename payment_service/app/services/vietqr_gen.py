@@ -0,0 +1,185 @@
+"""
+Sinh mã VietQR (chuẩn EMVCo / NAPAS 247) ngay trên server, không cần chờ PayOS.
+
+Payload là chuỗi các trường TLV (tag 2 số + độ dài 2 số + giá trị), kết thúc
+bằng CRC16-CCITT (poly 0x1021, init 0xFFFF) của toàn bộ chuỗi phía trước:
+
+    00 phiên bản | 01 tĩnh/động | 38 tài khoản (GUID NAPAS, BIN ngân hàng, số TK, dịch vụ)
+    53 tiền tệ (704 = VND) | 54 số tiền | 58 quốc gia | 62 nội dung chuyển khoản | 63 CRC
+
+Ảnh QR (PNG/SVG) được render bằng thư viện segno (tuỳ chọn) và cache LRU theo
+(tài khoản, số tiền, nội dung, định dạng) vì render chậm hơn sinh payload hàng nghìn lần.
+"""
+import binascii
+import io
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config import VIETQR_BANK_BIN, VIETQR_ACCOUNT_NO, VIETQR_ACCOUNT_NAME, QR_CACHE_SIZE
+
+try:
+    import segno
+except ImportError:  # pragma: no cover - segno không bắt buộc
+    segno = None
+
+NAPAS_GUID = "A000000727"
+SERVICE_TRANSFER_TO_ACCOUNT = "QRIBFTTA"
+CURRENCY_VND = "704"
+COUNTRY_VN = "VN"
+# PayOS giới hạn nội dung chuyển khoản 25 ký tự
+MAX_DESCRIPTION_LENGTH = 25
+
+IMAGE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def crc16_ccitt(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC16-CCITT (FALSE) - dùng cho trường 63 của EMVCo QR (binascii.crc_hqx cùng thuật toán, viết bằng C)"""
+    return binascii.crc_hqx(data, crc)
+
+
+def tlv(tag: str, value: str) -> str:
+    """Một trường EMVCo: tag + độ dài (2 chữ số) + giá trị"""
+    if len(value) > 99:
+        raise ValueError(f"Trường {tag} dài quá 99 ký tự")
+    return f"{tag}{len(value):02d}{value}"
+
+
+def normalize_description(description: str) -> str:
+    """Bỏ dấu tiếng Việt và ký tự đặc biệt - nhiều app ngân hàng chỉ nhận ASCII"""
+    text = description.replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = "".join(ch if ch.isalnum() or ch == " " else " " for ch in text)
+    return " ".join(text.split())[:MAX_DESCRIPTION_LENGTH].rstrip()
+
+
+def build_payload(bank_bin: str, account_no: str, amount: Optional[int] = None,
+                  description: Optional[str] = None) -> str:
+    """
+    Tạo payload VietQR chuyển khoản tới tài khoản.
+
+    Có amount -> QR động (dùng một lần, số tiền cố định), không có -> QR tĩnh.
+    """
+    beneficiary = tlv("00", bank_bin) + tlv("01", account_no)
+    merchant_account = (
+        tlv("00", NAPAS_GUID) + tlv("01", beneficiary) + tlv("02", SERVICE_TRANSFER_TO_ACCOUNT)
+    )
+    parts = [
+        tlv("00", "01"),
+        tlv("01", "12" if amount else "11"),
+        tlv("38", merchant_account),
+        tlv("53", CURRENCY_VND),
+    ]
+    if amount:
+        parts.append(tlv("54", str(int(amount))))
+    parts.append(tlv("58", COUNTRY_VN))
+    if description:
+        parts.append(tlv("62", tlv("08", normalize_description(description))))
+    payload = "".join(parts) + "6304"
+    return payload + f"{crc16_ccitt(payload.encode('utf-8')):04X}"
+
+
+def parse_payload(payload: str) -> Dict[str, str]:
+    """
+    Tách payload thành {tag: value} (chỉ cấp ngoài cùng) sau khi kiểm tra CRC.
+
+    Raises:
+        ValueError: sai định dạng hoặc sai CRC
+    """
+    if len(payload) < 8 or payload[-8:-4] != "6304":
+        raise ValueError("Thiếu trường CRC")
+    if f"{crc16_ccitt(payload[:-4].encode('utf-8')):04X}" != payload[-4:].upper():
+        raise ValueError("Sai CRC")
+    fields = {}
+    pos = 0
+    while pos < len(payload):
+        tag, length = payload[pos:pos + 2], int(payload[pos + 2:pos + 4])
+        fields[tag] = payload[pos + 4:pos + 4 + length]
+        pos += 4 + length
+    return fields
+
+
+def order_description(order_code: int) -> str:
+    """Nội dung chuyển khoản cho đơn hàng - ngắn, ASCII, duy nhất theo order_code"""
+    return f"DH{order_code}"
+
+
+class VietQRGenerator:
+    """Sinh payload và render ảnh VietQR cho một tài khoản nhận tiền, cache ảnh theo LRU"""
+
+    def __init__(self, bank_bin: Optional[str] = VIETQR_BANK_BIN,
+                 account_no: Optional[str] = VIETQR_ACCOUNT_NO,
+                 account_name: Optional[str] = VIETQR_ACCOUNT_NAME,
+                 cache_size: int = QR_CACHE_SIZE):
+        self.bank_bin = bank_bin
+        self.account_no = account_no
+        self.account_name = account_name
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._images: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def configured(self) -> bool:
+        """Đã cấu hình tài khoản nhận tiền (VIETQR_BANK_BIN, VIETQR_ACCOUNT_NO) chưa"""
+        return bool(self.bank_bin and self.account_no)
+
+    @property
+    def can_render(self) -> bool:
+        return segno is not None
+
+    def payload(self, amount: Optional[int], description: Optional[str]) -> str:
+        if not self.configured:
+            raise RuntimeError("Chưa cấu hình VIETQR_BANK_BIN / VIETQR_ACCOUNT_NO")
+        return build_payload(self.bank_bin, self.account_no, amount, description)
+
+    def render(self, amount: Optional[int], description: Optional[str],
+               fmt: str = "svg", scale: int = 6) -> bytes:
+        """Ảnh QR (png/svg) cho khoản chuyển tiền, lấy từ cache nếu đã render"""
+        key = (self.account_no, amount, description, fmt, scale)
+        image = self._cached(key)
+        if image is None:
+            image = self._render(key, self.payload(amount, description), fmt, scale)
+        return image
+
+    def render_payload(self, payload: str, fmt: str = "svg", scale: int = 6) -> bytes:
+        """Render một payload bất kỳ (vd. qrCode PayOS trả về), cache theo payload"""
+        key = (payload, fmt, scale)
+        image = self._cached(key)
+        if image is None:
+            image = self._render(key, payload, fmt, scale)
+        return image
+
+    def _cached(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def _render(self, key: tuple, payload: str, fmt: str, scale: int) -> bytes:
+        if fmt not in IMAGE_MEDIA_TYPES:
+            raise ValueError(f"Định dạng ảnh không hỗ trợ: {fmt}")
+        if segno is None:
+            raise RuntimeError("Cần cài segno để render ảnh QR (pip install segno)")
+
+        buffer = io.BytesIO()
+        segno.make(payload, error="m", micro=False).save(buffer, kind=fmt, scale=scale, border=2)
+        image = buffer.getvalue()
+        with self._lock:
+            self._images[key] = image
+            if len(self._images) > self.cache_size:
+                self._images.popitem(last=False)
+        return image
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+
+# Generator dùng chung cho toàn bộ ứng dụng (tài khoản nhận tiền từ .env)
+vietqr = VietQRGenerator()
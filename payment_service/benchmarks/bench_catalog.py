@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí tra cứu sản phẩm - duyệt list (cách cũ) so với ProductCatalog có chỉ mục.
+
+Đo ở 10, 1.000 và 100.000 sản phẩm cho các thao tác:
+  - get_product_by_id
+  - get_all_products (danh sách đang bán)
+  - decrease_product_stock
+
+Chạy:
+    python benchmarks/bench_catalog.py
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.models.catalog import ProductCatalog
+from app.models.product import Product
+
+CATEGORIES = ["Nước ngọt", "Nước suối", "Snack", "Bánh kẹo"]
+
+
+def make_products(n: int):
+    return [
+        Product(
+            id=i,
+            name=f"SP {i}",
+            price=10000,
+            stock=10**9,
+            category=CATEGORIES[i % len(CATEGORIES)],
+            is_available=(i % 10 != 0),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+# ----- Cách cũ: duyệt toàn bộ list -----
+
+def linear_get(products, product_id):
+    for product in products:
+        if product.id == product_id and product.is_available:
+            return product
+    return None
+
+
+def linear_all(products):
+    return [p for p in products if p.is_available]
+
+
+def linear_decrease(products, product_id, quantity=1):
+    product = linear_get(products, product_id)
+    if product and product.stock >= quantity:
+        product.stock -= quantity
+        return True
+    return False
+
+
+def per_op_us(fn, args_list) -> float:
+    start = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+
+def bench_size(n: int, ops: int) -> list:
+    products = make_products(n)
+    catalog = ProductCatalog(make_products(n))
+    ids = [(random.randint(1, n),) for _ in range(ops)]
+    # list toàn bộ với 100k sản phẩm rất chậm ở cách cũ - giảm số lần lặp
+    list_ops = [()] * max(1, min(ops, 200000 // n))
+    catalog.list_available()  # Lần đầu dựng cache, các lần sau đọc lại
+
+    return [
+        ("get_product_by_id",
+         per_op_us(lambda pid: linear_get(products, pid), ids),
+         per_op_us(catalog.get_available, ids)),
+        ("get_all_products",
+         per_op_us(lambda: linear_all(products), list_ops),
+         per_op_us(catalog.list_available, list_ops)),
+        ("decrease_product_stock",
+         per_op_us(lambda pid: linear_decrease(products, pid), ids),
+         per_op_us(catalog.decrement_stock, ids)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--ops", type=int, default=2000, help="Số lần tra cứu mỗi thao tác")
+    args = parser.parse_args()
+
+    print("🧪 Chi phí mỗi thao tác (µs): duyệt list vs catalog có chỉ mục")
+    print("=" * 72)
+    print(f"{'Số SP':>8} | {'Thao tác':<24} | {'List':>12} | {'Catalog':>10} | {'Nhanh hơn':>9}")
+    print("-" * 72)
+    for n in args.sizes:
+        for name, linear_us, indexed_us in bench_size(n, args.ops):
+            speedup = linear_us / indexed_us if indexed_us else float("inf")
+            print(f"{n:>8} | {name:<24} | {linear_us:>12.2f} | {indexed_us:>10.3f} | {speedup:>8.0f}x")
+        print("-" * 72)
+
+
+if __name__ == "__main__":
+    main()
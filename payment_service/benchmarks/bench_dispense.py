@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Bão xác nhận xuất hàng trùng lặp: mỗi đơn đã thanh toán được máy gửi xác nhận
+nhiều lần song song (mô phỏng kiosk thử lại khi mạng chập chờn), một phần gửi
+với Idempotency-Key khác. Kiểm tra stock chỉ bị trừ đúng một lần mỗi đơn và đo
+độ trễ của lần xác nhận đầu so với lần trả lời từ bộ đệm chống trùng.
+
+Chạy:
+    python benchmarks/bench_dispense.py --orders 2000 --retries 5
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.order import OrderStatus, order_store
+from app.models.product import catalog
+from app.services.inventory import inventory
+from main import app
+
+PRODUCT_ID = 1
+
+
+def prepare_orders(orders: int, base_code: int = 30_000_000) -> list:
+    """Tạo các đơn đã thanh toán, mỗi đơn giữ chỗ 1 sản phẩm"""
+    catalog.set_stock(PRODUCT_ID, orders)
+    codes = []
+    for i in range(orders):
+        code = base_code + i
+        assert inventory.reserve(code, PRODUCT_ID, ttl=3600)
+        order_store.create(code, f"VM{i % 50:03d}", PRODUCT_ID, 15000)
+        order_store.transition(code, OrderStatus.PENDING)
+        order_store.transition(code, OrderStatus.PAID)
+        codes.append(code)
+    return codes
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float("nan")
+
+
+async def storm(codes: list, retries: int, concurrency: int, foreign_key_ratio: float) -> dict:
+    first_ms, duplicate_ms = [], []
+    statuses = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def confirm(code, machine_id, key):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/dispense-complete",
+                    json={"order_code": code, "machine_id": machine_id, "product_id": PRODUCT_ID},
+                    headers={"Idempotency-Key": key},
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+            statuses.append(response.status_code)
+            if response.status_code == 200:
+                (duplicate_ms if response.json()["duplicate"] else first_ms).append(elapsed)
+
+        jobs = []
+        for code in codes:
+            machine_id = order_store.get(code).machine_id
+            key = f"{machine_id}:{code}:dispense"
+            jobs += [confirm(code, machine_id, key) for _ in range(retries)]
+            if random.random() < foreign_key_ratio:
+                # Xác nhận lại với khóa khác (vd. máy khởi động lại, mất khóa cũ)
+                jobs.append(confirm(code, machine_id, f"{key}:reboot"))
+        random.shuffle(jobs)
+
+        start = time.perf_counter()
+        await asyncio.gather(*jobs)
+        seconds = time.perf_counter() - start
+
+    return {
+        "requests": len(jobs),
+        "rate": len(jobs) / seconds,
+        "ok": statuses.count(200),
+        "first": len(first_ms),
+        "first_p50": percentile(first_ms, 50),
+        "dup_p50": percentile(duplicate_ms, 50),
+        "first_p99": percentile(first_ms, 99),
+        "dup_p99": percentile(duplicate_ms, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--retries", type=int, default=5, help="Số lần mỗi xác nhận bị gửi lặp")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--foreign-keys", type=float, default=0.1, help="Tỉ lệ đơn bị xác nhận thêm với khóa khác")
+    args = parser.parse_args()
+
+    codes = prepare_orders(args.orders)
+    r = asyncio.run(storm(codes, args.retries, args.concurrency, args.foreign_keys))
+    stock_left = catalog.get(PRODUCT_ID).stock
+    dispensed = sum(1 for c in codes if order_store.get(c).status == OrderStatus.DISPENSED)
+
+    print(f"🧪 {r['requests']:,} xác nhận xuất hàng cho {args.orders:,} đơn")
+    print("=" * 60)
+    print(f"Thông lượng: {r['rate']:,.0f} xác nhận/giây | HTTP 200: {r['ok']:,}")
+    print(f"Lần đầu (trừ stock):    p50={r['first_p50']:.2f} ms  p99={r['first_p99']:.2f} ms  ({r['first']:,} lần)")
+    print(f"Trùng lặp (từ bộ đệm):  p50={r['dup_p50']:.2f} ms  p99={r['dup_p99']:.2f} ms")
+    print(f"Stock còn lại: {stock_left} (kỳ vọng 0) | đơn DISPENSED: {dispensed:,} | "
+          f"còn giữ chỗ: {catalog.reserved(PRODUCT_ID)}")
+
+    ok = (stock_left == 0 and r["first"] == args.orders and dispensed == args.orders
+          and r["ok"] == r["requests"] and catalog.reserved(PRODUCT_ID) == 0)
+    print("✅ Mỗi đơn trừ stock đúng một lần" if ok else "❌ Stock bị trừ sai")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Đo khả năng nhận heartbeat của một worker với cả đội máy:
+
+1. Tốc độ ingest trực tiếp vào FleetTelemetry và bộ nhớ tăng thêm sau khi
+   đã nhận đủ vòng heartbeat (ring buffer cố định -> không tăng theo heartbeat)
+2. Chi phí phát hiện máy mất kết nối mỗi tick: timer wheel vs quét toàn bộ đội máy
+3. Thông lượng POST /api/heartbeat qua toàn bộ stack FastAPI (1 worker)
+
+Thời gian trong phần 1-2 là thời gian giả lập, nên không phải chờ HEARTBEAT_TIMEOUT thật.
+
+Chạy:
+    python benchmarks/bench_heartbeat.py --machines 10000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.config import HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT
+from app.services.telemetry import FleetTelemetry, fleet
+from main import app
+
+
+def bench_ingest(machines: int, rounds: int) -> dict:
+    telemetry = FleetTelemetry()
+    ids = [f"VM{i:05d}" for i in range(machines)]
+    start_time = time.time()
+
+    # Vòng đầu tạo ring buffer cho từng máy, các vòng sau chỉ ghi đè
+    for machine_id in ids:
+        telemetry.ingest(machine_id, now=start_time)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ingest = telemetry.ingest
+    beats = 0
+    start = time.perf_counter()
+    for r in range(1, rounds + 1):
+        now = start_time + r * HEARTBEAT_INTERVAL
+        for machine_id in ids:
+            ingest(machine_id, now=now)
+        beats += machines
+    seconds = time.perf_counter() - start
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {"rate": beats / seconds, "beats": beats, "growth_bytes": growth}
+
+
+def bench_offline(machines: int, dead_ratio: float) -> dict:
+    """Mô phỏng một khoảng thời gian dài: một phần máy ngừng gửi heartbeat giữa chừng"""
+    telemetry = FleetTelemetry()
+    ids = [f"VM{i:05d}" for i in range(machines)]
+    dead = set(random.sample(ids, int(machines * dead_ratio)))
+    start_time = time.time()
+    # Mỗi máy gửi lệch pha nhau trong chu kỳ HEARTBEAT_INTERVAL
+    phase = {m: random.uniform(0, HEARTBEAT_INTERVAL) for m in ids}
+
+    duration = HEARTBEAT_INTERVAL * 10
+    stop_at = duration // 2
+    wheel_seconds = 0.0
+    scan_seconds = 0.0
+    ticks = 0
+    detected = set()
+    for second in range(duration):
+        now = start_time + second
+        for m in ids:
+            if (second - phase[m]) % HEARTBEAT_INTERVAL < 1 and not (m in dead and second >= stop_at):
+                telemetry.ingest(m, now=now)
+
+        t0 = time.perf_counter()
+        detected.update(telemetry.check_offline(now))
+        wheel_seconds += time.perf_counter() - t0
+
+        # Cách làm ngây thơ: quét cả đội máy mỗi tick
+        t0 = time.perf_counter()
+        [m for m, t in telemetry._machines.items() if now - t.last_seen > HEARTBEAT_TIMEOUT]
+        scan_seconds += time.perf_counter() - t0
+        ticks += 1
+
+    return {
+        "wheel_us": wheel_seconds / ticks * 1e6,
+        "scan_us": scan_seconds / ticks * 1e6,
+        "dead": dead,
+        "detected": detected,
+    }
+
+
+async def bench_http(machines: int, requests: int, concurrency: int) -> float:
+    ids = [f"VM{i:05d}" for i in range(machines)]
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def beat(i):
+            async with semaphore:
+                response = await client.post("/api/heartbeat", json={
+                    "machine_id": ids[i % machines],
+                    "timestamp": "2025-01-01T10:00:00",
+                    "status": "ONLINE",
+                })
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(beat(i) for i in range(requests)))
+        seconds = time.perf_counter() - start
+    assert statuses.count(200) == requests
+    return requests / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=20, help="Số vòng heartbeat khi đo ingest")
+    parser.add_argument("--dead", type=float, default=0.05, help="Tỉ lệ máy ngừng gửi heartbeat")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"🧪 Heartbeat của {args.machines:,} máy")
+    print("=" * 60)
+
+    r = bench_ingest(args.machines, args.rounds)
+    print(f"Ingest trực tiếp: {r['rate']:,.0f} heartbeat/giây")
+    print(f"  bộ nhớ tăng thêm sau {r['beats']:,} heartbeat: {r['growth_bytes']:,} bytes")
+
+    o = bench_offline(args.machines, args.dead)
+    missed = o["dead"] - o["detected"]
+    false_alarms = o["detected"] - o["dead"]
+    print(f"Phát hiện mất kết nối mỗi tick: timer wheel {o['wheel_us']:.1f} µs | quét toàn bộ {o['scan_us']:.1f} µs")
+    print(f"  máy ngừng gửi: {len(o['dead']):,} | phát hiện: {len(o['detected']):,} | "
+          f"bỏ sót: {len(missed)} | báo nhầm: {len(false_alarms)}")
+
+    rate = asyncio.run(bench_http(args.machines, args.requests, args.concurrency))
+    print(f"POST /api/heartbeat (1 worker): {rate:,.0f} heartbeat/giây "
+          f"= đủ cho ~{rate * HEARTBEAT_INTERVAL:,.0f} máy gửi mỗi {HEARTBEAT_INTERVAL}s")
+    print(f"  máy đang online: {fleet.summary()['online']:,}")
+
+    # Cho phép vài KB dao động của allocator, nhưng không được tăng theo số heartbeat
+    ok = not missed and not false_alarms and r["growth_bytes"] < 64 * 1024
+    print("✅ Phát hiện đúng mọi máy mất kết nối, bộ nhớ không tăng theo heartbeat" if ok
+          else "❌ Sai lệch khi phát hiện máy mất kết nối hoặc bộ nhớ tăng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
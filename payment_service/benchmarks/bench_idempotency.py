@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Đo số lời gọi PayOS và độ trễ khi kiosk gửi trùng POST /api/create-payment:
+
+1. Khách bấm liên tục: --burst request giống hệt nhau (cùng Idempotency-Key) đến
+   cùng lúc -> chỉ một lời gọi PayOS, các request còn lại chờ chung kết quả
+2. Kiosk gửi lại sau timeout: cùng key, sau khi request đầu đã xong -> trả từ cache
+3. Không gửi key: hai lần bấm cách nhau vài trăm ms -> vẫn nhận cùng một đơn
+
+So sánh với trường hợp mỗi request một key khác nhau (không gộp được).
+PayOS được giả lập với độ trễ --payos-latency.
+
+Chạy:
+    python benchmarks/bench_idempotency.py --groups 50 --burst 5 --payos-latency 0.3
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import catalog
+from app.routers import payment as payment_router
+from app.services.payos_client import AsyncPayOSClient
+from app.services.vietqr_gen import vietqr
+from benchmarks.bench_payment_concurrency import fake_payos_body
+from main import app
+
+payos_calls = 0
+
+
+def install_fake_payos(latency: float) -> AsyncPayOSClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        global payos_calls
+        payos_calls += 1
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=fake_payos_body(request))
+
+    client = AsyncPayOSClient(transport=httpx.MockTransport(handler))
+    payment_router.create_payment_link_async = client.create_payment_link
+    return client
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def timed_post(http: httpx.AsyncClient, payload: dict, key: str = None) -> tuple:
+    headers = {"Idempotency-Key": key} if key else {}
+    start = time.perf_counter()
+    response = await http.post("/api/create-payment", json=payload, headers=headers)
+    elapsed = (time.perf_counter() - start) * 1000
+    return response.json()["order_code"], elapsed, response.headers.get("Idempotent-Replayed") == "true"
+
+
+async def run(args) -> dict:
+    global payos_calls
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for mode in ("unique", "idempotent"):
+            payos_calls = 0
+            orders, first, coalesced, retried = set(), [], [], []
+            for g in range(args.groups):
+                payload = {"machine_id": f"VM{g % 10:03d}", "product_id": 1 + g % 8, "amount": 15000}
+                keys = [f"{mode}-{g}-{i}" if mode == "unique" else f"{mode}-{g}" for i in range(args.burst)]
+                burst = await asyncio.gather(*(timed_post(http, payload, key) for key in keys))
+                retry = await timed_post(http, payload, keys[-1])  # Gửi lại sau timeout
+                for code, ms, replayed in burst:
+                    orders.add(code)
+                    (coalesced if replayed else first).append(ms)
+                orders.add(retry[0])
+                retried.append(retry[1])
+            results[mode] = {
+                "requests": args.groups * (args.burst + 1),
+                "payos_calls": payos_calls,
+                "orders": len(orders),
+                "first_p50": percentile(first, 50),
+                "coalesced_p50": percentile(coalesced, 50) if coalesced else None,
+                "retry_p50": percentile(retried, 50),
+            }
+
+        # Không có key: hai lần bấm liên tiếp trên cùng máy, cùng sản phẩm
+        payload = {"machine_id": "VM_TAP", "product_id": 2, "amount": 15000}
+        tap1 = await timed_post(http, payload)
+        await asyncio.sleep(0.2)
+        tap2 = await timed_post(http, payload)
+        results["double_tap_same_order"] = tap1[0] == tap2[0]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=50, help="Số lần mua (mỗi lần một đơn)")
+    parser.add_argument("--burst", type=int, default=5, help="Số request trùng gửi cùng lúc mỗi lần mua")
+    parser.add_argument("--payos-latency", type=float, default=0.3, help="Độ trễ giả lập của PayOS (giây)")
+    args = parser.parse_args()
+
+    vietqr.account_no = None  # Đi đường chờ PayOS trả link
+    for product in catalog.list_available():
+        catalog.set_stock(product.id, 10**6)
+    client = install_fake_payos(args.payos_latency)
+
+    print(f"🧪 create-payment trùng lặp: {args.groups} lần mua x ({args.burst} request cùng lúc + 1 lần gửi lại)")
+    print("=" * 60)
+    r = asyncio.run(run(args))
+    asyncio.run(client.aclose())
+
+    print(f"{'Chế độ':<12} {'request':>8} {'gọi PayOS':>10} {'đơn tạo ra':>11} "
+          f"{'p50 lần đầu':>12} {'p50 chờ chung':>14} {'p50 gửi lại':>12}")
+    for mode in ("unique", "idempotent"):
+        m = r[mode]
+        coalesced = f"{m['coalesced_p50']:.1f} ms" if m["coalesced_p50"] is not None else "-"
+        print(f"{mode:<12} {m['requests']:>8} {m['payos_calls']:>10} {m['orders']:>11} "
+              f"{m['first_p50']:>9.1f} ms {coalesced:>14} {m['retry_p50']:>9.2f} ms")
+    print(f"Bấm hai lần không gửi key -> cùng một đơn: {'có' if r['double_tap_same_order'] else 'KHÔNG'}")
+
+    idem = r["idempotent"]
+    ok = idem["payos_calls"] == args.groups and idem["orders"] == args.groups and r["double_tap_same_order"]
+    print("✅ Mỗi lần mua chỉ một đơn và một lời gọi PayOS" if ok else "❌ Request trùng vẫn tạo đơn / gọi PayOS thêm")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Stress test engine tồn kho: dồn nhiều thread x coroutine vào MỘT sản phẩm.
+
+Mỗi coroutine lặp lại: giữ chỗ -> (nhường event loop) -> chốt hoặc trả lại,
+xen kẽ với mua trực tiếp. Kết thúc phải thoả:
+  - số đã bán (commit + mua trực tiếp) <= stock ban đầu (không bán vượt)
+  - stock cuối = stock ban đầu - số đã bán
+  - không còn phần giữ chỗ nào bị treo
+
+Chạy:
+    python benchmarks/bench_inventory_stress.py --threads 8 --coroutines 50 --stock 5000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.models.catalog import ProductCatalog
+from app.models.product import Product
+from app.services.inventory import InventoryEngine
+
+PRODUCT_ID = 1
+
+
+def run_thread(engine: InventoryEngine, coroutines: int, iterations: int, codes, counters, lock):
+    async def customer():
+        sold = released = rejected = 0
+        for _ in range(iterations):
+            if random.random() < 0.2:
+                # Mua trực tiếp qua API purchase
+                if engine.catalog.decrement_stock(PRODUCT_ID, 1):
+                    sold += 1
+                else:
+                    rejected += 1
+                continue
+
+            order_code = next(codes)
+            if not engine.reserve(order_code, PRODUCT_ID):
+                rejected += 1
+                continue
+            await asyncio.sleep(0)  # Khách đang thanh toán - nhường cho coroutine khác
+            if random.random() < 0.7:
+                sold += engine.commit(order_code)
+            else:
+                released += engine.release(order_code)
+        return sold, released, rejected
+
+    async def main():
+        return await asyncio.gather(*(customer() for _ in range(coroutines)))
+
+    results = asyncio.run(main())
+    with lock:
+        for sold, released, rejected in results:
+            counters["sold"] += sold
+            counters["released"] += released
+            counters["rejected"] += rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--coroutines", type=int, default=50, help="Số coroutine mỗi thread")
+    parser.add_argument("--iterations", type=int, default=200, help="Số lượt mua mỗi coroutine")
+    parser.add_argument("--stock", type=int, default=5000, help="Stock ban đầu của sản phẩm")
+    args = parser.parse_args()
+
+    catalog = ProductCatalog([Product(id=PRODUCT_ID, name="Coca Cola", price=15000, stock=args.stock)])
+    engine = InventoryEngine(catalog=catalog)
+    codes = itertools.count(1)  # next() trên itertools.count là nguyên tử trong CPython
+    counters = {"sold": 0, "released": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    pool = [
+        threading.Thread(target=run_thread, args=(engine, args.coroutines, args.iterations, codes, counters, lock))
+        for _ in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    attempts = args.threads * args.coroutines * args.iterations
+    final_stock = catalog.get(PRODUCT_ID).stock
+    reserved = catalog.reserved(PRODUCT_ID)
+
+    print(f"🧪 {args.threads} thread x {args.coroutines} coroutine trên 1 sản phẩm (stock {args.stock})")
+    print("=" * 60)
+    print(f"Lượt thử:      {attempts:,} ({attempts / elapsed:,.0f} lượt/giây)")
+    print(f"Đã bán:        {counters['sold']:,}")
+    print(f"Đã trả lại:    {counters['released']:,}")
+    print(f"Bị từ chối:    {counters['rejected']:,}")
+    print(f"Stock cuối:    {final_stock:,} | còn giữ chỗ: {reserved} | reservation treo: {len(engine)}")
+
+    ok = (
+        counters["sold"] <= args.stock
+        and final_stock == args.stock - counters["sold"]
+        and final_stock >= 0
+        and reserved == 0
+        and len(engine) == 0
+    )
+    print("✅ Không bán vượt stock" if ok else "❌ Sai lệch tồn kho!")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
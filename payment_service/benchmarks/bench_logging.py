@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+So sánh request/giây của create-payment (PayOS giả lập, trong process) khi:
+
+- off:   log tắt (level chặn INFO - kiểm tra level xong là bỏ, không tạo record)
+- sync:  StreamHandler ghi thẳng trên event loop (như print trước đây)
+- queue: BackgroundHandler của app/services/log.py, thread nền định dạng và ghi theo lô
+
+Đích ghi giả lập một terminal / pipe chậm: mỗi lần write tốn --write-delay giây.
+Ngoài ra đo chi phí logger.debug khi bị chặn, chi phí đưa một log vào bộ đệm,
+kiểm tra giới hạn cảnh báo lặp lại và request_id trên log của từng request.
+
+Chạy:
+    python benchmarks/bench_logging.py --requests 2000 --write-delay 0.0001
+"""
+import argparse
+import asyncio
+import io
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import catalog
+from app.routers import payment as payment_router
+from app.services.log import BackgroundHandler, RateLimitFilter, TextFormatter
+from app.services.payos_client import AsyncPayOSClient
+from app.services.vietqr_gen import vietqr
+from fake_payos import FakeConfig, FakePayOS, create_app
+from main import app
+
+
+class SlowStream(io.StringIO):
+    """Stream ghi vào RAM nhưng mỗi lần write chặn delay giây (terminal / pipe chậm)"""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().write(text)
+
+
+def configure(mode: str, delay: float):
+    """Thay handler của root logger theo mode, trả về (stream, handler)"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    stream = SlowStream(delay)
+    if mode == "queue":
+        handler = BackgroundHandler(stream, TextFormatter())
+    else:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(TextFormatter())
+    handler.addFilter(RateLimitFilter(10, 10))
+    root.addHandler(handler)
+    root.setLevel(logging.WARNING if mode == "off" else logging.INFO)
+    return stream, handler
+
+
+async def drive(requests: int, concurrency: int) -> float:
+    """Gửi requests lần create-payment với concurrency request đồng thời, trả về request/giây"""
+    product_id = catalog.list_available()[0].id
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(http):
+        async with semaphore:
+            response = await http.post("/api/create-payment", json={
+                "machine_id": "BENCH", "product_id": product_id, "amount": 15000,
+            }, headers={"Idempotency-Key": uuid.uuid4().hex})
+            assert response.status_code == 200, response.text
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        await asyncio.gather(*(one(http) for _ in range(50)))  # Khởi động
+        start = time.perf_counter()
+        await asyncio.gather(*(one(http) for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def per_call(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3, help="Số vòng đo xen kẽ các chế độ (lấy vòng nhanh nhất)")
+    parser.add_argument("--write-delay", type=float, default=0.0001, help="Thời gian mỗi lần ghi log ra đích (giây)")
+    args = parser.parse_args()
+
+    fake = FakePayOS(FakeConfig(latency=0, latency_dist="fixed"), seed=1)
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    payment_router.create_payment_link_async = client.create_payment_link
+    vietqr.account_no = None
+    catalog.set_stock(catalog.list_available()[0].id, 10**7)
+
+    print(f"🧪 Logging: {args.requests} create-payment, {args.concurrency} đồng thời, "
+          f"mỗi lần ghi log {args.write_delay * 1e6:.0f} µs")
+    print("=" * 60)
+    modes = ("off", "sync", "queue")
+    throughput, streams = dict.fromkeys(modes, 0.0), {}
+    for _ in range(args.rounds):
+        for mode in modes:
+            stream, handler = configure(mode, args.write_delay)
+            throughput[mode] = max(throughput[mode], asyncio.run(drive(args.requests, args.concurrency)))
+            handler.flush()  # Ghi nốt log còn trong bộ đệm
+            streams[mode] = stream.getvalue()
+    for mode in modes:
+        print(f"{mode:<6} {throughput[mode]:>8,.0f} request/giây  ({throughput[mode] / throughput['off']:.0%} "
+              f"so với tắt log, {streams[mode].count(chr(10))} dòng log mỗi vòng)")
+
+    logger = logging.getLogger("bench")
+    stream, handler = configure("queue", 0)
+    disabled = per_call(lambda: logger.debug("Không ghi %s", 1), 200000)
+    enqueued = per_call(lambda: logger.info("Link thanh toán: %s", "https://pay.payos.vn/web/x",
+                                            extra={"order_code": 1}), 5000)
+    for _ in range(10000):
+        logger.warning("Cảnh báo lặp lại")
+    handler.flush()
+    warnings = stream.getvalue().count("Cảnh báo lặp lại")
+    print(f"logger.debug bị chặn:      {disabled * 1e9:6.0f} ns/lần")
+    print(f"logger.info vào bộ đệm:    {enqueued * 1e6:6.2f} µs/lần")
+    print(f"10000 cảnh báo giống nhau: ghi {warnings} dòng")
+
+    link_lines = [line for line in streams["queue"].splitlines() if "Link thanh toán" in line]
+    request_ids = {line.split("[", 1)[1].split("]", 1)[0] for line in link_lines}
+    print(f"Log tạo link: {len(link_lines)} dòng, {len(request_ids)} request_id khác nhau")
+
+    ok = (throughput["queue"] > throughput["sync"] and warnings <= 10
+          and len(link_lines) >= args.requests and len(request_ids) == len(link_lines))
+    print("✅ Log qua bộ đệm nhanh hơn ghi trực tiếp, cảnh báo lặp bị giới hạn, mỗi request một request_id" if ok
+          else "❌ Kết quả không như mong đợi")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+So sánh cách kiosk lấy sản phẩm của một máy lúc khởi động:
+
+1. n+1:     GET /api/slots?machine_id= rồi GET /api/products/{id} lần lượt cho từng slot (cách cũ)
+2. batched: GET /api/machines/{id}/products - server ghép sẵn slot + sản phẩm
+
+Mỗi request cộng thêm --rtt mili giây (giả lập độ trễ mạng kiosk -> server),
+vì N+1 tốn chủ yếu ở số vòng đi-về chứ không phải ở phía server.
+
+Chạy:
+    python benchmarks/bench_machine_products.py --slots 60 --rounds 50 --rtt 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.machine import Machine, Slot, machines
+from app.models.product import Product, catalog
+from main import app
+
+MACHINE_ID = "VM_BENCH"
+
+
+def seed_machine(slots: int) -> None:
+    machines.add_machine(Machine(id=MACHINE_ID, name="Máy thử tải"))
+    for i in range(slots):
+        catalog.add(Product(id=2000 + i, name=f"Sản phẩm {i}", price=10000, stock=100,
+                            description="Sản phẩm thử tải", category=f"Nhóm {i % 5}"))
+        machines.add_slot(Slot(id=2000 + i, machine_id=MACHINE_ID, slot_no=i + 1,
+                               product_id=2000 + i, quantity=5))
+
+
+async def load_n_plus_one(client: httpx.AsyncClient) -> tuple:
+    slots = (await client.get("/api/slots", params={"machine_id": MACHINE_ID})).json()["data"]
+    products = []
+    for slot in slots:
+        if slot["product_id"] and slot["quantity"] > 0:
+            product = (await client.get(f"/api/products/{slot['product_id']}")).json()
+            products.append({**product, "slot_no": slot["slot_no"], "slot_id": slot["id"],
+                             "stock": slot["quantity"]})
+    return products, 1 + len(slots)
+
+
+async def load_batched(client: httpx.AsyncClient) -> tuple:
+    data = (await client.get(f"/api/machines/{MACHINE_ID}/products")).json()["data"]
+    return data, 1
+
+
+async def measure(mode: str, rounds: int, rtt: float) -> dict:
+    async def add_rtt(request: httpx.Request):
+        await asyncio.sleep(rtt)
+
+    loader = load_n_plus_one if mode == "n+1" else load_batched
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 event_hooks={"request": [add_rtt]}) as client:
+        latencies, requests = [], 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            products, count = await loader(client)
+            latencies.append((time.perf_counter() - start) * 1000)
+            requests += count
+    key = lambda p: (p["slot_no"], p["id"], p["stock"])
+    return {
+        "avg_ms": sum(latencies) / rounds,
+        "requests": requests / rounds,
+        "products": sorted(map(key, products)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--rtt", type=float, default=20, help="Độ trễ mạng giả lập mỗi request (ms)")
+    args = parser.parse_args()
+
+    seed_machine(args.slots)
+    print(f"🧪 Kiosk tải sản phẩm của máy có {args.slots} slot ({args.rounds} lần, RTT {args.rtt:.0f} ms)")
+    print("=" * 60)
+    print(f"{'Cách':<10} {'request/lần':>12} {'thời gian/lần':>15}")
+    results = {}
+    for mode in ("n+1", "batched"):
+        r = results[mode] = asyncio.run(measure(mode, args.rounds, args.rtt / 1000))
+        print(f"{mode:<10} {r['requests']:>12.0f} {r['avg_ms']:>12.1f} ms")
+    print(f"Nhanh hơn: {results['n+1']['avg_ms'] / results['batched']['avg_ms']:.1f}x")
+
+    ok = results["n+1"]["products"] == results["batched"]["products"]
+    print("✅ Hai cách trả về cùng sản phẩm, slot và số lượng" if ok else "❌ Dữ liệu hai cách khác nhau")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
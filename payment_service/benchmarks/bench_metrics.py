@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Đo chi phí của lớp metrics (app/services/metrics.py) trên mỗi request.
+
+1. Histogram.observe: thời gian ghi một mẫu (bisect + tăng ô đếm)
+2. MetricsMiddleware: gọi một app ASGI rỗng trực tiếp vs qua middleware -> phần
+   chênh lệch là chi phí middleware cộng vào mỗi request
+3. Thao tác stock có đo (catalog.reserve_stock + release_reserved) vs hàm gốc chưa bọc
+4. GET /metrics: thời gian render toàn bộ số liệu sau khi chạy các route của main.app
+
+Chạy:
+    python benchmarks/bench_metrics.py --requests 200000 --max-overhead-us 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import catalog
+from app.services.metrics import MetricsMiddleware, MetricsRegistry
+from main import app
+
+
+class FakeRoute:
+    path = "/api/products/{product_id}"
+
+
+async def empty_app(scope, receive, send):
+    """App ASGI không làm gì ngoài trả 200 - để tách riêng chi phí middleware"""
+    scope["route"] = FakeRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def per_request(asgi, requests: int) -> float:
+    """Thời gian trung bình (giây) mỗi lần gọi app ASGI"""
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    best = float("inf")
+    for _ in range(3):  # Lấy lần nhanh nhất để bớt nhiễu
+        start = time.perf_counter()
+        for _ in range(requests):
+            await asgi({"type": "http", "method": "GET", "path": "/api/products/1"}, receive, send)
+        best = min(best, (time.perf_counter() - start) / requests)
+    return best
+
+
+def per_call(fn, calls: int) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+async def scrape(requests: int) -> tuple:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        for i in range(requests):
+            await http.get(f"/api/products/{1 + i % 8}")
+            await http.get("/api/products")
+        start = time.perf_counter()
+        response = await http.get("/metrics")
+        return time.perf_counter() - start, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000, help="Số lần gọi mỗi phép đo")
+    parser.add_argument("--max-overhead-us", type=float, default=5.0,
+                        help="Chi phí middleware tối đa cho phép mỗi request (µs)")
+    args = parser.parse_args()
+
+    print(f"🧪 Chi phí metrics: {args.requests:,} lần gọi mỗi phép đo")
+    print("=" * 60)
+
+    histogram = MetricsRegistry().histogram("bench_seconds", "bench").labels()
+    observe = per_call(lambda: histogram.observe(0.000123), args.requests)
+    print(f"Histogram.observe:            {observe * 1e9:8.0f} ns/mẫu")
+
+    plain = asyncio.run(per_request(empty_app, args.requests))
+    wrapped = asyncio.run(per_request(MetricsMiddleware(empty_app, MetricsRegistry()), args.requests))
+    overhead = wrapped - plain
+    print(f"App ASGI rỗng:                {plain * 1e6:8.2f} µs/request")
+    print(f"Qua MetricsMiddleware:        {wrapped * 1e6:8.2f} µs/request (+{overhead * 1e6:.2f} µs)")
+
+    product_id = catalog.list_available()[0].id
+    catalog.set_stock(product_id, 10**6)
+    timed = per_call(lambda: (catalog.reserve_stock(product_id), catalog.release_reserved(product_id)),
+                     args.requests // 2)
+    raw = per_call(lambda: (catalog.reserve_stock.__wrapped__(catalog, product_id),
+                            catalog.release_reserved.__wrapped__(catalog, product_id)), args.requests // 2)
+    print(f"Giữ chỗ + trả lại stock:      {raw * 1e6:8.2f} µs không đo, {timed * 1e6:.2f} µs có đo "
+          f"(+{(timed - raw) * 1e6 / 2:.2f} µs/thao tác)")
+
+    render, response = asyncio.run(scrape(1000))
+    series = sum(1 for line in response.text.splitlines() if line and not line.startswith("#"))
+    print(f"GET /metrics:                 {render * 1000:8.2f} ms, {series} dòng số liệu, "
+          f"{len(response.content) / 1024:.0f} KB")
+
+    routes = {line.split('route="')[1].split('"')[0] for line in response.text.splitlines()
+              if line.startswith("vending_http_request_seconds_count")}
+    ok = (overhead * 1e6 <= args.max_overhead_us and response.status_code == 200
+          and {"/api/products", "/api/products/{product_id}"} <= routes)
+    print(f"✅ Middleware tốn {overhead * 1e6:.2f} µs/request (ngưỡng {args.max_overhead_us} µs), "
+          f"/metrics có số liệu theo route template" if ok
+          else f"❌ Chi phí {overhead * 1e6:.2f} µs/request vượt ngưỡng hoặc /metrics thiếu số liệu")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
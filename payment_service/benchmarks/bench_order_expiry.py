@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Đo chi phí CPU của bộ hết hạn đơn chờ thanh toán (app/services/order_expiry.py)
+với --orders đơn PENDING cùng lúc, mỗi đơn giữ 1 sản phẩm:
+
+1. Hẹn hạn chót cho từng đơn (track)
+2. Mô phỏng từng tick tới khi mọi đơn quá hạn: một phần đơn được thanh toán giữa
+   chừng (bỏ hẹn), phần còn lại chuyển EXPIRED và trả hàng. Đo CPU mỗi tick của
+   timer wheel so với quét toàn bộ đơn đang chờ, kiểm tra kiosk nhận được trạng
+   thái EXPIRED qua pub/sub và stock khả dụng trở lại đúng số đơn hết hạn
+3. Huỷ link PayOS theo lô ở nền với PayOS giả lập (--links đơn có link thật)
+
+Thời gian ở phần 1-2 là thời gian giả lập, không phải chờ ORDER_EXPIRY_TTL thật.
+
+Chạy:
+    python benchmarks/bench_order_expiry.py --orders 100000 --paid 0.3 --links 500
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.order import OrderStatus, order_store
+from app.models.product import catalog
+from app.services.inventory import inventory
+from app.services.order_expiry import order_expiry
+from app.services.order_id import next_order_code
+from app.services.payos_client import AsyncPayOSClient
+from app.services.pubsub import order_topic, pubsub
+from fake_payos import FakeConfig, FakePayOS, create_app
+from main import app  # noqa: F401 - đăng ký listener đẩy trạng thái đơn tới kiosk (SSE)
+
+
+def create_orders(product_id: int, count: int) -> list:
+    """Tạo count đơn PENDING, mỗi đơn giữ 1 sản phẩm"""
+    codes = []
+    for _ in range(count):
+        order_code = next_order_code()
+        inventory.reserve(order_code, product_id)
+        order_store.create(order_code, "BENCH", product_id, 15000)
+        order_store.transition(order_code, OrderStatus.PENDING)
+        codes.append(order_code)
+    return codes
+
+
+async def bench_expiry(args, product_id: int) -> dict:
+    catalog.set_stock(product_id, args.orders)
+    codes = create_orders(product_id, args.orders)
+    batches = []
+
+    async def cancel_links(order_codes, reason):
+        batches.append(len(order_codes))
+        return len(order_codes)
+
+    order_expiry.cancel_links = cancel_links
+
+    # Đơn được tạo rải đều trong --spread giây
+    t0 = time.time()
+    step = args.spread / args.orders
+    start = time.process_time()
+    for i, order_code in enumerate(codes):
+        order_expiry.track(order_code, now=t0 + i * step)
+    track = (time.process_time() - start) / args.orders
+
+    paid = set(random.Random(1).sample(codes, int(args.orders * args.paid)))
+    for order_code in paid:
+        order_store.transition(order_code, OrderStatus.PAID)
+    watched = next(code for code in codes if code not in paid)
+
+    tick = order_expiry._wheel.tick
+    end = t0 + args.spread + order_expiry.ttl + 2 * tick
+    ticks, expired, tick_cpu, scan_cpu = 0, 0, [], []
+    with pubsub.subscribe(order_topic(watched)) as kiosk:
+        now = t0
+        while now <= end:
+            start = time.process_time()
+            expired += len(order_expiry.expire_due(now))
+            tick_cpu.append(time.process_time() - start)
+            if ticks % 50 == 0:
+                # Cách làm không có timer wheel: mỗi tick quét mọi đơn đang chờ
+                start = time.process_time()
+                [o for o in (order_store.get(c) for c in codes)
+                 if o.status == OrderStatus.PENDING and o.created_at + order_expiry.ttl <= now]
+                scan_cpu.append(time.process_time() - start)
+            ticks += 1
+            now += tick
+        await order_expiry.cancel_queue.join()
+        message = await kiosk.get(timeout=1)
+
+    return {
+        "track": track, "ticks": ticks, "expired": expired, "paid": len(paid),
+        "tick_total": sum(tick_cpu), "tick_max": max(tick_cpu), "idle_tick": min(tick_cpu),
+        "scan_tick": sum(scan_cpu) / len(scan_cpu), "batches": batches,
+        "available": catalog.available_stock(product_id), "pending": len(order_expiry),
+        "kiosk": message or "",
+        "end": end,
+    }
+
+
+async def bench_cancel(args, product_id: int, now: float) -> dict:
+    """Huỷ link PayOS của --links đơn hết hạn qua PayOS giả lập"""
+    fake = FakePayOS(FakeConfig(latency=0, latency_dist="fixed"), seed=1)
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    order_expiry.cancel_links = client.cancel_payment_links
+
+    catalog.set_stock(product_id, args.links)
+    codes = create_orders(product_id, args.links)
+    for order_code in codes:
+        await client.create_payment_link(order_code, 15000, f"DH{order_code}", [])
+        order_expiry.track(order_code, now=now)
+
+    start = time.perf_counter()
+    expired = order_expiry.expire_due(now + order_expiry.ttl + 2 * order_expiry._wheel.tick)
+    await order_expiry.cancel_queue.join()
+    seconds = time.perf_counter() - start
+    await client.aclose()
+    return {"expired": len(expired), "cancelled": fake.stats["cancelled"], "seconds": seconds}
+
+
+async def run(args) -> tuple:
+    product_id = catalog.list_available()[0].id
+    expiry = await bench_expiry(args, product_id)
+    cancel = await bench_cancel(args, product_id, expiry["end"])
+    await order_expiry.cancel_queue.stop()
+    return expiry, cancel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100000, help="Số đơn chờ thanh toán cùng lúc")
+    parser.add_argument("--paid", type=float, default=0.3, help="Tỉ lệ đơn được thanh toán trước khi hết hạn")
+    parser.add_argument("--spread", type=float, default=60, help="Các đơn được tạo rải đều trong bấy nhiêu giây")
+    parser.add_argument("--links", type=int, default=500, help="Số đơn có link PayOS thật để huỷ (phần 3)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # Bỏ log từng link / từng lô
+
+    print(f"🧪 Hết hạn đơn: {args.orders:,} đơn chờ thanh toán, {args.paid:.0%} được trả tiền, "
+          f"TTL {order_expiry.ttl}s, tick {order_expiry._wheel.tick}s")
+    print("=" * 60)
+    r, c = asyncio.run(run(args))
+    expected = args.orders - r["paid"]
+
+    print(f"Hẹn hạn chót:                 {r['track'] * 1e6:8.2f} µs CPU/đơn")
+    print(f"Tick không có đơn tới hạn:    {r['idle_tick'] * 1e6:8.2f} µs CPU")
+    print(f"Tick nặng nhất:               {r['tick_max'] * 1000:8.2f} ms CPU")
+    total = f"Tổng {r['ticks']} tick:"
+    print(f"{total:<30}{r['tick_total']:8.2f} s CPU "
+          f"({r['tick_total'] / max(r['expired'], 1) * 1e6:.1f} µs/đơn hết hạn)")
+    print(f"Quét toàn bộ đơn mỗi tick:    {r['scan_tick'] * 1000:8.2f} ms CPU/tick "
+          f"(x{r['ticks']} tick = {r['scan_tick'] * r['ticks']:.1f} s)")
+    print(f"Đơn hết hạn: {r['expired']:,}/{expected:,}, còn hẹn {r['pending']}, stock khả dụng {r['available']:,}, "
+          f"{len(r['batches'])} lô huỷ link (lớn nhất {max(r['batches'], default=0)} đơn)")
+    print(f"Kiosk nhận: {r['kiosk'][:100]}")
+    print(f"Huỷ link PayOS giả lập: {c['cancelled']}/{c['expired']} link trong {c['seconds']:.2f}s "
+          f"({c['cancelled'] / c['seconds']:,.0f} link/giây)")
+
+    ok = (r["expired"] == expected and r["pending"] == 0 and r["available"] == expected
+          and sum(r["batches"]) == expected and '"EXPIRED"' in r["kiosk"]
+          and c["cancelled"] == c["expired"] == args.links)
+    print("✅ Mọi đơn quá hạn đều hết hạn, trả hàng, báo kiosk và huỷ link; đơn đã trả tiền không bị động tới" if ok
+          else "❌ Kết quả hết hạn đơn không như mong đợi")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark + kiểm tra trùng lặp cho bộ sinh mã đơn hàng (app/services/order_id.py).
+
+1. Micro-benchmark: số mã/giây trên một thread.
+2. Nhiều thread dùng chung một bộ sinh: không được trùng, mã tăng dần trong từng thread.
+3. Nhiều tiến trình với node id khác nhau (giả lập nhiều worker/máy): không được trùng.
+
+Chạy:
+    python benchmarks/bench_order_id.py --threads 8 --processes 4 --count 200000
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.order_id import MAX_ORDER_CODE, OrderCodeGenerator, parse_order_code
+
+
+def bench_single_thread(count: int) -> float:
+    generator = OrderCodeGenerator(node_id=0)
+    next_code = generator.next_code
+    start = time.perf_counter()
+    for _ in range(count):
+        next_code()
+    return count / (time.perf_counter() - start)
+
+
+def check_threads(threads: int, count: int) -> tuple:
+    generator = OrderCodeGenerator(node_id=1)
+    results = [None] * threads
+
+    def worker(index):
+        next_code = generator.next_code
+        results[index] = [next_code() for _ in range(count)]
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    all_codes = [code for codes in results for code in codes]
+    duplicates = len(all_codes) - len(set(all_codes))
+    monotonic = all(codes == sorted(codes) for codes in results)
+    return duplicates, monotonic, len(all_codes) / elapsed, max(all_codes)
+
+
+def _process_worker(node_id: int, count: int, queue):
+    generator = OrderCodeGenerator(node_id=node_id)
+    queue.put([generator.next_code() for _ in range(count)])
+
+
+def check_processes(processes: int, count: int) -> tuple:
+    queue = multiprocessing.Queue()
+    pool = [
+        multiprocessing.Process(target=_process_worker, args=(node_id, count, queue))
+        for node_id in range(processes)
+    ]
+    for p in pool:
+        p.start()
+    all_codes = []
+    for _ in pool:
+        all_codes.extend(queue.get())
+    for p in pool:
+        p.join()
+    duplicates = len(all_codes) - len(set(all_codes))
+    nodes = {parse_order_code(code)["node_id"] for code in all_codes}
+    return duplicates, len(nodes), max(all_codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200000, help="Số mã mỗi thread/tiến trình")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    print("🧪 Bộ sinh mã đơn hàng")
+    print("=" * 60)
+
+    rate = bench_single_thread(args.count)
+    print(f"1 thread:          {rate:,.0f} mã/giây")
+
+    duplicates, monotonic, rate, max_code = check_threads(args.threads, args.count)
+    print(f"{args.threads} thread:          {rate:,.0f} mã/giây | trùng: {duplicates} | tăng dần: {monotonic}")
+    ok = duplicates == 0 and monotonic and max_code <= MAX_ORDER_CODE
+
+    duplicates, nodes, max_code = check_processes(args.processes, args.count)
+    print(f"{args.processes} tiến trình ({nodes} node): trùng: {duplicates}")
+    ok = ok and duplicates == 0 and max_code <= MAX_ORDER_CODE
+
+    print(f"Mã lớn nhất: {max_code} (giới hạn 2^53-1 = {MAX_ORDER_CODE})")
+    print("✅ Không có mã trùng" if ok else "❌ Phát hiện mã trùng hoặc vượt 53 bit")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark kho đơn hàng: tra cứu theo order_code, chuyển trạng thái và giới hạn bộ nhớ.
+
+- Tạo N đơn, đưa qua vòng đời CREATED -> PENDING -> PAID -> DISPENSED
+- Đo thời gian get() và GET /api/order-status/{code} (in-process, không gọi PayOS)
+- Kiểm tra số đơn trong RAM không vượt quá max_completed
+
+Chạy:
+    python benchmarks/bench_order_store.py --orders 200000 --max-completed 50000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.order import OrderArchive, OrderStatus, OrderStore
+from app.routers import payment as payment_router
+from main import app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--max-completed", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = OrderArchive(str(Path(tmp) / "orders.jsonl"))
+        store = OrderStore(archive=archive, max_completed=args.max_completed)
+
+        start = time.perf_counter()
+        for code in range(1, args.orders + 1):
+            store.create(code, "VM001", 1, 15000)
+            store.transition(code, OrderStatus.PENDING)
+            store.transition(code, OrderStatus.PAID)
+            store.transition(code, OrderStatus.DISPENSED)
+        lifecycle_us = (time.perf_counter() - start) / args.orders * 1e6
+
+        # Tra cứu các đơn còn trong RAM
+        codes = [random.randint(args.orders - args.max_completed + 1, args.orders) for _ in range(args.lookups)]
+        get = store.get
+        start = time.perf_counter()
+        for code in codes:
+            get(code)
+        get_us = (time.perf_counter() - start) / args.lookups * 1e6
+
+        archived_lines = sum(1 for _ in archive.path.open(encoding="utf-8"))
+
+        # Đo qua HTTP in-process
+        payment_router.order_store = store
+
+        async def http_lookups(n):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                start = time.perf_counter()
+                for code in codes[:n]:
+                    response = await client.get(f"/api/order-status/{code}")
+                    assert response.status_code == 200
+                return (time.perf_counter() - start) / n * 1e6
+
+        http_us = asyncio.run(http_lookups(2000))
+
+    print(f"🧪 Kho đơn hàng: {args.orders:,} đơn, giữ tối đa {args.max_completed:,} đơn đã kết thúc")
+    print("=" * 60)
+    print(f"Vòng đời (create + 3 transition): {lifecycle_us:.2f} µs/đơn")
+    print(f"OrderStore.get:                   {get_us:.3f} µs")
+    print(f"GET /api/order-status (ASGI):     {http_us:.1f} µs")
+    print(f"Đơn trong RAM: {len(store):,} | đã chuyển xuống lưu trữ: {archived_lines:,}")
+
+    ok = len(store) <= args.max_completed and len(store) + archived_lines == args.orders
+    print("✅ Bộ nhớ được giới hạn" if ok else "❌ Số đơn trong RAM vượt giới hạn")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark: độ trễ p99 của GET /api/products khi có 50 lời gọi create-payment đang chờ PayOS.
+
+PayOS được giả lập bằng transport trả về response có chữ ký hợp lệ sau một khoảng trễ.
+So sánh hai chế độ:
+  - async:    client PayOS bất đồng bộ (mặc định của server)
+  - blocking: client PayOS đồng bộ gọi thẳng trong handler (hành vi cũ)
+
+Chạy:
+    python benchmarks/bench_payment_concurrency.py --payos-latency 0.3 --inflight 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from payos import PayOS
+from payos._crypto import CryptoProvider
+
+from app.config import PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY
+from app.routers import payment as payment_router
+from app.services import payos_service
+from app.services.payos_client import AsyncPayOSClient
+import app.services.payos_client as payos_client_module
+from app.models.product import catalog
+from app.services.vietqr_gen import vietqr
+from main import app
+
+crypto = CryptoProvider()
+
+
+def fake_payos_body(request: httpx.Request) -> dict:
+    """Tạo response create-payment-link có chữ ký giống PayOS"""
+    payload = json.loads(request.content)
+    data = {
+        "bin": "970422",
+        "accountNumber": "0000000000",
+        "accountName": "DEMO",
+        "amount": payload["amount"],
+        "description": payload["description"],
+        "orderCode": payload["orderCode"],
+        "currency": "VND",
+        "paymentLinkId": f"fake-{payload['orderCode']}",
+        "status": "PENDING",
+        "expiredAt": None,
+        "checkoutUrl": f"https://pay.payos.vn/web/fake-{payload['orderCode']}",
+        "qrCode": "000201010212",
+    }
+    return {
+        "code": "00",
+        "desc": "success",
+        "data": data,
+        "signature": crypto.create_signature_from_object(data, PAYOS_CHECKSUM_KEY),
+    }
+
+
+def install_async_fake(latency: float):
+    """Gắn transport async giả lập vào client PayOS dùng chung"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=fake_payos_body(request))
+
+    client = AsyncPayOSClient(transport=httpx.MockTransport(handler))
+    payos_client_module.payos_client = client
+    payment_router.create_payment_link_async = client.create_payment_link
+    return client
+
+
+def install_blocking_fake(latency: float):
+    """Thay bằng client PayOS đồng bộ (chặn event loop) để so sánh"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return httpx.Response(200, json=fake_payos_body(request))
+
+    payos_service.payos = PayOS(
+        client_id=PAYOS_CLIENT_ID,
+        api_key=PAYOS_API_KEY,
+        checksum_key=PAYOS_CHECKSUM_KEY,
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+
+    async def blocking_create(order_code, amount, description, items):
+        return payos_service.create_payment_link(order_code, amount, description, items)
+
+    payment_router.create_payment_link_async = blocking_create
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def run(mode: str, inflight: int, latency: float, samples: int) -> dict:
+    # Đủ hàng cho mọi đơn (mỗi đơn giữ chỗ 1 sản phẩm), luôn đi qua PayOS thay vì VietQR tại server
+    catalog.set_stock(1, 10**6)
+    vietqr.account_no = None
+    if mode == "async":
+        client = install_async_fake(latency)
+    else:
+        client = None
+        install_blocking_fake(latency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        payload = {"machine_id": "VM001", "product_id": 1, "amount": 15000}
+        payments = [
+            asyncio.create_task(http.post("/api/create-payment", json=payload))
+            for _ in range(inflight)
+        ]
+
+        # Gửi /api/products theo lịch cố định và đo từ thời điểm dự kiến gửi,
+        # để thời gian event loop bị chặn cũng được tính vào độ trễ
+        interval = latency / 10
+        latencies = []
+        t0 = time.perf_counter()
+        for i in range(samples):
+            scheduled = t0 + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            response = await http.get("/api/products")
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+            assert response.status_code == 200
+
+        results = await asyncio.gather(*payments)
+        ok = sum(1 for r in results if r.status_code == 200)
+
+    if client is not None:
+        await client.aclose()
+
+    return {
+        "mode": mode,
+        "payments_ok": ok,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inflight", type=int, default=50, help="Số create-payment đồng thời")
+    parser.add_argument("--payos-latency", type=float, default=0.2, help="Độ trễ PayOS giả lập (giây)")
+    parser.add_argument("--samples", type=int, default=200, help="Số request /api/products để đo")
+    parser.add_argument("--mode", choices=["async", "blocking", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["async", "blocking"] if args.mode == "both" else [args.mode]
+    print(f"🧪 {args.inflight} create-payment đang chờ PayOS ({args.payos_latency * 1000:.0f} ms/lời gọi)")
+    print("=" * 60)
+    for mode in modes:
+        r = asyncio.run(run(mode, args.inflight, args.payos_latency, args.samples))
+        print(f"{r['mode']:>9}: /api/products p50={r['p50_ms']:.2f} ms  p99={r['p99_ms']:.2f} ms  "
+              f"max={r['max_ms']:.2f} ms  (thanh toán OK: {r['payments_ok']}/{args.inflight})")
+
+
+if __name__ == "__main__":
+    main()
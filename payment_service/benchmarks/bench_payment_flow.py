@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Chạy trọn luồng thanh toán không cần PayOS thật: tạo đơn -> PayOS giả lập trả link
+-> khách thanh toán -> webhook có chữ ký -> đơn PAID -> máy xác nhận xuất hàng.
+
+Service (main.app) và PayOS giả lập (fake_payos.py) cùng chạy trong process,
+nối với nhau qua httpx.ASGITransport. Đo độ trễ create-payment, thời gian từ
+lúc tạo đơn tới khi kiosk thấy PAID, và kiểm tra stock bị trừ đúng số đơn.
+
+Chạy:
+    python benchmarks/bench_payment_flow.py --orders 200 --concurrency 20 --payos-latency 0.1 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import catalog
+from app.routers import payment as payment_router
+from app.services.payos_client import AsyncPayOSClient
+from app.services.vietqr_gen import vietqr
+from fake_payos import FakeConfig, FakePayOS, create_app
+from main import app
+
+PRODUCT_ID = 1
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def purchase(http: httpx.AsyncClient, index: int, timeout: float, stats: dict) -> None:
+    """Một lượt mua như kiosk + máy: tạo đơn, chờ PAID, xác nhận xuất hàng"""
+    machine_id = f"VM{index % 50:03d}"
+    start = time.perf_counter()
+    response = await http.post("/api/create-payment", json={
+        "machine_id": machine_id, "product_id": PRODUCT_ID, "amount": 15000, "session_id": f"flow-{index}",
+    })
+    stats["create"].append(time.perf_counter() - start)
+    if response.status_code != 200:
+        stats["create_failed"] += 1
+        return
+    order_code = response.json()["order_code"]
+
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        status = (await http.get(f"/api/order-status/{order_code}")).json()["status"]
+        if status == "PAID":
+            stats["paid"].append(time.perf_counter() - start)
+            break
+        await asyncio.sleep(0.05)
+    else:
+        stats["not_paid"] += 1
+        return
+
+    response = await http.post("/api/dispense-complete", json={"order_code": order_code, "machine_id": machine_id},
+                               headers={"Idempotency-Key": f"dispense-{order_code}"})
+    stats["dispensed"] += response.status_code == 200
+
+
+async def run(args) -> dict:
+    service = httpx.ASGITransport(app=app)
+    fake = FakePayOS(FakeConfig(latency=args.payos_latency, error_rate=args.error_rate, auto_pay=1.0,
+                                pay_delay=args.pay_delay, webhook_url="http://service/api/payos-webhook"),
+                     seed=1, webhook_transport=service)
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    payment_router.create_payment_link_async = client.create_payment_link
+
+    stats = {"create": [], "paid": [], "create_failed": 0, "not_paid": 0, "dispensed": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index):
+        async with semaphore:
+            await purchase(http, index, args.pay_delay + 10, stats)
+
+    async with httpx.AsyncClient(transport=service, base_url="http://service") as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.orders)))
+        stats["elapsed"] = time.perf_counter() - start
+    await client.aclose()
+    await fake.aclose()
+    stats["fake"] = fake.stats
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="Số kiosk mua cùng lúc")
+    parser.add_argument("--payos-latency", type=float, default=0.1, help="Độ trễ trung vị của PayOS giả lập (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Tỉ lệ lời gọi PayOS trả 503")
+    parser.add_argument("--pay-delay", type=float, default=0.5, help="Khách thanh toán sau bao nhiêu giây")
+    args = parser.parse_args()
+
+    vietqr.account_no = None  # Kiosk chờ link PayOS (đi qua PayOS giả lập)
+    catalog.set_stock(PRODUCT_ID, args.orders)
+    stock_before = catalog.get(PRODUCT_ID).stock
+
+    print(f"🧪 Luồng thanh toán với PayOS giả lập: {args.orders} đơn, {args.concurrency} kiosk đồng thời, "
+          f"PayOS {args.payos_latency * 1000:.0f} ms, lỗi {args.error_rate:.0%}")
+    print("=" * 60)
+    r = asyncio.run(run(args))
+    sold = stock_before - catalog.get(PRODUCT_ID).stock
+    fake = r["fake"]
+
+    print(f"Thời gian chạy:        {r['elapsed']:.1f}s ({args.orders / r['elapsed']:.0f} đơn/giây)")
+    if r["create"]:
+        print(f"create-payment:        p50 {percentile(r['create'], 50) * 1000:.1f} ms, "
+              f"p99 {percentile(r['create'], 99) * 1000:.1f} ms, lỗi {r['create_failed']}")
+    if r["paid"]:
+        print(f"Tạo đơn -> PAID:       p50 {percentile(r['paid'], 50) * 1000:.1f} ms, "
+              f"p99 {percentile(r['paid'], 99) * 1000:.1f} ms, chưa PAID {r['not_paid']}")
+    print(f"PayOS giả lập:         {fake['requests']} request, {fake['created']} link, lỗi 503 {fake['errors_503']}, "
+          f"webhook {fake['webhooks_sent']} (lỗi {fake['webhooks_failed']})")
+    print(f"Xuất hàng:             {r['dispensed']} đơn, stock bị trừ {sold}")
+
+    ok = r["dispensed"] == sold == len(r["paid"]) and r["dispensed"] > 0 and r["not_paid"] == 0
+    print("✅ Mọi đơn đã thanh toán đều được xuất hàng và trừ stock đúng một lần" if ok
+          else "❌ Số đơn PAID / xuất hàng / stock không khớp")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
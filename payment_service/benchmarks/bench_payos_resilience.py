@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra lớp chống chịu lỗi quanh PayOS (thử lại, hedging, circuit breaker).
+
+PayOS giả lập (fake_payos.py) chạy ngay trong process qua httpx.ASGITransport,
+thêm độ trễ, đuôi độ trễ (một phần nhỏ lời gọi rất chậm), tỉ lệ lỗi 503 hoặc
+treo hẳn. Ba kịch bản:
+
+1. Đuôi độ trễ: --tail-ratio lời gọi chậm --tail-latency giây -> so sánh p99 khi tắt / bật hedging
+2. Lỗi tạm thời: --error-rate lời gọi trả 503 -> tỉ lệ tạo link thành công khi không / có thử lại
+3. PayOS treo: mọi lời gọi quá timeout -> sau khi circuit breaker mở, lời gọi bị từ chối ngay
+
+Chạy:
+    python benchmarks/bench_payos_resilience.py --calls 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.services.order_id import next_order_code
+from app.services.payos_client import AsyncPayOSClient
+from app.services.resilience import CircuitBreaker
+from fake_payos import FakeConfig, FakePayOS, create_app
+
+
+def fake_payos(latency=0.05, tail_ratio=0.0, tail_latency=0.0, error_rate=0.0, hang=False) -> FakePayOS:
+    if hang:
+        tail_ratio, tail_latency = 1.0, 3600
+    config = FakeConfig(latency=latency, latency_dist="uniform", latency_sigma=0.2,
+                        tail_ratio=tail_ratio, tail_latency=tail_latency, error_rate=error_rate)
+    return FakePayOS(config, seed=1)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def drive(fake: FakePayOS, calls: int, concurrency: int, configure) -> dict:
+    """Gọi create_payment_link calls lần với concurrency lời gọi đồng thời"""
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    configure(client.create_endpoint)
+    latencies, ok, fast_fail = [], 0, 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal ok, fast_fail
+        async with semaphore:
+            start = time.perf_counter()
+            result = await client.create_payment_link(next_order_code(), 15000, "BENCH", [])
+            latencies.append(time.perf_counter() - start)
+            ok += result["success"]
+            fast_fail += "retry_after" in result
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    await client.aclose()
+    endpoint = client.create_endpoint
+    return {
+        "ok": ok,
+        "fast_fail": fast_fail,
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "payos_requests": fake.stats["requests"],
+        "retried": endpoint.retried,
+        "hedged": endpoint.hedged,
+        "hedge_wins": endpoint.hedge_wins,
+        "breaker_opened": endpoint.breaker.times_opened,
+    }
+
+
+def report(label: str, r: dict, calls: int) -> None:
+    print(f"  {label:<16} OK {r['ok']:>4}/{calls:<4} p50 {r['p50']:>8.1f} ms  p99 {r['p99']:>8.1f} ms  "
+          f"request PayOS {r['payos_requests']:>4}  thử lại {r['retried']:>3}  hedge {r['hedged']:>3} "
+          f"(thắng {r['hedge_wins']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500, help="Số lời gọi tạo link mỗi kịch bản")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--payos-latency", type=float, default=0.05, help="Độ trễ thường của PayOS (giây)")
+    parser.add_argument("--tail-ratio", type=float, default=0.02)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--deadline", type=float, default=1.5, help="Tổng thời gian tối đa mỗi lời gọi khi PayOS treo")
+    args = parser.parse_args()
+
+    print(f"🧪 Chống chịu lỗi PayOS: {args.calls} lời gọi / kịch bản, {args.concurrency} đồng thời")
+    print("=" * 60)
+    checks = []
+
+    def no_retry(endpoint):
+        endpoint.retries = 0
+
+    def hedge(endpoint):
+        endpoint.retries = 0
+        endpoint.hedge = True
+
+    print(f"1. Đuôi độ trễ: {args.tail_ratio:.0%} lời gọi chậm {args.tail_latency:.1f}s")
+    base = asyncio.run(drive(fake_payos(args.payos_latency, args.tail_ratio, args.tail_latency),
+                             args.calls, args.concurrency, no_retry))
+    hedged = asyncio.run(drive(fake_payos(args.payos_latency, args.tail_ratio, args.tail_latency),
+                               args.calls, args.concurrency, hedge))
+    report("không hedge", base, args.calls)
+    report("hedge sau p95", hedged, args.calls)
+    checks.append(hedged["ok"] == args.calls and hedged["p99"] < base["p99"] / 2)
+
+    print(f"2. Lỗi tạm thời: {args.error_rate:.0%} lời gọi trả 503")
+    # Tắt breaker ở kịch bản này để đo riêng tác dụng của thử lại
+    def errors(retries):
+        def configure(endpoint):
+            endpoint.retries = retries
+            endpoint.breaker = CircuitBreaker("bench", failure_rate=2)
+        return configure
+    plain = asyncio.run(drive(fake_payos(args.payos_latency, error_rate=args.error_rate),
+                              args.calls, args.concurrency, errors(0)))
+    retried = asyncio.run(drive(fake_payos(args.payos_latency, error_rate=args.error_rate),
+                                args.calls, args.concurrency, errors(2)))
+    report("không thử lại", plain, args.calls)
+    report("thử lại 2 lần", retried, args.calls)
+    checks.append(retried["ok"] > plain["ok"])
+
+    print(f"3. PayOS treo: mỗi lời gọi tối đa {args.deadline:.1f}s")
+    def outage(endpoint):
+        endpoint.deadline = args.deadline
+    down = asyncio.run(drive(fake_payos(hang=True), args.calls, args.concurrency, outage))
+    print(f"  request PayOS {down['payos_requests']}, bị từ chối ngay {down['fast_fail']}/{args.calls}, "
+          f"p50 {down['p50']:.1f} ms, p99 {down['p99']:.1f} ms, breaker mở {down['breaker_opened']} lần")
+    checks.append(down["breaker_opened"] >= 1 and down["fast_fail"] > args.calls // 2)
+
+    print("✅ Hedging giảm p99, thử lại tăng tỉ lệ thành công, breaker trả lỗi ngay khi PayOS treo" if all(checks)
+          else f"❌ Kết quả không như mong đợi: {json.dumps(checks)}")
+    sys.exit(0 if all(checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Mô phỏng cả đội kiosk polling GET /api/products và so sánh 3 cách:
+
+1. full:        tải lại toàn bộ danh sách mỗi lần (cách cũ)
+2. conditional: gửi If-None-Match, nhận 304 khi catalog chưa đổi
+3. delta:       If-None-Match + ?since=<version>, chỉ nhận sản phẩm đã thay đổi
+
+Trong lúc polling, cứ mỗi --write-every request lại có một lần mua hàng làm đổi stock.
+
+Chạy:
+    python benchmarks/bench_product_polling.py --requests 5000 --products 500
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import Product, catalog
+from main import app
+
+
+def seed_catalog(products: int) -> None:
+    for i in range(1000, 1000 + products):
+        catalog.add(Product(id=i, name=f"Sản phẩm {i}", price=10000, stock=10**6,
+                            description="Sản phẩm thử tải", category=f"Nhóm {i % 10}"))
+
+
+async def poll(mode: str, requests: int, kiosks: int, write_every: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        state = [{"etag": None, "version": None} for _ in range(kiosks)]
+        statuses = {200: 0, 304: 0}
+        body_bytes = 0
+
+        start = time.perf_counter()
+        for i in range(requests):
+            if write_every and i % write_every == 0:
+                catalog.decrement_stock(1000 + i % 100)
+            kiosk = state[i % kiosks]
+            headers, params = {}, {}
+            if mode != "full" and kiosk["etag"]:
+                headers["If-None-Match"] = kiosk["etag"]
+            if mode == "delta" and kiosk["version"] is not None:
+                params["since"] = kiosk["version"]
+            response = await client.get("/api/products", headers=headers, params=params)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            body_bytes += len(response.content)
+            if response.status_code == 200:
+                kiosk["etag"] = response.headers["ETag"]
+                kiosk["version"] = response.json()["version"]
+        seconds = time.perf_counter() - start
+
+    return {
+        "rate": requests / seconds,
+        "ok": statuses.get(200, 0),
+        "not_modified": statuses.get(304, 0),
+        "kb_per_request": body_bytes / requests / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--kiosks", type=int, default=100)
+    parser.add_argument("--write-every", type=int, default=1000, help="Số request giữa hai lần đổi stock")
+    args = parser.parse_args()
+
+    seed_catalog(args.products)
+    print(f"🧪 {args.kiosks} kiosk polling {args.requests:,} lần, catalog {len(catalog):,} sản phẩm")
+    print("=" * 60)
+    print(f"{'Cách':<12} {'request/giây':>14} {'200':>7} {'304':>7} {'KB/request':>11}")
+    for mode in ("full", "conditional", "delta"):
+        r = asyncio.run(poll(mode, args.requests, args.kiosks, args.write_every))
+        print(f"{mode:<12} {r['rate']:>14,.0f} {r['ok']:>7,} {r['not_modified']:>7,} {r['kb_per_request']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra profiler lấy mẫu stack (GET /api/admin/profile) trên main.app chạy trong process.
+
+1. Không có X-Admin-Token đúng -> 401
+2. Tải create-payment (PayOS giả lập) + GET /api/products, đo request/giây khi
+   không profile và khi đang profile với route=/api/create-payment
+3. Kết quả profile: có mẫu của start_payment (chạy trong task riêng của SingleFlightCache,
+   không nằm trên stack của endpoint), không có stack nào của GET /api/products;
+   hết thời gian profile không còn timer / thread lấy mẫu nào (chi phí khi rảnh = 0)
+
+Chạy:
+    python benchmarks/bench_profiler.py --seconds 3 --interval 0.005
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+os.environ.setdefault("ADMIN_TOKEN", "bench-admin-token")
+
+import httpx
+
+from app.models.product import catalog
+from app.routers import payment as payment_router
+from app.services.payos_client import AsyncPayOSClient
+from app.services.vietqr_gen import vietqr
+from fake_payos import FakeConfig, FakePayOS, create_app
+from main import app
+
+ADMIN = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
+
+
+async def load(http: httpx.AsyncClient, seconds: float) -> int:
+    """Gửi xen kẽ create-payment và GET /api/products trong seconds giây, trả về số request"""
+    product_id = catalog.list_available()[0].id
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        await http.post("/api/create-payment", json={
+            "machine_id": "BENCH", "product_id": product_id, "amount": 15000,
+        }, headers={"Idempotency-Key": uuid.uuid4().hex})
+        await http.get("/api/products")
+        done += 2
+    return done
+
+
+async def run(args) -> dict:
+    fake = FakePayOS(FakeConfig(latency=0, latency_dist="fixed"), seed=1)
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    payment_router.create_payment_link_async = client.create_payment_link
+    vietqr.account_no = None
+    catalog.set_stock(catalog.list_available()[0].id, 10**7)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=args.seconds + 30) as http:
+        unauthorized = (await http.get("/api/admin/profile", params={"seconds": 0.1})).status_code
+        await load(http, 0.5)  # Khởi động
+
+        idle = await load(http, args.seconds) / args.seconds
+        profile = asyncio.ensure_future(http.get("/api/admin/profile", headers=ADMIN, params={
+            "seconds": args.seconds, "interval": args.interval, "route": "/api/create-payment", "format": "json",
+        }))
+        await asyncio.sleep(0.05)
+        profiled = await load(http, args.seconds) / args.seconds
+        response = await profile
+    await client.aclose()
+    return {"unauthorized": unauthorized, "idle": idle, "profiled": profiled, "response": response}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0, help="Thời gian profile / đo tải")
+    parser.add_argument("--interval", type=float, default=0.005, help="Chu kỳ lấy mẫu stack (giây)")
+    args = parser.parse_args()
+
+    print(f"🧪 Profiler lấy mẫu: {args.seconds:.0f}s, mỗi {args.interval * 1000:.0f} ms một mẫu, "
+          f"lọc route /api/create-payment")
+    print("=" * 60)
+    r = asyncio.run(run(args))
+    body = r["response"].json()
+    stacks = [line for line in body["collapsed"].splitlines() if line]
+
+    print(f"Không có token:               HTTP {r['unauthorized']}")
+    print(f"Request/giây khi không profile: {r['idle']:,.0f}")
+    print(f"Request/giây khi đang profile:  {r['profiled']:,.0f} ({(1 - r['profiled'] / r['idle']):+.1%} chậm hơn)")
+    print(f"Mẫu ({body['mode']}): {body['samples']} lần lấy mẫu, {body['matched']} mẫu trong create-payment, {len(stacks)} stack khác nhau")
+    for item in body["top"][:5]:
+        print(f"  {item['samples']:>5}  {item['function']}")
+
+    sampler_alive = (any(t.name == "sampling-profiler" for t in threading.enumerate())
+                     or signal.getitimer(signal.ITIMER_PROF) != (0.0, 0.0)
+                     or signal.getsignal(signal.SIGPROF) not in (signal.SIG_DFL, None))
+    ok = (r["unauthorized"] == 401 and body["matched"] > 0 and not sampler_alive
+          and any("start_payment" in line for line in stacks)
+          and not any("get_products (" in line for line in stacks))
+    print("✅ Profile chỉ chứa stack của create-payment (kể cả task con), không còn timer / thread lấy mẫu sau khi xong" if ok
+          else "❌ Kết quả profile không như mong đợi")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
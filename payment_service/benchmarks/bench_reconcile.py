@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Đối soát đơn kẹt với PayOS giả lập (app/services/reconciler.py).
+
+Tạo --orders đơn có link thanh toán, rồi trên PayOS giả lập: một phần được trả
+tiền nhưng webhook bị mất, một phần trả thiếu tiền, một phần bị huỷ, một phần
+hết hạn, còn lại vẫn chờ.
+
+1. Lần đối soát đầu: mọi đơn đã cũ được hỏi PayOS - đếm số đơn sửa được theo
+   từng trạng thái (đơn trả thiếu không được chuyển PAID), thời gian chạy; kiểm tra không vượt --rate lời gọi/giây
+   (PayOS giả lập cũng giới hạn đúng mức đó: vượt là 429) và --concurrency lời gọi đồng thời
+2. Tạo thêm --new-orders đơn rồi chạy lại: chỉ đơn mới được hỏi (con trỏ, không quét lại)
+3. Khách trả tiền cho vài đơn còn chờ (webhook lại mất), chờ tới lượt hỏi lại:
+   các đơn này chuyển PAID
+4. Qua hạn chót của đơn (ORDER_EXPIRY_TTL): đơn còn chờ được hỏi lần cuối rồi giao
+   cho hẹn giờ hết hạn - danh sách hỏi lại về rỗng, lần sau không hỏi PayOS nữa
+
+Chạy:
+    python benchmarks/bench_reconcile.py --orders 1000 --rate 200 --concurrency 8 --latency 0.02
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.order import OrderStatus, order_store
+from app.models.product import catalog
+from app.services.inventory import inventory
+from app.services.order_id import next_order_code
+from app.services.payos_client import AsyncPayOSClient
+from app.services.reconciler import PaymentReconciler
+from fake_payos import FakeConfig, FakePayOS, create_app
+
+
+def lost_webhook(request: httpx.Request) -> httpx.Response:
+    """Webhook PayOS gửi đi thành công nhưng không bao giờ tới service (proxy nuốt mất, service đang khởi động lại...)"""
+    return httpx.Response(200)
+
+
+async def create_orders(client: AsyncPayOSClient, product_id: int, count: int) -> list:
+    """Tạo count đơn PENDING có link trên PayOS giả lập, mỗi đơn giữ 1 sản phẩm"""
+    codes = []
+    for _ in range(count):
+        order_code = next_order_code()
+        inventory.reserve(order_code, product_id)
+        order_store.create(order_code, "BENCH", product_id, 15000)
+        result = await client.create_payment_link(order_code, 15000, f"DH{order_code}", [])
+        order_store.transition(order_code, OrderStatus.PENDING, checkout_url=result["checkout_url"])
+        codes.append(order_code)
+    return codes
+
+
+async def run(args) -> dict:
+    fake = FakePayOS(FakeConfig(latency=0, latency_dist="fixed"), seed=1,
+                     webhook_transport=httpx.MockTransport(lost_webhook))
+    client = AsyncPayOSClient(max_concurrency=64, transport=httpx.ASGITransport(app=create_app(fake)))
+    product_id = catalog.list_available()[0].id
+    catalog.set_stock(product_id, args.orders + args.new_orders)
+
+    in_flight = peak = 0
+
+    async def get_link(order_code):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await client.get_payment_link(order_code)
+        finally:
+            in_flight -= 1
+
+    codes = await create_orders(client, product_id, args.orders)
+    rng = random.Random(1)
+    rng.shuffle(codes)
+    n_paid, n_cancelled, n_expired = int(args.orders * 0.2), int(args.orders * 0.1), int(args.orders * 0.05)
+    for order_code in codes[:n_paid]:
+        await fake.pay(order_code)
+    for order_code in codes[n_paid:n_paid + n_cancelled]:
+        fake.cancel(fake.links[order_code], "Khách huỷ trên trang thanh toán")
+    for order_code in codes[n_paid + n_cancelled:n_paid + n_cancelled + n_expired]:
+        fake.links[order_code]["status"] = "EXPIRED"
+    n_closed = n_paid + n_cancelled + n_expired
+    n_underpaid = int(args.orders * 0.02)
+    for order_code in codes[n_closed:n_closed + n_underpaid]:
+        # PayOS báo PAID nhưng số tiền nhận được nhỏ hơn giá trị đơn
+        fake.links[order_code].update(status="PAID", amount=1000)
+    pending = codes[n_closed + n_underpaid:]
+
+    # Đối soát chạy khi các đơn đã cũ hơn stale_after; PayOS giả lập chậm và giới hạn tốc độ như thật
+    fake.config.latency = args.latency
+    fake.config.rate_limit = args.rate
+    fake._tokens = 1.0  # Bằng token ban đầu của token bucket bên đối soát
+    fake._refilled = time.monotonic()
+    reconciler = PaymentReconciler(get_link=get_link, stale_after=60, lookback=60, batch_size=args.batch,
+                                   concurrency=args.concurrency, rate=args.rate, burst=1)
+    first = await reconciler.run_once(time.time() + reconciler.stale_after + 1)
+
+    fake.config.rate_limit = 0
+    await create_orders(client, product_id, args.new_orders)
+    fake.config.rate_limit = args.rate
+    second = await reconciler.run_once(time.time() + reconciler.stale_after + 1)
+
+    late = pending[:args.late_paid]
+    for order_code in late:
+        await fake.pay(order_code)
+    third = await reconciler.run_once(time.time() + 2 * reconciler.stale_after + 2)
+    past_deadline = time.time() + reconciler.expiry.ttl + 3 * reconciler.stale_after + 3
+    fourth = await reconciler.run_once(past_deadline)
+    fifth = await reconciler.run_once(past_deadline + reconciler.stale_after + 1)
+    await client.aclose()
+
+    statuses = [order_store.get(code).status for code in codes]
+    return {
+        "first": first, "second": second, "third": third, "fourth": fourth, "fifth": fifth, "peak": peak,
+        "recheck_left": reconciler.pending_recheck,
+        "expected": {"paid": n_paid, "cancelled": n_cancelled, "expired": n_expired, "underpaid": n_underpaid,
+                     "pending": len(pending)},
+        "paid_orders": statuses.count(OrderStatus.PAID),
+        "available": catalog.available_stock(product_id),
+        "rate_limited": fake.stats["rate_limited"],
+        "webhooks_lost": fake.stats["webhooks_sent"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000, help="Số đơn chờ thanh toán đã cũ")
+    parser.add_argument("--new-orders", type=int, default=100, help="Số đơn tạo thêm trước lần đối soát thứ hai")
+    parser.add_argument("--late-paid", type=int, default=20, help="Số đơn còn chờ được trả tiền trước lần thứ ba")
+    parser.add_argument("--rate", type=float, default=200, help="Lời gọi PayOS/giây tối đa")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số lời gọi PayOS đồng thời tối đa")
+    parser.add_argument("--batch", type=int, default=100, help="Số đơn mỗi lô")
+    parser.add_argument("--latency", type=float, default=0.02, help="Độ trễ mỗi lời gọi PayOS giả lập (giây)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # Bỏ log từng link / từng đơn
+    logging.getLogger("app.services.reconciler").setLevel(logging.ERROR)  # Bỏ cảnh báo từng đơn trả thiếu
+
+    print(f"🧪 Đối soát PayOS: {args.orders:,} đơn cũ, tối đa {args.rate:.0f} lời gọi/giây, "
+          f"{args.concurrency} đồng thời, PayOS trễ {args.latency * 1000:.0f} ms")
+    print("=" * 60)
+    r = asyncio.run(run(args))
+    first, second, third, expected = r["first"], r["second"], r["third"], r["expected"]
+    fourth, fifth = r["fourth"], r["fifth"]
+
+    print(f"Lần 1: hỏi {first.checked:,} đơn trong {first.seconds:.2f}s ({first.checked / first.seconds:,.0f} lời gọi/giây), "
+          f"sửa {first.fixed:,}: PAID {first.paid}, CANCELLED {first.cancelled}, EXPIRED {first.expired}; "
+          f"{first.pending} còn chờ, {first.underpaid} trả thiếu, {first.errors} lỗi")
+    print(f"       webhook bị mất {r['webhooks_lost']}, đồng thời cao nhất {r['peak']}, PayOS trả 429: {r['rate_limited']}")
+    print(f"Lần 2: +{args.new_orders} đơn mới -> hỏi {second.checked} đơn trong {second.seconds:.2f}s")
+    print(f"Lần 3: hỏi lại {third.checked} đơn còn chờ / trả thiếu, sửa {third.fixed} (PAID {third.paid}) "
+          f"trong {third.seconds:.2f}s")
+    print(f"Quá hạn chót: hỏi lần cuối {fourth.checked} đơn, còn {r['recheck_left']} đơn chờ hỏi lại, "
+          f"lần sau hỏi {fifth.checked} đơn")
+    print(f"Đơn PAID: {r['paid_orders']}, stock khả dụng sau khi trả hàng: {r['available']:,}")
+
+    max_rate = args.rate * 1.1 + args.concurrency / first.seconds
+    ok = (first.paid == expected["paid"] and first.cancelled == expected["cancelled"]
+          and first.expired == expected["expired"] and first.pending == expected["pending"]
+          and first.underpaid == third.underpaid == expected["underpaid"]
+          and first.errors == 0 and r["rate_limited"] == 0 and r["peak"] <= args.concurrency
+          and first.checked / first.seconds <= max_rate
+          and second.checked == args.new_orders
+          and third.paid == args.late_paid
+          and third.checked == expected["pending"] + expected["underpaid"] + args.new_orders
+          and fourth.checked == third.checked - args.late_paid
+          and r["recheck_left"] == 0 and fifth.checked == 0
+          and r["paid_orders"] == expected["paid"] + args.late_paid
+          and r["available"] == expected["cancelled"] + expected["expired"])
+    print("✅ Mọi đơn kẹt được sửa theo PayOS, không vượt giới hạn tốc độ / đồng thời, lần sau chỉ hỏi đơn mới" if ok
+          else "❌ Kết quả đối soát không như mong đợi")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
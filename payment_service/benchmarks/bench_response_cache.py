@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+So sánh request/giây của GET /api/products và GET /api/products/{id} khi bật và
+tắt cache response đã serialize sẵn (kèm gzip/brotli), rồi kiểm tra cache được
+làm mới đúng sau khi stock thay đổi.
+
+Tắt cache = đường cũ: dựng Pydantic model, FastAPI validate response_model và
+encode JSON cho mỗi request (không nén). Request được gọi thẳng vào ASGI app để
+số đo là chi phí phía server, không lẫn chi phí của HTTP client.
+
+Chạy:
+    python benchmarks/bench_response_cache.py --requests 3000 --products 200
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import Product, catalog, decrease_product_stock, get_all_products
+from app.routers import products as products_router
+from app.services.response_cache import COMPRESSORS
+from main import app
+
+
+def seed_catalog(products: int) -> None:
+    for i in range(1000, 1000 + products):
+        catalog.add(Product(id=i, name=f"Sản phẩm {i}", price=10000, stock=10**6,
+                            image_url=f"/images/{i}.jpg", description="Sản phẩm thử tải",
+                            category=f"Nhóm {i % 10}"))
+
+
+def set_cache(enabled: bool) -> None:
+    products_router.list_cache.enabled = enabled
+    products_router.detail_cache.enabled = enabled
+    products_router.list_cache.clear()
+    products_router.detail_cache.clear()
+
+
+async def asgi_get(path: str, headers: dict) -> tuple:
+    """Gọi thẳng ASGI app (không qua HTTP client) -> (status, headers, body)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+async def measure(path: str, requests: int, accept_encoding: str) -> tuple:
+    """Đo phía server: request/giây và số byte body trả về"""
+    headers = {"accept-encoding": accept_encoding}
+    await asgi_get(path, headers)  # Làm nóng cache
+    wire_bytes = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        status, _, body = await asgi_get(path, headers)
+        wire_bytes += len(body)
+    seconds = time.perf_counter() - start
+    return requests / seconds, wire_bytes / requests
+
+
+async def check_fresh_after_write(product_id: int) -> bool:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/products")
+        await client.get(f"/api/products/{product_id}")
+        decrease_product_stock(product_id)
+        listed = (await client.get("/api/products")).json()["data"]
+        detail = (await client.get(f"/api/products/{product_id}")).json()
+    expected = catalog.get(product_id).stock
+    listed_stock = next(p["stock"] for p in listed if p["id"] == product_id)
+    return listed_stock == expected and detail["stock"] == expected and len(listed) == len(get_all_products())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    seed_catalog(args.products)
+    encodings = [None, "gzip"] + (["br"] if "br" in COMPRESSORS else [])
+
+    print(f"🧪 Cache response API sản phẩm ({len(catalog):,} sản phẩm, {args.requests:,} request mỗi lần đo)")
+    print("=" * 60)
+    print(f"{'Endpoint':<20} {'Nén':<5} {'Tắt cache':>11} {'Bật cache':>11} {'Tăng':>6} {'Bytes tắt':>10} {'Bytes bật':>10}")
+    for path in ("/api/products", "/api/products/1000"):
+        for encoding in encodings:
+            set_cache(False)
+            off_rate, off_size = asyncio.run(measure(path, args.requests, encoding or "identity"))
+            set_cache(True)
+            on_rate, on_size = asyncio.run(measure(path, args.requests, encoding or "identity"))
+            print(f"{path:<20} {encoding or '-':<5} {off_rate:>9,.0f}/s {on_rate:>9,.0f}/s "
+                  f"{on_rate / off_rate:>5.1f}x {off_size:>10,.0f} {on_size:>10,.0f}")
+
+    ok = asyncio.run(check_fresh_after_write(1000))
+    print("✅ Cache được làm mới đúng sau khi stock thay đổi" if ok else "❌ Cache trả dữ liệu cũ")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Benchmark + kiểm tra hồi quy hiệu năng cho từng route của main.app (chạy trong process qua ASGI).
+
+Mỗi route được gọi --requests lần (sau --warmup lần khởi động) với --concurrency
+request đồng thời; ghi p50/p95/p99 và số request/giây. create-payment gọi PayOS
+giả lập (fake_payos.py, độ trễ 0) nên chỉ đo phần xử lý của service.
+
+Trong cùng lần chạy, mỗi route được đo xen kẽ (từng đoạn CHUNK request) với một
+app ASGI rỗng qua cùng transport (mốc hiệu chỉnh): số so sánh là tỉ lệ p95 /
+request/giây của route so với mốc đó, nên máy nhanh / chậm hơn hay tải nền thay
+đổi giữa các lần chạy không làm lệch kết quả - chỉ phần việc thêm vào đường xử lý
+request (middleware, route) mới làm tăng tỉ lệ.
+
+So với baseline đã lưu (benchmarks/baselines/routes.json): route nào có tỉ lệ p95
+tăng hoặc tỉ lệ request/giây giảm quá --threshold lần thì báo hồi quy và thoát với
+mã 1. Thay đổi cố ý làm tăng chi phí mỗi request thì lưu lại baseline bằng
+--save-baseline trong cùng commit.
+
+Chạy:
+    python benchmarks/bench_routes.py                       # so với baseline
+    python benchmarks/bench_routes.py --save-baseline       # đo và ghi baseline mới
+    python benchmarks/bench_routes.py --routes products_list create_payment --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.product import catalog
+from app.routers import payment as payment_router
+from app.services.payos_client import AsyncPayOSClient
+from app.services.vietqr_gen import vietqr
+from fake_payos import FakeConfig, FakePayOS, create_app
+from main import app
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "routes.json"
+CHUNK = 50  # Số request mỗi đoạn khi đo xen kẽ route và mốc hiệu chỉnh
+PRODUCT_IDS = [p.id for p in catalog.list_available()]
+
+
+class Route:
+    """Một route cần đo: request thứ i -> (method, url, kwargs cho httpx)"""
+
+    def __init__(self, name: str, build: Callable[[int], tuple],
+                 setup: Optional[Callable[[httpx.AsyncClient], Awaitable[None]]] = None):
+        self.name = name
+        self.build = build
+        self.setup = setup
+
+
+order_codes: List[int] = []
+
+
+async def create_orders(http: httpx.AsyncClient, count: int = 200) -> None:
+    """Tạo sẵn đơn hàng cho route order-status"""
+    for i in range(count):
+        response = await http.post("/api/create-payment", json={
+            "machine_id": f"BENCH{i % 20:03d}", "product_id": PRODUCT_IDS[0], "amount": 15000,
+        }, headers={"Idempotency-Key": uuid.uuid4().hex})
+        order_codes.append(response.json()["order_code"])
+
+
+def create_payment_request(i: int) -> tuple:
+    return ("POST", "/api/create-payment", {
+        "json": {"machine_id": f"BENCH{i % 100:03d}", "product_id": PRODUCT_IDS[0], "amount": 15000},
+        "headers": {"Idempotency-Key": f"bench-{uuid.uuid4().hex}"},
+    })
+
+
+ROUTES = {
+    "products_list": Route("GET /api/products", lambda i: ("GET", "/api/products", {})),
+    "product_get": Route("GET /api/products/{id}",
+                         lambda i: ("GET", f"/api/products/{PRODUCT_IDS[i % len(PRODUCT_IDS)]}", {})),
+    "stock_update": Route("PUT /api/products/{id}/stock", lambda i: (
+        "PUT", f"/api/products/{PRODUCT_IDS[-1]}/stock", {"params": {"new_stock": 10**6 + i % 100}})),
+    "purchase": Route("POST /api/products/{id}/purchase",
+                      lambda i: ("POST", f"/api/products/{PRODUCT_IDS[1]}/purchase", {})),
+    "create_payment": Route("POST /api/create-payment", create_payment_request),
+    "order_status": Route("GET /api/order-status/{code}",
+                          lambda i: ("GET", f"/api/order-status/{order_codes[i % len(order_codes)]}", {}),
+                          setup=create_orders),
+    "heartbeat": Route("POST /api/heartbeat", lambda i: ("POST", "/api/heartbeat", {
+        "json": {"machine_id": f"BENCH{i % 1000:04d}", "status": "ONLINE"}})),
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def calibration_app(scope, receive, send):
+    """App ASGI rỗng làm mốc hiệu chỉnh: chỉ có chi phí của transport và event loop"""
+    if scope["type"] != "http":
+        return
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"success":true}'})
+
+
+CALIBRATION = Route("mốc (app ASGI rỗng)", lambda i: ("GET", "/", {}))
+
+
+async def timed(http: httpx.AsyncClient, route: Route, indices: range, concurrency: int) -> tuple:
+    """Gửi request thứ indices qua concurrency worker; trả về (độ trễ từng request, số lỗi, thời gian tổng)"""
+    latencies: List[float] = []
+    failures = 0
+    counter = iter(indices)
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            method, url, kwargs = route.build(i)
+            start = time.perf_counter()
+            response = await http.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            failures += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures, time.perf_counter() - start
+
+
+def summarize(latencies: List[float], failures: int, wall: float) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "ops": round(len(latencies) / wall, 1),
+        "errors": failures,
+    }
+
+
+async def measure(http: httpx.AsyncClient, noop: httpx.AsyncClient, route: Route, requests: int, warmup: int,
+                  concurrency: int, chunk: int = CHUNK) -> dict:
+    """
+    Đo route xen kẽ với mốc hiệu chỉnh theo từng đoạn chunk request, để hai bên
+    chịu cùng điều kiện máy (tải nền, tần số CPU) trong suốt lần đo
+    """
+    # Khởi động: nạp cache, khởi tạo pool / client PayOS
+    await timed(http, route, range(warmup), concurrency)
+    await timed(noop, CALIBRATION, range(warmup), concurrency)
+
+    totals = {"route": ([], 0, 0.0), "noop": ([], 0, 0.0)}
+    for begin in range(warmup, warmup + requests, chunk):
+        indices = range(begin, min(begin + chunk, warmup + requests))
+        for side, client, target in (("noop", noop, CALIBRATION), ("route", http, route)):
+            latencies, failures, wall = await timed(client, target, indices, concurrency)
+            total = totals[side]
+            totals[side] = (total[0] + latencies, total[1] + failures, total[2] + wall)
+    result, calibration = summarize(*totals["route"]), summarize(*totals["noop"])
+    return {
+        **result,
+        "p50_ratio": round(result["p50_ms"] / calibration["p50_ms"], 3),
+        "p95_ratio": round(result["p95_ms"] / calibration["p95_ms"], 3),
+        "ops_ratio": round(result["ops"] / calibration["ops"], 4),
+    }
+
+
+async def run(names: List[str], args) -> Dict[str, dict]:
+    # PayOS giả lập không độ trễ, kiosk luôn chờ link PayOS (không dùng VietQR tại server)
+    fake = FakePayOS(FakeConfig(latency=0, latency_dist="fixed"), seed=1)
+    client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+    payment_router.create_payment_link_async = client.create_payment_link
+    vietqr.account_no = None
+    for product_id in PRODUCT_IDS:
+        catalog.set_stock(product_id, 10**7)
+
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http, \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=calibration_app), base_url="http://bench") as noop:
+        for name in names:
+            route = ROUTES[name]
+            if route.setup is not None:
+                await route.setup(http)
+            results[name] = await measure(http, noop, route, args.requests, args.warmup, args.concurrency)
+    await client.aclose()
+    return results
+
+
+def environment(args) -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(results: Dict[str, dict], baseline: dict, threshold: float) -> List[str]:
+    """Danh sách route bị hồi quy so với baseline (theo tỉ lệ so với mốc hiệu chỉnh)"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get("routes", {}).get(name)
+        if base is None or "p95_ratio" not in base:
+            continue
+        if r["p95_ratio"] > base["p95_ratio"] * threshold:
+            regressions.append(f"{name}: p95 gấp {base['p95_ratio']:.2f} -> {r['p95_ratio']:.2f} lần mốc")
+        if r["ops_ratio"] < base["ops_ratio"] / threshold:
+            regressions.append(f"{name}: request/giây bằng {base['ops_ratio']:.1%} -> {r['ops_ratio']:.1%} mốc")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=2000, help="Số request đo mỗi route")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1, help="Số request đồng thời")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="Hồi quy khi tỉ lệ p95 tăng / tỉ lệ request/giây giảm quá bao nhiêu lần")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả lần đo này làm baseline")
+    parser.add_argument("--output", type=Path, help="Ghi kết quả lần đo ra file JSON")
+    args = parser.parse_args()
+
+    print(f"🧪 Benchmark {len(args.routes)} route: {args.requests} request/route, {args.concurrency} đồng thời")
+    print("=" * 60)
+    results = asyncio.run(run(args.routes, args))
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    print(f"{'Route':<32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/giây':>10} "
+          f"{'p95/mốc':>8} {'baseline':>9}")
+    for name, r in results.items():
+        base = baseline.get("routes", {}).get(name)
+        base_ratio = f"{base['p95_ratio']:.2f}" if base and "p95_ratio" in base else "-"
+        print(f"{ROUTES[name].name:<32} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['ops']:>10,.0f} {r['p95_ratio']:>8.2f} {base_ratio:>9}"
+              + (f"  ({r['errors']} lỗi)" if r["errors"] else ""))
+
+    report = {"meta": environment(args), "routes": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        if baseline:
+            report["routes"] = {**baseline.get("routes", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ Đã lưu baseline: {args.baseline}")
+        sys.exit(0)
+
+    errors = [name for name, r in results.items() if r["errors"]]
+    if errors:
+        print(f"❌ Route trả lỗi: {', '.join(errors)}")
+        sys.exit(1)
+    if not any("p95_ratio" in base for base in baseline.get("routes", {}).values()):
+        print(f"⚠️ Chưa có baseline theo mốc hiệu chỉnh ({args.baseline}), chạy với --save-baseline để tạo")
+        sys.exit(0)
+    meta = baseline.get("meta", {})
+    if meta.get("cpu_count") != os.cpu_count() or meta.get("concurrency") != args.concurrency:
+        print(f"⚠️ Baseline đo trên cấu hình khác (CPU {meta.get('cpu_count')}, "
+              f"{meta.get('concurrency')} đồng thời) - kết quả so sánh chỉ mang tính tham khảo")
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"❌ Hồi quy {line}")
+    print(f"✅ Không route nào chậm hơn baseline quá {args.threshold}x" if not regressions
+          else f"❌ {len(regressions)} chỉ số vượt ngưỡng {args.threshold}x")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
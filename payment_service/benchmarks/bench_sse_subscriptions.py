@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Load test SSE: một worker giữ được bao nhiêu kết nối theo dõi đơn hàng,
+và mất bao lâu để trạng thái "PAID" tới được tất cả kết nối.
+
+Server uvicorn chạy trong một thread riêng của cùng tiến trình (1 worker),
+client mở N kết nối SSE tới /api/events/orders/{order_code}.
+Client và server dùng chung GIL nên độ trễ đo được là cận trên - phần lớn là
+thời gian client parse N stream, không phải thời gian server đẩy tin.
+
+Chạy:
+    python benchmarks/bench_sse_subscriptions.py --connections 2000
+"""
+import argparse
+import asyncio
+import resource
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+import uvicorn
+
+from app.models.order import OrderStatus, order_store
+from app.services.pubsub import pubsub
+from main import app
+
+
+def rss_mb() -> float:
+    """RSS hiện tại của tiến trình (MB, chỉ Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def start_server() -> tuple:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, port
+
+
+async def run(connections: int, port: int) -> dict:
+    order_code = 1
+    order_store.create(order_code, "VM-BENCH", 1, 15000)
+    order_store.transition(order_code, OrderStatus.PENDING)
+
+    received_at = {}
+    ready = asyncio.Event()
+    opened = 0
+
+    limits = httpx.Limits(max_connections=connections + 10, max_keepalive_connections=0)
+    timeout = httpx.Timeout(60.0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=timeout) as client:
+
+        async def subscriber(index: int):
+            nonlocal opened
+            async with client.stream("GET", f"/api/events/orders/{order_code}") as response:
+                async for line in response.aiter_lines():
+                    if '"PENDING"' in line:
+                        opened += 1
+                        if opened == connections:
+                            ready.set()
+                    elif '"PAID"' in line:
+                        received_at[index] = time.perf_counter()
+                        return
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(i)) for i in range(connections)]
+        await asyncio.wait_for(ready.wait(), timeout=120)
+        open_seconds = time.perf_counter() - start
+        while pubsub.subscriber_count() < connections:
+            await asyncio.sleep(0.01)
+        rss_after = rss_mb()
+
+        published_at = time.perf_counter()
+        order_store.transition(order_code, OrderStatus.PAID)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=120)
+
+    latencies = sorted((t - published_at) * 1000 for t in received_at.values())
+    return {
+        "open_seconds": open_seconds,
+        "subscribers": connections,
+        "rss_per_conn_kb": (rss_after - rss_before) * 1024 / connections,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "max_ms": latencies[-1],
+        "delivered": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Mỗi kết nối tốn 2 file descriptor (client + server trong cùng tiến trình)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.connections * 2 + 100
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    server, thread, port = start_server()
+    try:
+        r = asyncio.run(run(args.connections, port))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    print(f"🧪 {r['subscribers']:,} kết nối SSE tới 1 worker")
+    print("=" * 60)
+    print(f"Mở xong tất cả kết nối: {r['open_seconds']:.2f} s")
+    print(f"RAM mỗi kết nối (client + server): ~{r['rss_per_conn_kb']:.1f} KB")
+    print(f"PAID tới {r['delivered']:,} kết nối: p50={r['p50_ms']:.1f} ms  p99={r['p99_ms']:.1f} ms  "
+          f"max={r['max_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
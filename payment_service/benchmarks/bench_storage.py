@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Đo số lượt mua (trừ stock) mỗi giây với lớp lưu trữ SQLite (WAL) khi 1, 4, 8
+worker (process) dùng chung một file database - giống chạy uvicorn nhiều worker.
+
+Mỗi worker có catalog riêng trong RAM, --threads thread cùng mua ngẫu nhiên
+trong --products sản phẩm; ghi được gom theo lô (group commit). Sau đó mọi
+worker cùng tranh mua một sản phẩm chỉ còn --hot-stock món: tổng số lượt mua
+thành công phải đúng bằng stock, không bán vượt.
+
+Cuối cùng hai worker tranh giữ chỗ (InventoryEngine, như khi tạo link thanh
+toán) món cuối cùng của --rounds sản phẩm: mỗi món chỉ một đơn giữ được, và
+worker còn lại chốt được giữ chỗ đó (xác nhận xuất hàng tới worker khác).
+
+Dòng "memory" là mốc so sánh: catalog trong RAM, một worker, không lưu gì.
+
+Chạy:
+    python benchmarks/bench_storage.py --workers 1 4 8 --purchases 20000
+"""
+import argparse
+import multiprocessing as mp
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.models.catalog import ProductCatalog
+from app.models.product import Product
+from app.models.storage import SQLiteStorage
+from app.services.inventory import InventoryEngine
+
+HOT_PRODUCT_ID = 0
+LAST_UNIT_BASE_ID = 10**6  # Sản phẩm của phần tranh món cuối: LAST_UNIT_BASE_ID + vòng
+
+
+def make_products(products: int, stock: int, hot_stock: int) -> list:
+    result = [Product(id=HOT_PRODUCT_ID, name="Sản phẩm hot", price=10000, stock=hot_stock)]
+    result += [Product(id=i, name=f"Sản phẩm {i}", price=10000, stock=stock) for i in range(1, products + 1)]
+    return result
+
+
+def run_purchases(catalog: ProductCatalog, product_ids: list, purchases: int, threads: int) -> int:
+    """--threads thread cùng mua, trả về số lượt thành công"""
+    sold = [0] * threads
+
+    def buyer(index: int) -> None:
+        rng = random.Random(index)
+        for _ in range(purchases // threads):
+            sold[index] += catalog.decrement_stock(rng.choice(product_ids))
+
+    workers = [threading.Thread(target=buyer, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(sold)
+
+
+def worker(path: str, product_ids: list, purchases: int, threads: int, barrier, results) -> None:
+    storage = SQLiteStorage(path)
+    catalog = ProductCatalog((Product(**row) for row in storage.load_products()), storage=storage)
+
+    barrier.wait()
+    start = time.perf_counter()
+    sold = run_purchases(catalog, product_ids, purchases, threads)
+    elapsed = time.perf_counter() - start
+    commits, writes = storage.commits, storage.writes
+
+    # Mọi worker cùng tranh mua sản phẩm hot
+    barrier.wait()
+    hot_sold = run_purchases(catalog, [HOT_PRODUCT_ID], purchases // 4, threads)
+    results.put((sold, elapsed, commits, writes, hot_sold))
+    storage.close()
+
+
+def bench_sqlite(workers: int, args) -> dict:
+    path = str(Path(tempfile.mkdtemp()) / "bench.db")
+    storage = SQLiteStorage(path)
+    products = make_products(args.products, 10**6, args.hot_stock)
+    storage.seed_products(p.model_dump() for p in products)
+    initial = {row["id"]: row["stock"] for row in storage.load_products()}
+
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    per_worker = args.purchases // workers
+    procs = [
+        ctx.Process(target=worker, args=(path, list(range(1, args.products + 1)), per_worker,
+                                         args.threads, barrier, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    final = {row["id"]: row["stock"] for row in storage.load_products()}
+    storage.close()
+    sold = sum(s[0] for s in stats)
+    hot_sold = sum(s[4] for s in stats)
+    sold_in_db = sum(initial[pid] - final[pid] for pid in initial if pid != HOT_PRODUCT_ID)
+    return {
+        "rate": sold / max(s[1] for s in stats),
+        "writes_per_commit": sum(s[3] for s in stats) / max(1, sum(s[2] for s in stats)),
+        "consistent": sold == sold_in_db,
+        "hot_ok": hot_sold == args.hot_stock and final[HOT_PRODUCT_ID] == 0,
+        "hot_sold": hot_sold,
+    }
+
+
+def last_unit_worker(path: str, index: int, rounds: int, barrier, results) -> None:
+    storage = SQLiteStorage(path)
+    catalog = ProductCatalog((Product(**row) for row in storage.load_products()), storage=storage)
+    inventory = InventoryEngine(catalog, storage=storage)
+
+    won = []
+    for r in range(rounds):
+        barrier.wait()
+        if inventory.reserve(r * 2 + index, LAST_UNIT_BASE_ID + r):
+            won.append(r * 2 + index)
+    # Xác nhận xuất hàng của đơn worker kia giữ chỗ tới worker này
+    barrier.wait()
+    committed = sum(inventory.commit(r * 2 + (1 - index)) for r in range(rounds))
+    results.put((won, committed))
+    storage.close()
+
+
+def bench_last_unit(args) -> dict:
+    path = str(Path(tempfile.mkdtemp()) / "bench.db")
+    storage = SQLiteStorage(path)
+    storage.seed_products(Product(id=LAST_UNIT_BASE_ID + r, name=f"Món cuối {r}", price=10000, stock=1).model_dump()
+                          for r in range(args.rounds))
+
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(2), ctx.Queue()
+    procs = [ctx.Process(target=last_unit_worker, args=(path, i, args.rounds, barrier, results)) for i in range(2)]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    final = storage.load_stock()
+    storage.close()
+    return {
+        "reserved": sum(len(won) for won, _ in stats),
+        "committed": sum(committed for _, committed in stats),
+        "left": sum(stock for _, stock, _, _ in final),
+        "held": sum(reserved for _, _, _, reserved in final),
+    }
+
+
+def bench_memory(args) -> float:
+    catalog = ProductCatalog(make_products(args.products, 10**6, args.hot_stock))
+    start = time.perf_counter()
+    sold = run_purchases(catalog, list(range(1, args.products + 1)), args.purchases, args.threads)
+    return sold / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--purchases", type=int, default=20000, help="Tổng số lượt mua (chia đều cho các worker)")
+    parser.add_argument("--threads", type=int, default=8, help="Số thread mua đồng thời mỗi worker")
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--hot-stock", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200, help="Số lần hai worker tranh giữ chỗ món cuối cùng")
+    args = parser.parse_args()
+
+    print(f"🧪 Lưu trữ SQLite (WAL): {args.purchases:,} lượt mua, {args.threads} thread/worker")
+    print("=" * 60)
+    print(f"{'Backend':<10} {'Worker':>7} {'lượt mua/giây':>15} {'ghi/commit':>11} {'hot bán được':>13}")
+    print(f"{'memory':<10} {1:>7} {bench_memory(args):>15,.0f} {'-':>11} {'-':>13}")
+
+    ok = True
+    for workers in args.workers:
+        r = bench_sqlite(workers, args)
+        ok = ok and r["consistent"] and r["hot_ok"]
+        print(f"{'sqlite':<10} {workers:>7} {r['rate']:>15,.0f} {r['writes_per_commit']:>11.1f} "
+              f"{r['hot_sold']:>8,}/{args.hot_stock:<4}")
+
+    r = bench_last_unit(args)
+    ok = ok and r["reserved"] == r["committed"] == args.rounds and r["left"] == r["held"] == 0
+    print(f"Tranh món cuối: {r['reserved']}/{args.rounds} đơn giữ được, {r['committed']} chốt ở worker kia, "
+          f"còn lại stock {r['left']}, đang giữ {r['held']}")
+
+    print("✅ Stock trong database khớp số lượt mua, không bán vượt stock, mỗi món cuối chỉ một đơn giữ được" if ok
+          else "❌ Stock trong database không khớp hoặc bị bán vượt")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Đo tốc độ sinh mã VietQR tại server:
+
+1. Sinh payload EMVCo (TLV + CRC16) - payload/giây và µs mỗi payload
+2. Render ảnh QR (PNG/SVG, cần segno): lần đầu (render thật) vs lấy từ cache LRU
+3. POST /api/create-payment khi có tài khoản VietQR: kiosk nhận mã QR ngay,
+   link PayOS (giả lập trễ --payos-latency) được tạo ở nền
+
+Chạy:
+    python benchmarks/bench_vietqr.py --payloads 100000 --images 200
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.models.order import OrderStatus, order_store
+from app.routers import payment as payment_router
+from app.services.payos_client import AsyncPayOSClient, payment_link_queue
+from app.services.vietqr_gen import VietQRGenerator, build_payload, parse_payload, vietqr
+from benchmarks.bench_payment_concurrency import fake_payos_body
+from main import app
+
+BANK_BIN = "970436"
+ACCOUNT_NO = "0011012345678"
+
+
+def bench_payload(count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        build_payload(BANK_BIN, ACCOUNT_NO, 10000 + i, f"DH{i}")
+    return count / (time.perf_counter() - start)
+
+
+def bench_render(count: int, fmt: str) -> tuple:
+    generator = VietQRGenerator(BANK_BIN, ACCOUNT_NO, cache_size=count)
+    start = time.perf_counter()
+    for i in range(count):
+        generator.render(15000, f"DH{i}", fmt)
+    miss_ms = (time.perf_counter() - start) / count * 1000
+
+    start = time.perf_counter()
+    for _ in range(10):
+        for i in range(count):
+            generator.render(15000, f"DH{i}", fmt)
+    hit_ms = (time.perf_counter() - start) / (count * 10) * 1000
+    return miss_ms, hit_ms
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def bench_create_payment(payments: int, payos_latency: float) -> dict:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(payos_latency)
+        return httpx.Response(200, json=fake_payos_body(request))
+
+    client = AsyncPayOSClient(transport=httpx.MockTransport(handler))
+    payment_router.create_payment_link_async = client.create_payment_link
+    vietqr.bank_bin, vietqr.account_no = BANK_BIN, ACCOUNT_NO
+
+    latencies, codes, valid = [], [], 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        payload = {"machine_id": "VM001", "product_id": 1, "amount": 15000}
+        for _ in range(payments):
+            start = time.perf_counter()
+            response = await http.post("/api/create-payment", json=payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+            data = response.json()
+            codes.append(data["order_code"])
+            fields = parse_payload(data["qr_code"])
+            valid += fields["54"] == "15000" and str(data["order_code"]) in fields["62"]
+            payment_router.inventory.release(data["order_code"])  # Không để hết hàng giữa chừng
+
+        await payment_link_queue.join()
+    await client.aclose()
+    await payment_link_queue.stop()
+    pending = sum(1 for c in codes if order_store.get(c).status == OrderStatus.PENDING)
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "valid": valid,
+        "pending": pending,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payloads", type=int, default=100000)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--payos-latency", type=float, default=0.3, help="Độ trễ giả lập của PayOS (giây)")
+    args = parser.parse_args()
+
+    print("🧪 VietQR sinh tại server")
+    print("=" * 60)
+    rate = bench_payload(args.payloads)
+    print(f"Sinh payload: {rate:,.0f} payload/giây ({1e6 / rate:.1f} µs/payload)")
+
+    if vietqr.can_render:
+        for fmt in ("png", "svg"):
+            miss_ms, hit_ms = bench_render(args.images, fmt)
+            print(f"Render {fmt.upper()}: lần đầu {miss_ms:.2f} ms | từ cache {hit_ms * 1000:.1f} µs "
+                  f"({miss_ms / hit_ms:,.0f}x)")
+    else:
+        print("⚠️ Chưa cài segno - bỏ qua phần render ảnh (pip install segno)")
+
+    r = asyncio.run(bench_create_payment(args.payments, args.payos_latency))
+    print(f"POST /api/create-payment (PayOS trễ {args.payos_latency * 1000:.0f} ms): kiosk nhận mã QR sau "
+          f"p50={r['p50_ms']:.2f} ms  p99={r['p99_ms']:.2f} ms")
+    print(f"  mã QR hợp lệ (CRC, số tiền, nội dung): {r['valid']}/{args.payments} | "
+          f"link PayOS tạo xong ở nền: {r['pending']}/{args.payments}")
+
+    ok = r["valid"] == args.payments and r["pending"] == args.payments
+    print("✅ Mọi đơn có mã QR hợp lệ và link PayOS" if ok else "❌ Có đơn thiếu mã QR hoặc link PayOS")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
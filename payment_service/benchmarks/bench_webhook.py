@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Phát lại webhook PayOS có chữ ký hợp lệ với tốc độ cao để đo:
+
+1. Tốc độ xác thực chữ ký: SDK payos (webhooks.verify) vs WebhookVerifier (HMAC khởi tạo sẵn)
+2. Thông lượng POST /api/payos-webhook và độ trễ end-to-end từ lúc gửi webhook
+   tới lúc kiosk (subscriber SSE) nhận được trạng thái PAID
+3. Tính idempotent: gửi lại toàn bộ webhook lần hai, không đơn nào bị xử lý lại
+
+Chạy:
+    python benchmarks/bench_webhook.py --orders 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from payos import PayOS
+
+from app.config import PAYOS_CLIENT_ID, PAYOS_API_KEY, PAYOS_CHECKSUM_KEY
+from app.models.order import OrderStatus, order_store
+from app.services.background import background_queue
+from app.services.payos_webhook import payment_ledger, webhook_verifier
+from app.services.pubsub import order_topic, pubsub
+from main import app
+
+
+def make_webhook(order_code: int, amount: int) -> dict:
+    """Tạo payload webhook giống PayOS gửi khi thanh toán thành công"""
+    data = {
+        "orderCode": order_code,
+        "amount": amount,
+        "description": f"VQR{order_code}",
+        "accountNumber": "12345678",
+        "reference": f"FT{order_code}",
+        "transactionDateTime": "2025-01-01 10:00:00",
+        "currency": "VND",
+        "paymentLinkId": f"link-{order_code}",
+        "code": "00",
+        "desc": "Thành công",
+        "counterAccountBankId": "",
+        "counterAccountBankName": "",
+        "counterAccountName": None,
+        "counterAccountNumber": "",
+        "virtualAccountName": None,
+        "virtualAccountNumber": "",
+    }
+    return {
+        "code": "00",
+        "desc": "success",
+        "success": True,
+        "data": data,
+        "signature": webhook_verifier.sign(data),
+    }
+
+
+def bench_verify(iterations: int) -> tuple:
+    payload = make_webhook(1, 15000)
+    sdk = PayOS(client_id=PAYOS_CLIENT_ID, api_key=PAYOS_API_KEY, checksum_key=PAYOS_CHECKSUM_KEY)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        sdk.webhooks.verify(payload)
+    sdk_rate = iterations / (time.perf_counter() - start)
+
+    verify = webhook_verifier.verify
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verify(payload)
+    local_rate = iterations / (time.perf_counter() - start)
+    return sdk_rate, local_rate
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def replay(orders: int, concurrency: int, rate: float = 0, base_code: int = 10_000_000) -> dict:
+    """Phát lại webhook; rate > 0 thì gửi đều theo tốc độ đó, ngược lại gửi nhanh nhất có thể"""
+    payloads = []
+    subscriptions = {}
+    for i in range(orders):
+        code = base_code + i
+        order_store.create(code, "VM-BENCH", 1, 15000)
+        order_store.transition(code, OrderStatus.PENDING)
+        subscriptions[code] = pubsub.subscribe(order_topic(code))
+        payloads.append(make_webhook(code, 15000))
+
+    sent_at = {}
+    latencies = []
+
+    async def kiosk(code, subscription):
+        await subscription.get()
+        latencies.append((time.perf_counter() - sent_at[code]) * 1000)
+        subscription.close()
+
+    kiosks = [asyncio.create_task(kiosk(c, s)) for c, s in subscriptions.items()]
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def send(payload, index=0):
+            if rate:
+                await asyncio.sleep(index / rate)
+            async with semaphore:
+                sent_at.setdefault(payload["data"]["orderCode"], time.perf_counter())
+                response = await client.post("/api/payos-webhook", json=payload)
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(send(p, i) for i, p in enumerate(payloads)))
+        ack_seconds = time.perf_counter() - start
+        await asyncio.gather(*kiosks)
+        await background_queue.join()
+
+        ledger_before = len(payment_ledger)
+        duplicate_statuses = await asyncio.gather(*(send(p) for p in payloads))
+        await background_queue.join()
+
+    paid = sum(1 for i in range(orders) if order_store.get(base_code + i).status == OrderStatus.PAID)
+    return {
+        "ack_rate": orders / ack_seconds,
+        "ok": statuses.count(200),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "paid": paid,
+        "duplicates_ok": duplicate_statuses.count(200),
+        "ledger_growth": len(payment_ledger) - ledger_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=500, help="Tốc độ gửi đều khi đo độ trễ (webhook/giây)")
+    parser.add_argument("--verify-iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    print("🧪 Webhook PayOS")
+    print("=" * 60)
+    sdk_rate, local_rate = bench_verify(args.verify_iterations)
+    print(f"Xác thực chữ ký - SDK payos:       {sdk_rate:>10,.0f} lần/giây")
+    print(f"Xác thực chữ ký - WebhookVerifier: {local_rate:>10,.0f} lần/giây")
+
+    r = asyncio.run(replay(args.orders, args.concurrency))
+    print(f"Phát lại {args.orders:,} webhook (song song {args.concurrency}): {r['ack_rate']:,.0f} webhook/giây, "
+          f"HTTP 200: {r['ok']:,}")
+    print(f"  khi quá tải, webhook -> kiosk nhận PAID: p50={r['p50_ms']:.2f} ms  p99={r['p99_ms']:.2f} ms")
+    print(f"  gửi lại lần hai: HTTP 200: {r['duplicates_ok']:,} | bản ghi mới: {r['ledger_growth']}")
+
+    paced_orders = min(args.orders, int(args.rate * 5))
+    paced = asyncio.run(replay(paced_orders, args.concurrency, rate=args.rate, base_code=20_000_000))
+    print(f"Gửi đều {args.rate:,.0f} webhook/giây: webhook -> kiosk nhận PAID: "
+          f"p50={paced['p50_ms']:.2f} ms  p99={paced['p99_ms']:.2f} ms")
+
+    ok = (r["paid"] == args.orders and r["ledger_growth"] == 0 and r["ok"] == args.orders
+          and paced["paid"] == paced_orders)
+    print("✅ Mọi đơn PAID đúng một lần" if ok else "❌ Sai lệch trạng thái đơn hàng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Load test server production (serve.py) với 1, 2, 4... worker dùng chung database SQLite.
+
+Với mỗi số worker: khởi động serve.py trên một database mới, nhiều process
+client (kết nối HTTP keep-alive) cùng gọi POST /api/products/{id}/purchase
+trong --duration giây, một phần request nhắm vào sản phẩm "hot" chỉ có
+--hot-stock món. Sau đó kiểm tra trong database:
+
+- tổng stock bị trừ đúng bằng số lượt mua thành công (HTTP 200)
+- sản phẩm hot bán được đúng --hot-stock món - không bán vượt
+
+Số request/giây chỉ tăng theo số worker khi máy có đủ CPU cho cả server lẫn client.
+
+Chạy:
+    python benchmarks/bench_workers.py --workers 1 2 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.models.product import Product
+from app.models.storage import SQLiteStorage
+
+SERVICE_DIR = Path(__file__).parent.parent
+HOT_PRODUCT_ID = 999
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(path: str, products: int, hot_stock: int) -> dict:
+    storage = SQLiteStorage(path)
+    rows = [Product(id=i, name=f"Sản phẩm {i}", price=10000, stock=10**6) for i in range(1, products + 1)]
+    rows.append(Product(id=HOT_PRODUCT_ID, name="Sản phẩm hot", price=10000, stock=hot_stock))
+    storage.seed_products(p.model_dump() for p in rows)
+    stock = {row["id"]: row["stock"] for row in storage.load_products()}
+    storage.close()
+    return stock
+
+
+def start_server(workers: int, port: int, db_path: str) -> subprocess.Popen:
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=db_path, RESPONSE_CACHE="1")
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                time.sleep(1)  # Chờ mọi worker chạy xong lifespan
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("serve.py không khởi động được")
+
+
+async def http_client(port: int, deadline: float, products: int, hot_ratio: float, seed: int, stats: dict) -> None:
+    """Một kết nối keep-alive gửi request mua hàng liên tục tới deadline"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.monotonic() < deadline:
+            hot = rng.random() < hot_ratio
+            product_id = HOT_PRODUCT_ID if hot else rng.randint(1, products)
+            writer.write(f"POST /api/products/{product_id}/purchase HTTP/1.1\r\n"
+                         f"Host: bench\r\nContent-Length: 0\r\n\r\n".encode())
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            status = int(status_line.split()[1])
+            key = ("hot_" if hot else "") + ("ok" if status == 200 else "rejected")
+            stats[key] = stats.get(key, 0) + 1
+    finally:
+        writer.close()
+
+
+def client_process(port: int, duration: float, connections: int, products: int, hot_ratio: float,
+                   seed: int, results) -> None:
+    async def run():
+        stats = {}
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(http_client(port, deadline, products, hot_ratio, seed * 1000 + i, stats)
+                               for i in range(connections)))
+        return stats
+
+    results.put(asyncio.run(run()))
+
+
+def load_test(workers: int, args) -> dict:
+    db_path = str(Path(tempfile.mkdtemp()) / "bench.db")
+    initial = seed_database(db_path, args.products, args.hot_stock)
+    port = free_port()
+    server = start_server(workers, port, db_path)
+    try:
+        ctx = mp.get_context("spawn")
+        results = ctx.Queue()
+        clients = [
+            ctx.Process(target=client_process, args=(port, args.duration, args.connections, args.products,
+                                                     args.hot_ratio, i, results))
+            for i in range(args.clients)
+        ]
+        for p in clients:
+            p.start()
+        stats = {}
+        for _ in clients:
+            for key, value in results.get().items():
+                stats[key] = stats.get(key, 0) + value
+        for p in clients:
+            p.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    storage = SQLiteStorage(db_path)
+    final = {row["id"]: row["stock"] for row in storage.load_products()}
+    storage.close()
+    ok = stats.get("ok", 0)
+    hot_ok = stats.get("hot_ok", 0)
+    sold_in_db = sum(initial[pid] - final[pid] for pid in initial if pid != HOT_PRODUCT_ID)
+    total = sum(stats.values())
+    return {
+        "rate": total / args.duration,
+        "purchases": ok + hot_ok,
+        "consistent": ok == sold_in_db,
+        "hot_sold": initial[HOT_PRODUCT_ID] - final[HOT_PRODUCT_ID],
+        "hot_ok": hot_ok,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=2, help="Số process client")
+    parser.add_argument("--connections", type=int, default=16, help="Số kết nối keep-alive mỗi client")
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--hot-stock", type=int, default=200)
+    parser.add_argument("--hot-ratio", type=float, default=0.1, help="Tỉ lệ request mua sản phẩm hot")
+    args = parser.parse_args()
+
+    print(f"🧪 Load test serve.py: {args.clients} client x {args.connections} kết nối, "
+          f"{args.duration:.0f}s mỗi cấu hình, CPU: {os.cpu_count()}")
+    print("=" * 60)
+    print(f"{'Worker':>6} {'request/giây':>13} {'lượt mua':>10} {'stock DB khớp':>14} {'hot bán/stock':>14}")
+    ok = True
+    for workers in args.workers:
+        r = load_test(workers, args)
+        hot_ok = r["hot_sold"] == r["hot_ok"] <= args.hot_stock
+        ok = ok and r["consistent"] and hot_ok
+        print(f"{workers:>6} {r['rate']:>13,.0f} {r['purchases']:>10,} {'có' if r['consistent'] else 'KHÔNG':>14} "
+              f"{r['hot_sold']:>8}/{args.hot_stock:<5}")
+
+    print("✅ Stock trong database khớp số lượt mua, không bán vượt stock" if ok
+          else "❌ Stock trong database không khớp hoặc bị bán vượt")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+PayOS giả lập chạy local - cho benchmark, CI và thử cả luồng thanh toán mà không cần PayOS thật.
+
+Cùng định dạng request / response và cùng chữ ký HMAC (PAYOS_CHECKSUM_KEY) với PayOS:
+- POST /v2/payment-requests              Tạo link thanh toán (orderCode đã có link -> mã 231)
+- GET  /v2/payment-requests/{id}         Thông tin link (id là orderCode hoặc paymentLinkId)
+- POST /v2/payment-requests/{id}/cancel  Huỷ link
+- GET  /web/{paymentLinkId}              Trang thanh toán giả với nút Thanh toán / Huỷ
+- POST /fake/pay/{orderCode}             Đánh dấu đã thanh toán và gửi webhook có chữ ký tới service
+- GET|PUT /fake/config, GET /fake/stats  Đổi độ trễ / tỉ lệ lỗi khi đang chạy, xem số liệu
+
+Mô phỏng PayOS chậm / quá tải: độ trễ theo phân phối (fixed, uniform, lognormal)
+kèm đuôi chậm, tỉ lệ lỗi 503, giới hạn số request/giây (vượt -> 429) và số
+request xử lý đồng thời (vượt -> xếp hàng chờ).
+
+Chạy:
+    python fake_payos.py --port 8900 --latency 0.2 --error-rate 0.05 --auto-pay 0.8
+    PAYOS_FAKE=1 python run_server.py   # service gọi PayOS giả lập thay vì PayOS thật
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Literal, Optional
+
+sys.path.append(str(Path(__file__).parent))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from payos._crypto import CryptoProvider
+from pydantic import BaseModel
+
+from app.config import DOMAIN, PAYOS_CHECKSUM_KEY, PAYOS_FAKE_PORT
+from app.services.payos_webhook import WebhookVerifier
+from app.services.vietqr_gen import build_payload
+
+# Tài khoản nhận tiền giả trong response (bin của MB Bank)
+FAKE_BANK_BIN = "970422"
+FAKE_ACCOUNT_NO = "0000000000"
+FAKE_ACCOUNT_NAME = "PAYOS GIA LAP"
+
+
+class FakeConfig(BaseModel):
+    """Hành vi của PayOS giả lập (đổi được khi đang chạy qua PUT /fake/config)"""
+    latency: float = 0.1                 # Độ trễ trung vị mỗi request (giây)
+    latency_dist: Literal["fixed", "uniform", "lognormal"] = "lognormal"
+    latency_sigma: float = 0.3           # Độ lệch của lognormal / biên độ tương đối của uniform
+    tail_ratio: float = 0.0              # Tỉ lệ request rơi vào đuôi chậm
+    tail_latency: float = 2.0            # Độ trễ của đuôi chậm (giây)
+    error_rate: float = 0.0              # Tỉ lệ request trả 503
+    rate_limit: float = 0.0              # Số request/giây tối đa, vượt -> 429 (0 = không giới hạn)
+    capacity: int = 0                    # Số request xử lý đồng thời, còn lại xếp hàng (0 = không giới hạn)
+    auto_pay: float = 0.0                # Tỉ lệ link được tự động thanh toán sau pay_delay giây
+    pay_delay: float = 2.0
+    webhook_url: str = f"{DOMAIN}/api/payos-webhook"
+
+
+class FakePayOS:
+    """Trạng thái của PayOS giả lập: link thanh toán, bộ giới hạn tốc độ, số liệu"""
+
+    def __init__(self, config: Optional[FakeConfig] = None, checksum_key: str = PAYOS_CHECKSUM_KEY,
+                 seed: Optional[int] = None, webhook_transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = config or FakeConfig()
+        self.checksum_key = checksum_key or ""
+        self.crypto = CryptoProvider()
+        self.webhook_signer = WebhookVerifier(self.checksum_key)
+        self.rng = random.Random(seed)
+        self.links: Dict[int, Dict[str, Any]] = {}   # orderCode -> link
+        self.by_id: Dict[str, int] = {}              # paymentLinkId -> orderCode
+        self.stats = {"requests": 0, "created": 0, "duplicates": 0, "cancelled": 0, "paid": 0,
+                      "errors_503": 0, "rate_limited": 0, "bad_signature": 0,
+                      "webhooks_sent": 0, "webhooks_failed": 0}
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._capacity = 0
+        self._webhook_transport = webhook_transport  # Benchmark gửi webhook thẳng vào app trong process
+        self._http: Optional[httpx.AsyncClient] = None
+
+    # --- Mô phỏng độ trễ / lỗi -------------------------------------------------
+
+    def sample_latency(self) -> float:
+        c = self.config
+        if c.tail_ratio and self.rng.random() < c.tail_ratio:
+            return c.tail_latency
+        if c.latency_dist == "fixed":
+            return c.latency
+        if c.latency_dist == "uniform":
+            return c.latency * self.rng.uniform(1 - c.latency_sigma, 1 + c.latency_sigma)
+        return self.rng.lognormvariate(0, c.latency_sigma) * c.latency
+
+    def rate_limited(self) -> bool:
+        """Token bucket: mỗi giây nạp rate_limit token, tối đa bằng rate_limit"""
+        rate = self.config.rate_limit
+        if rate <= 0:
+            return False
+        now = time.monotonic()
+        self._tokens = min(rate, self._tokens + (now - self._refilled) * rate)
+        self._refilled = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def simulate(self) -> Optional[JSONResponse]:
+        """Chờ độ trễ giả lập; trả về response lỗi nếu request bị từ chối"""
+        self.stats["requests"] += 1
+        if self.rate_limited():
+            self.stats["rate_limited"] += 1
+            return JSONResponse({"code": "429", "desc": "Too many requests"}, status_code=429,
+                                headers={"Retry-After": "1"})
+        capacity = self.config.capacity
+        if capacity > 0:
+            if self._semaphore is None or self._capacity != capacity:
+                self._semaphore = asyncio.Semaphore(capacity)
+                self._capacity = capacity
+            async with self._semaphore:
+                await asyncio.sleep(self.sample_latency())
+        else:
+            await asyncio.sleep(self.sample_latency())
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            self.stats["errors_503"] += 1
+            return JSONResponse({"code": "503", "desc": "Service Unavailable"}, status_code=503)
+        return None
+
+    # --- Dữ liệu có chữ ký ------------------------------------------------------
+
+    def signed(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        signature = self.crypto.create_signature_from_object(data, self.checksum_key)
+        return {"code": "00", "desc": "success", "data": data, "signature": signature}
+
+    @staticmethod
+    def failed(code: str, desc: str) -> Dict[str, Any]:
+        return {"code": code, "desc": desc, "data": None}
+
+    def create(self, payload: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        signature = payload.pop("signature", None)
+        expected = self.crypto.create_signature_of_payment_request(payload, self.checksum_key)
+        if signature != expected:
+            self.stats["bad_signature"] += 1
+            return self.failed("201", "Chữ ký không hợp lệ")
+        order_code = int(payload["orderCode"])
+        if order_code in self.links:
+            self.stats["duplicates"] += 1
+            return self.failed("231", "Đơn thanh toán đã tồn tại")
+
+        link_id = f"fake{order_code:x}{self.rng.getrandbits(32):08x}"
+        link = {
+            "id": link_id,
+            "orderCode": order_code,
+            "amount": int(payload["amount"]),
+            "description": payload["description"],
+            "status": "PENDING",
+            "createdAt": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "returnUrl": payload.get("returnUrl"),
+            "cancelUrl": payload.get("cancelUrl"),
+            "cancellationReason": None,
+            "canceledAt": None,
+            "transactions": [],
+        }
+        self.links[order_code] = link
+        self.by_id[link_id] = order_code
+        self.stats["created"] += 1
+        if self.config.auto_pay and self.rng.random() < self.config.auto_pay:
+            asyncio.get_running_loop().call_later(
+                self.config.pay_delay, lambda: asyncio.ensure_future(self.pay(order_code))
+            )
+
+        return self.signed({
+            "bin": FAKE_BANK_BIN,
+            "accountNumber": FAKE_ACCOUNT_NO,
+            "accountName": FAKE_ACCOUNT_NAME,
+            "amount": link["amount"],
+            "description": link["description"],
+            "orderCode": order_code,
+            "currency": "VND",
+            "paymentLinkId": link_id,
+            "status": "PENDING",
+            "expiredAt": None,
+            "checkoutUrl": f"{base_url}/web/{link_id}",
+            "qrCode": build_payload(FAKE_BANK_BIN, FAKE_ACCOUNT_NO, link["amount"], link["description"]),
+        })
+
+    def find(self, id: str) -> Optional[Dict[str, Any]]:
+        order_code = self.by_id.get(id)
+        if order_code is None and id.isdigit():
+            order_code = int(id)
+        return self.links.get(order_code)
+
+    def link_info(self, link: Dict[str, Any]) -> Dict[str, Any]:
+        paid = link["amount"] if link["status"] == "PAID" else 0
+        return {
+            "id": link["id"],
+            "orderCode": link["orderCode"],
+            "amount": link["amount"],
+            "amountPaid": paid,
+            "amountRemaining": link["amount"] - paid,
+            "status": link["status"],
+            "createdAt": link["createdAt"],
+            "transactions": link["transactions"],
+            "cancellationReason": link["cancellationReason"],
+            "canceledAt": link["canceledAt"],
+        }
+
+    def cancel(self, link: Dict[str, Any], reason: Optional[str]) -> Dict[str, Any]:
+        if link["status"] != "PENDING":
+            return self.failed("101", f"Link thanh toán đang ở trạng thái {link['status']}")
+        link["status"] = "CANCELLED"
+        link["cancellationReason"] = reason
+        link["canceledAt"] = datetime.now().astimezone().isoformat(timespec="seconds")
+        self.stats["cancelled"] += 1
+        return self.signed(self.link_info(link))
+
+    async def pay(self, order_code: int) -> bool:
+        """Đánh dấu link đã thanh toán rồi gửi webhook tới service; False nếu link không còn chờ thanh toán"""
+        link = self.links.get(order_code)
+        if link is None or link["status"] != "PENDING":
+            return False
+        now = datetime.now().astimezone()
+        reference = f"FT{self.rng.getrandbits(40):012d}"
+        link["status"] = "PAID"
+        link["transactions"] = [{
+            "reference": reference,
+            "amount": link["amount"],
+            "accountNumber": FAKE_ACCOUNT_NO,
+            "description": link["description"],
+            "transactionDateTime": now.strftime("%Y-%m-%d %H:%M:%S"),
+        }]
+        self.stats["paid"] += 1
+
+        data = {
+            "orderCode": order_code,
+            "amount": link["amount"],
+            "description": link["description"],
+            "accountNumber": FAKE_ACCOUNT_NO,
+            "reference": reference,
+            "transactionDateTime": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "currency": "VND",
+            "paymentLinkId": link["id"],
+            "code": "00",
+            "desc": "success",
+            "counterAccountBankId": "",
+            "counterAccountBankName": "",
+            "counterAccountName": "",
+            "counterAccountNumber": "",
+            "virtualAccountName": "",
+            "virtualAccountNumber": "",
+        }
+        payload = {"code": "00", "desc": "success", "success": True, "data": data,
+                   "signature": self.webhook_signer.sign(data)}
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10, transport=self._webhook_transport)
+        try:
+            response = await self._http.post(self.config.webhook_url, json=payload)
+            response.raise_for_status()
+            self.stats["webhooks_sent"] += 1
+        except httpx.HTTPError as e:
+            self.stats["webhooks_failed"] += 1
+            print(f"⚠️ Gửi webhook đơn {order_code} thất bại: {e}")
+        return True
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def create_app(fake: Optional[FakePayOS] = None) -> FastAPI:
+    """App FastAPI của PayOS giả lập (chạy bằng uvicorn hoặc gắn vào httpx.ASGITransport)"""
+    fake = fake or FakePayOS()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await fake.aclose()
+
+    app = FastAPI(title="PayOS giả lập", lifespan=lifespan)
+    app.state.fake = fake
+
+    def base_url(request: Request) -> str:
+        return str(request.base_url).rstrip("/")
+
+    @app.post("/v2/payment-requests")
+    async def create_payment_request(request: Request):
+        rejected = await fake.simulate()
+        if rejected is not None:
+            return rejected
+        return fake.create(await request.json(), base_url(request))
+
+    @app.get("/v2/payment-requests/{id}")
+    async def get_payment_request(id: str):
+        rejected = await fake.simulate()
+        if rejected is not None:
+            return rejected
+        link = fake.find(id)
+        if link is None:
+            return fake.failed("101", "Không tìm thấy link thanh toán")
+        return fake.signed(fake.link_info(link))
+
+    @app.post("/v2/payment-requests/{id}/cancel")
+    async def cancel_payment_request(id: str, request: Request):
+        rejected = await fake.simulate()
+        if rejected is not None:
+            return rejected
+        link = fake.find(id)
+        if link is None:
+            return fake.failed("101", "Không tìm thấy link thanh toán")
+        body = await request.json() if await request.body() else {}
+        return fake.cancel(link, body.get("cancellationReason"))
+
+    @app.get("/web/{link_id}", response_class=HTMLResponse)
+    async def checkout_page(link_id: str):
+        link = fake.find(link_id)
+        if link is None:
+            raise HTTPException(status_code=404, detail="Không tìm thấy link thanh toán")
+        return f"""
+        <html><body style="font-family: sans-serif; text-align: center; padding-top: 60px">
+            <h2>PayOS giả lập</h2>
+            <p>Đơn {link['orderCode']} - {link['amount']:,} VND - {link['status']}</p>
+            <form method="post" action="/web/{link_id}/pay" style="display: inline">
+                <button style="padding: 10px 24px">Thanh toán</button>
+            </form>
+            <form method="post" action="/web/{link_id}/cancel" style="display: inline">
+                <button style="padding: 10px 24px">Huỷ</button>
+            </form>
+        </body></html>
+        """
+
+    @app.post("/web/{link_id}/pay")
+    async def checkout_pay(link_id: str):
+        link = fake.find(link_id)
+        if link is None:
+            raise HTTPException(status_code=404, detail="Không tìm thấy link thanh toán")
+        await fake.pay(link["orderCode"])
+        return RedirectResponse(f"{link['returnUrl']}?orderCode={link['orderCode']}&status=PAID", status_code=303)
+
+    @app.post("/web/{link_id}/cancel")
+    async def checkout_cancel(link_id: str):
+        link = fake.find(link_id)
+        if link is None:
+            raise HTTPException(status_code=404, detail="Không tìm thấy link thanh toán")
+        fake.cancel(link, "Khách huỷ")
+        return RedirectResponse(f"{link['cancelUrl']}?orderCode={link['orderCode']}&status=CANCELLED",
+                                status_code=303)
+
+    @app.post("/fake/pay/{order_code}")
+    async def fake_pay(order_code: int):
+        if not await fake.pay(order_code):
+            raise HTTPException(status_code=409, detail="Link không tồn tại hoặc không còn chờ thanh toán")
+        return {"success": True}
+
+    @app.get("/fake/config")
+    async def get_config():
+        return fake.config
+
+    @app.put("/fake/config")
+    async def update_config(changes: Dict[str, Any]):
+        fake.config = FakeConfig(**{**fake.config.model_dump(), **changes})
+        return fake.config
+
+    @app.get("/fake/stats")
+    async def get_stats():
+        return {**fake.stats, "links": len(fake.links)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PAYOS_FAKE_PORT)
+    parser.add_argument("--seed", type=int, default=None)
+    defaults = FakeConfig()
+    for name, field in FakeConfig.model_fields.items():
+        kind = str if name in ("latency_dist", "webhook_url") else type(getattr(defaults, name))
+        parser.add_argument(f"--{name.replace('_', '-')}", type=kind, default=getattr(defaults, name))
+    args = parser.parse_args()
+
+    config = FakeConfig(**{name: getattr(args, name) for name in FakeConfig.model_fields})
+    print(f"🚀 PayOS giả lập tại http://{args.host}:{args.port} - độ trễ {config.latency_dist} "
+          f"{config.latency * 1000:.0f} ms, lỗi {config.error_rate:.0%}, webhook -> {config.webhook_url}")
+    uvicorn.run(create_app(FakePayOS(config, seed=args.seed)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Fleet Simulator - giả lập hàng nghìn máy bán hàng cùng lúc (headless, asyncio) để đo tải.
+
+Mỗi máy chạy đúng luồng của simulator.py nhưng không cần nhập tay:
+- Tải danh sách sản phẩm định kỳ (gửi If-None-Match, server trả 304 nếu không đổi)
+- Gửi heartbeat định kỳ
+- Khách đến mua theo phân phối Poisson (--purchase-rate lượt/phút mỗi máy):
+  tạo thanh toán (Idempotency-Key) -> chờ PAID -> xác nhận xuất hàng
+
+Mọi máy dùng chung một connection pool (--connections kết nối keep-alive).
+Kết thúc in báo cáo JSON: throughput, p50/p90/p99 độ trễ theo endpoint, số lỗi.
+
+Đơn chỉ được thanh toán khi server dùng PayOS giả lập có tự động thanh toán
+(fake_payos.py --auto-pay); --in-process chạy luôn server + PayOS giả lập trong
+process này để thử nhanh không cần dựng gì.
+
+Chạy:
+    python fleet_simulator.py --backend-url http://127.0.0.1:5000 --machines 2000 --duration 120
+    python fleet_simulator.py --in-process --machines 200 --duration 30 --output fleet.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(str(Path(__file__).parent))
+
+import httpx
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def sleep_until(wake_at: float, stop_at: float) -> None:
+    """Ngủ tới wake_at nhưng không quá thời điểm dừng"""
+    await asyncio.sleep(max(0.0, min(wake_at, stop_at) - time.monotonic()))
+
+
+class FleetStats:
+    """Độ trễ và lỗi theo endpoint cho cả đội máy"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str] = None) -> None:
+        self.latencies[endpoint].append(seconds)
+        if error is not None:
+            self.errors[endpoint][error] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            errors = dict(self.errors.get(endpoint, {}))
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "rate": round(len(values) / elapsed, 2),
+                "errors": sum(errors.values()),
+                "error_types": errors,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p90_ms": round(percentile(values, 90) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "purchases": dict(self.counters),
+            "endpoints": endpoints,
+        }
+
+
+class AsyncVendingMachine:
+    """Một máy bán hàng headless - cùng các lời gọi API với VendingMachineSimulator"""
+
+    def __init__(self, machine_id: str, http: httpx.AsyncClient, stats: FleetStats, args, rng: random.Random):
+        self.machine_id = machine_id
+        self.http = http
+        self.stats = stats
+        self.args = args
+        self.rng = rng
+        self.products: Dict[int, dict] = {}
+        self.catalog_etag: Optional[str] = None
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Gửi request, ghi độ trễ / lỗi theo endpoint; None nếu lỗi mạng"""
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(endpoint, time.perf_counter() - start, type(e).__name__)
+            return None
+        error = None if response.status_code < 400 else str(response.status_code)
+        self.stats.record(endpoint, time.perf_counter() - start, error)
+        return response
+
+    async def load_products(self) -> None:
+        headers = {"If-None-Match": self.catalog_etag} if self.catalog_etag and self.products else {}
+        response = await self.call("GET /api/products", "GET", "/api/products", headers=headers)
+        if response is not None and response.status_code == 200:
+            self.catalog_etag = response.headers.get("ETag")
+            self.products = {p["id"]: p for p in response.json().get("data", [])}
+
+    async def send_heartbeat(self) -> None:
+        await self.call("POST /api/heartbeat", "POST", "/api/heartbeat", json={
+            "machine_id": self.machine_id,
+            "timestamp": datetime.now().isoformat(),
+            "status": "ONLINE",
+            "products": {pid: {"stock": p["stock"]} for pid, p in self.products.items()},
+        })
+
+    async def purchase(self, stop_at: float) -> None:
+        """Một lượt mua: tạo thanh toán -> chờ PAID -> xác nhận xuất hàng"""
+        counters = self.stats.counters
+        in_stock = [p for p in self.products.values() if p["stock"] > 0]
+        if not in_stock:
+            counters["no_stock"] += 1
+            return
+        product = self.rng.choice(in_stock)
+        counters["started"] += 1
+        response = await self.call(
+            "POST /api/create-payment", "POST", "/api/create-payment",
+            json={"machine_id": self.machine_id, "product_id": product["id"], "amount": product["price"]},
+            headers={"Idempotency-Key": f"{self.machine_id}:{uuid.uuid4().hex}"},
+        )
+        if response is None or response.status_code != 200:
+            counters["create_failed"] += 1
+            return
+        order_code = response.json()["order_code"]
+
+        deadline = time.monotonic() + self.args.pay_timeout
+        while time.monotonic() < deadline:
+            if time.monotonic() >= stop_at:
+                counters["unfinished"] += 1  # Hết giờ chạy khi khách chưa thanh toán
+                return
+            await asyncio.sleep(self.args.status_poll)
+            response = await self.call("GET /api/order-status/{order_code}", "GET", f"/api/order-status/{order_code}")
+            status = response.json().get("status") if response is not None and response.status_code == 200 else None
+            if status == "PAID":
+                break
+            if status in ("CANCELLED", "EXPIRED"):
+                counters["cancelled"] += 1
+                return
+        else:
+            counters["abandoned"] += 1  # Khách bỏ đi không thanh toán
+            return
+
+        await asyncio.sleep(self.args.dispense_time)
+        response = await self.call(
+            "POST /api/dispense-complete", "POST", "/api/dispense-complete",
+            json={"order_code": order_code, "machine_id": self.machine_id, "product_id": product["id"],
+                  "status": "DISPENSED"},
+            headers={"Idempotency-Key": f"{self.machine_id}:{order_code}:dispense"},
+        )
+        counters["dispensed" if response is not None and response.status_code == 200 else "dispense_failed"] += 1
+
+    async def periodic(self, interval: float, fn, stop_at: float) -> None:
+        # Lệch pha ngẫu nhiên để các máy không gửi cùng một lúc
+        await sleep_until(time.monotonic() + self.rng.uniform(0, interval), stop_at)
+        while time.monotonic() < stop_at:
+            await fn()
+            await sleep_until(time.monotonic() + interval, stop_at)
+
+    async def customers(self, stop_at: float) -> None:
+        """Khách đến theo Poisson; mỗi lúc máy chỉ phục vụ một khách"""
+        rate = self.args.purchase_rate / 60
+        if rate <= 0:
+            return
+        while True:
+            await sleep_until(time.monotonic() + self.rng.expovariate(rate), stop_at)
+            if time.monotonic() >= stop_at:
+                return
+            await self.purchase(stop_at)
+
+    async def run(self, start_delay: float, stop_at: float) -> None:
+        await asyncio.sleep(start_delay)
+        await self.load_products()
+        await asyncio.gather(
+            self.periodic(self.args.heartbeat_interval, self.send_heartbeat, stop_at),
+            self.periodic(self.args.poll_interval, self.load_products, stop_at),
+            self.customers(stop_at),
+        )
+
+
+async def run_fleet(args, transport: Optional[httpx.AsyncBaseTransport] = None) -> dict:
+    stats = FleetStats()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.backend_url, limits=limits, transport=transport,
+                                 timeout=args.timeout) as http:
+        start = time.monotonic()
+        stop_at = start + args.ramp_up + args.duration
+        machines = [
+            AsyncVendingMachine(f"{args.prefix}{i:05d}", http, stats, args, random.Random(args.seed * 100003 + i))
+            for i in range(args.machines)
+        ]
+        await asyncio.gather(*(m.run(args.ramp_up * i / args.machines, stop_at) for i, m in enumerate(machines)))
+        elapsed = time.monotonic() - start
+    report = stats.report(elapsed)
+    report["config"] = {k: v for k, v in vars(args).items() if k != "output"}
+    return report
+
+
+async def run_in_process(args) -> dict:
+    """Chạy server (main.app) và PayOS giả lập ngay trong process này"""
+    # Log của server in ra stdout - chuyển sang stderr để stdout chỉ còn báo cáo JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        from app.models.product import catalog
+        from app.routers import payment as payment_router
+        from app.services.payos_client import AsyncPayOSClient
+        from app.services.vietqr_gen import vietqr
+        from fake_payos import FakeConfig, FakePayOS, create_app
+        from main import app
+
+        service = httpx.ASGITransport(app=app)
+        fake = FakePayOS(FakeConfig(latency=args.payos_latency, auto_pay=args.auto_pay, pay_delay=args.pay_delay,
+                                    webhook_url=f"{args.backend_url}/api/payos-webhook"),
+                         seed=args.seed, webhook_transport=service)
+        client = AsyncPayOSClient(transport=httpx.ASGITransport(app=create_app(fake)))
+        payment_router.create_payment_link_async = client.create_payment_link
+        vietqr.account_no = None
+        for product in catalog.list_available():
+            catalog.set_stock(product.id, 10**6)
+        try:
+            return await run_fleet(args, transport=service)
+        finally:
+            await client.aclose()
+            await fake.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--machines", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60, help="Thời gian chạy tải đầy đủ (giây)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Khởi động dần các máy trong bao nhiêu giây")
+    parser.add_argument("--connections", type=int, default=100, help="Số kết nối dùng chung cho cả đội máy")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--purchase-rate", type=float, default=1.0, help="Số lượt mua / phút mỗi máy")
+    parser.add_argument("--heartbeat-interval", type=float, default=30)
+    parser.add_argument("--poll-interval", type=float, default=60, help="Chu kỳ tải lại sản phẩm (giây)")
+    parser.add_argument("--status-poll", type=float, default=1.0, help="Chu kỳ kiểm tra trạng thái đơn (giây)")
+    parser.add_argument("--pay-timeout", type=float, default=60, help="Khách bỏ đi nếu chưa thanh toán sau (giây)")
+    parser.add_argument("--dispense-time", type=float, default=2.0, help="Thời gian xuất hàng (giây)")
+    parser.add_argument("--prefix", default="FLEET", help="Tiền tố mã máy")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Ghi báo cáo JSON ra file (mặc định in ra stdout)")
+    parser.add_argument("--in-process", action="store_true", help="Chạy server + PayOS giả lập trong process")
+    parser.add_argument("--payos-latency", type=float, default=0.2, help="(--in-process) độ trễ PayOS giả lập")
+    parser.add_argument("--auto-pay", type=float, default=0.9, help="(--in-process) tỉ lệ khách thanh toán")
+    parser.add_argument("--pay-delay", type=float, default=3.0, help="(--in-process) khách thanh toán sau (giây)")
+    args = parser.parse_args()
+
+    if args.in_process:
+        args.backend_url = "http://fleet"
+    print(f"🚀 Fleet Simulator: {args.machines} máy -> {args.backend_url}, {args.purchase_rate} lượt mua/phút/máy, "
+          f"{args.connections} kết nối", file=sys.stderr)
+    report = asyncio.run(run_in_process(args) if args.in_process else run_fleet(args))
+
+    print(f"✅ {report['requests']} request trong {report['elapsed_s']}s ({report['throughput_rps']} req/s), "
+          f"lỗi {report['errors']}, lượt mua {report['purchases']}", file=sys.stderr)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"📄 Đã ghi báo cáo: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,51 @@
 """
 Payment Service - Điểm khởi động ứng dụng
 """
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import PORT
-from app.routers import payment, products
+from app.config import PORT, METRICS
+from app.routers import payment, products, events, webhook, fleet, machines, metrics, admin
+from app.services.payos_client import payos_client, payment_link_queue
+from app.services.background import background_queue
+from app.services.telemetry import fleet as fleet_telemetry
+from app.services.order_expiry import order_expiry
+from app.services.reconciler import reconciler
+from app.services.storage_sync import storage_sync
+from app.services.metrics import MetricsMiddleware
+from app.services.log import RequestIdMiddleware
+from app.models.storage import storage
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Khởi động / dọn dẹp tài nguyên dùng chung"""
+    fleet_telemetry.start()
+    storage_sync.start()
+    order_expiry.start()
+    reconciler.start()
+    yield
+    await reconciler.stop()
+    await order_expiry.stop()
+    await storage_sync.stop()
+    await fleet_telemetry.stop()
+    # Xử lý nốt công việc nền rồi đóng connection pool PayOS khi tắt server
+    await payment_link_queue.stop()
+    await background_queue.stop()
+    await payos_client.aclose()
+    # Ghi nốt các thao tác đang chờ xuống database
+    storage.close()
+
 
 # Khởi tạo FastAPI app
 app = FastAPI(
     title="Vending Machine API",
     description="API cho máy bán hàng tự động với PayOS",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Cấu hình CORS - cho phép frontend truy cập API
@@ -22,11 +55,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # GET, POST, PUT, DELETE, etc.
     allow_headers=["*"],  # Cho phép tất cả headers
+    expose_headers=["ETag", "Idempotent-Replayed", "Retry-After", "X-Request-ID"],  # Kiosk cần đọc ETag để gửi lại If-None-Match
 )
 
+# Gắn request_id cho log của từng request (X-Request-ID)
+app.add_middleware(RequestIdMiddleware)
+
+# Đo độ trễ mọi request theo route (thêm sau cùng nên bọc ngoài cùng, tính cả CORS)
+if METRICS:
+    app.add_middleware(MetricsMiddleware)
+
 # Đăng ký router
 app.include_router(payment.router)
 app.include_router(products.router)
+app.include_router(events.router)
+app.include_router(webhook.router)
+app.include_router(fleet.router)
+app.include_router(machines.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 if __name__ == "__main__":
     print(f"🚀 Server đang chạy tại http://localhost:{PORT}")
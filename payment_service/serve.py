@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Chạy server production: nhiều worker (process) cùng nhận request trên một cổng.
+
+- Code ứng dụng được nạp một lần ở process cha rồi mới fork ra các worker
+  (preload): worker khởi động nhanh và lỗi import lộ ra ngay từ đầu.
+- Mỗi worker có ORDER_NODE_ID riêng (ORDER_NODE_ID + số thứ tự worker) để mã
+  đơn hàng không trùng nhau.
+- Chạy nhiều worker bắt buộc STORAGE_BACKEND=sqlite: stock và đơn hàng nằm
+  trong database dùng chung nên không bán vượt stock và worker nào cũng xử lý
+  được webhook / xác nhận xuất hàng của mọi đơn.
+- SIGTERM / Ctrl+C: worker ngừng nhận kết nối mới, chờ request đang xử lý xong
+  (tối đa GRACEFUL_TIMEOUT giây), ghi nốt dữ liệu rồi thoát.
+- Worker chết bất thường được khởi động lại.
+
+Chỉ chạy trên Linux / macOS (cần fork). Khi phát triển vẫn dùng run_server.py.
+
+Chạy:
+    STORAGE_BACKEND=sqlite python serve.py --workers 4 --port 5000
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+import uvicorn
+
+from app.config import PORT, WORKERS, GRACEFUL_TIMEOUT, ORDER_NODE_ID
+from app.models.storage import storage
+from app.services import order_id
+from main import app
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Socket lắng nghe dùng chung cho mọi worker (kernel chia kết nối giữa các worker)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, node_id: int, graceful_timeout: float) -> None:
+    """Thân của một worker (chạy trong process con sau fork)"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    os.environ["ORDER_NODE_ID"] = str(node_id)
+    order_id.order_code_generator = order_id.OrderCodeGenerator(node_id)
+
+    config = uvicorn.Config(app, log_level="info", timeout_graceful_shutdown=graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Process cha: fork worker, khởi động lại worker chết, chuyển tiếp tín hiệu tắt"""
+
+    def __init__(self, sock: socket.socket, workers: int, base_node_id: int, graceful_timeout: float):
+        self.sock = sock
+        self.workers = workers
+        self.base_node_id = base_node_id
+        self.graceful_timeout = graceful_timeout
+        self.children = {}  # pid -> số thứ tự worker
+        self.stopping_at = None
+
+    def spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.base_node_id + index, self.graceful_timeout)
+            except BaseException as e:
+                print(f"❌ Worker {index} lỗi: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping_at is None:
+            print(f"\n🛑 Nhận tín hiệu {signal.Signals(signum).name}, đang chờ các worker xử lý nốt request...")
+            self.stopping_at = time.monotonic()
+            for pid in self.children:
+                os.kill(pid, signal.SIGTERM)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping_at is not None and time.monotonic() - self.stopping_at > self.graceful_timeout + 5:
+                    print("⚠️ Hết thời gian chờ, dừng hẳn các worker còn lại")
+                    for child in self.children:
+                        os.kill(child, signal.SIGKILL)
+                time.sleep(0.1)
+                continue
+            index = self.children.pop(pid, None)
+            if index is not None and self.stopping_at is None:
+                print(f"⚠️ Worker {index} (pid {pid}) dừng bất thường (mã {os.waitstatus_to_exitcode(status)}), khởi động lại")
+                self.spawn(index)
+        print("✅ Đã tắt toàn bộ worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    if args.workers > 1 and not storage.persistent:
+        print("❌ Chạy nhiều worker cần STORAGE_BACKEND=sqlite để dùng chung stock và đơn hàng")
+        sys.exit(1)
+    base_node_id = int(ORDER_NODE_ID or 0)
+    if base_node_id + args.workers - 1 > order_id.MAX_NODE_ID:
+        print(f"❌ ORDER_NODE_ID + số worker vượt quá {order_id.MAX_NODE_ID + 1} node")
+        sys.exit(1)
+
+    sock = bind_socket(args.host, args.port)
+    # Không mang kết nối database của process cha sang worker - mỗi worker tự mở lại
+    storage.close()
+    print(f"🚀 Server production tại http://{args.host}:{args.port} - {args.workers} worker, "
+          f"ORDER_NODE_ID {base_node_id}-{base_node_id + args.workers - 1}")
+    Supervisor(sock, args.workers, base_node_id, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import requests
 import time
 import json
 import threading
+import uuid
 from datetime import datetime
 
 class VendingMachineSimulator:
@@ -13,6 +14,7 @@ class VendingMachineSimulator:
         self.backend_url = backend_url
         self.machine_id = "VM001"
         self.products = {}  # Sẽ load từ API
+        self.catalog_etag = None  # ETag của lần tải gần nhất, server trả 304 nếu catalog chưa đổi
         self.is_running = False
         self.current_order = None
         
@@ -23,11 +25,15 @@ class VendingMachineSimulator:
         """Load danh sách sản phẩm từ API"""
         try:
             print(f"🔄 Đang tải sản phẩm từ {self.backend_url}/api/products...")
-            response = requests.get(f"{self.backend_url}/api/products", timeout=10)
+            headers = {"If-None-Match": self.catalog_etag} if self.catalog_etag and self.products else {}
+            response = requests.get(f"{self.backend_url}/api/products", headers=headers, timeout=10)
             
-            if response.status_code == 200:
+            if response.status_code == 304:
+                print(f"✅ Danh sách sản phẩm không đổi ({len(self.products)} sản phẩm)")
+            elif response.status_code == 200:
                 data = response.json()
                 if data.get("success") and data.get("data"):
+                    self.catalog_etag = response.headers.get("ETag")
                     self.products = {}
                     for product in data["data"]:
                         self.products[product["id"]] = {
@@ -158,9 +164,10 @@ class VendingMachineSimulator:
             
             print(f"💳 Tạo thanh toán cho {product['name']} - {product['price']:,}đ...")
             
-            response = requests.post(f"{self.backend_url}/api/create-payment", json=payload, timeout=10)
-            
-            if response.status_code == 200:
+            response = self.request_payment(payload)
+            if response is None:
+                print("❌ Không kết nối được server để tạo thanh toán")
+            elif response.status_code == 200:
                 data = response.json()
                 self.current_order = {
                     "order_code": data["order_code"],
@@ -247,10 +254,9 @@ class VendingMachineSimulator:
                 "status": "DISPENSED"
             }
             
-            requests.post(f"{self.backend_url}/api/dispense-complete", json=payload, timeout=10)
-            
-            # Cập nhật stock qua API
-            requests.post(f"{self.backend_url}/api/products/{product_id}/purchase", json={"quantity": 1}, timeout=10)
+            # Server chốt phần hàng đã giữ cho đơn -> stock được trừ tại đây.
+            # Gửi lại với cùng Idempotency-Key nếu mạng lỗi, server không trừ stock hai lần.
+            self.confirm_dispense(payload)
             
             print(f"✅ Xuất hàng thành công! {product['name']} đã được xuất.")
             print(f"📦 Stock còn lại: {self.products[product_id]['stock']}")
@@ -260,6 +266,34 @@ class VendingMachineSimulator:
         except Exception as e:
             print(f"❌ Lỗi xuất hàng: {e}")
     
+    def request_payment(self, payload, attempts=3):
+        """Gửi yêu cầu tạo thanh toán, thử lại khi lỗi mạng với cùng Idempotency-Key (không tạo đơn trùng)"""
+        headers = {"Idempotency-Key": f"{self.machine_id}:{uuid.uuid4().hex}"}
+        for attempt in range(1, attempts + 1):
+            try:
+                return requests.post(f"{self.backend_url}/api/create-payment",
+                                     json=payload, headers=headers, timeout=10)
+            except requests.RequestException:
+                print(f"⚠️ Lỗi mạng khi tạo thanh toán, thử lại ({attempt}/{attempts})...")
+                time.sleep(attempt)
+        return None
+
+    def confirm_dispense(self, payload, attempts=3):
+        """Gửi xác nhận xuất hàng, thử lại khi lỗi mạng"""
+        headers = {"Idempotency-Key": f"{self.machine_id}:{payload['order_code']}:dispense"}
+        for attempt in range(1, attempts + 1):
+            try:
+                response = requests.post(f"{self.backend_url}/api/dispense-complete",
+                                         json=payload, headers=headers, timeout=10)
+                if response.status_code == 200:
+                    return True
+                print(f"❌ Server từ chối xác nhận xuất hàng: {response.text}")
+                return False
+            except requests.RequestException:
+                print(f"⚠️ Lỗi mạng khi xác nhận xuất hàng, thử lại ({attempt}/{attempts})...")
+                time.sleep(attempt)
+        return False
+    
     def update_stock_api(self):
         """Cập nhật stock sản phẩm qua API"""
         self.display_products()
@@ -329,21 +363,55 @@ class VendingMachineSimulator:
                 print(f"❌ Lỗi: {e}")
     
     def check_payment_status(self):
-        """Thread kiểm tra trạng thái thanh toán định kỳ"""
+        """Thread theo dõi trạng thái thanh toán - nhận đẩy từ server (SSE), dự phòng polling"""
         while self.is_running:
             if self.current_order:
-                try:
-                    response = requests.get(f"{self.backend_url}/api/order-status/{self.current_order['order_code']}", timeout=5)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get("status") == "PAID":
-                            print(f"\n🔔 THÔNG BÁO: Đơn hàng {self.current_order['order_code']} đã được thanh toán!")
-                            
-                except Exception:
-                    pass  # Bỏ qua lỗi trong background check
+                order_code = self.current_order['order_code']
+                if not self.listen_order_events(order_code):
+                    self.poll_order_status(order_code)
+                    time.sleep(5)  # Polling dự phòng mỗi 5 giây
+            else:
+                time.sleep(0.5)
+    
+    def listen_order_events(self, order_code):
+        """Nhận sự kiện trạng thái đơn qua SSE, trả về False nếu không kết nối được"""
+        try:
+            url = f"{self.backend_url}/api/events/orders/{order_code}"
+            # Read timeout lớn hơn chu kỳ keepalive (15 giây) của server
+            final_seen = False
+            with requests.get(url, stream=True, timeout=(5, 30)) as response:
+                if response.status_code != 200:
+                    return False
+                for line in response.iter_lines(decode_unicode=True):
+                    if not self.is_running:
+                        break
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[5:])
+                    if data.get("status") == "PAID":
+                        print(f"\n🔔 THÔNG BÁO: Đơn hàng {order_code} đã được thanh toán!")
+                    if data.get("final"):
+                        final_seen = True
+                        break
+            # Đơn đã kết thúc: chờ sang đơn khác thay vì đăng ký lại
+            while final_seen and self.is_running and self.current_order and self.current_order['order_code'] == order_code:
+                time.sleep(0.5)
+            return True
+        except Exception:
+            return False
+    
+    def poll_order_status(self, order_code):
+        """Kiểm tra trạng thái đơn một lần (dùng khi SSE không khả dụng)"""
+        try:
+            response = requests.get(f"{self.backend_url}/api/order-status/{order_code}", timeout=5)
             
-            time.sleep(5)  # Kiểm tra mỗi 5 giây
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") == "PAID":
+                    print(f"\n🔔 THÔNG BÁO: Đơn hàng {order_code} đã được thanh toán!")
+                    
+        except Exception:
+            pass  # Bỏ qua lỗi trong background check
     
     def send_heartbeat(self):
         """Gửi heartbeat để báo máy đang hoạt động"""